@@ -2,8 +2,16 @@ import os
 import logging
 from supabase import create_client, Client
 from scraper import StockScraper
-from datetime import datetime
-from typing import List, Dict
+from alert_evaluator import AlertBook, ThresholdIndex
+from alert_reader import AlertReader
+from alert_state import AlertStateTracker
+from poll_scheduler import PollScheduler
+from price_history import PriceHistoryReader
+from price_deadband import PriceDeadband
+from price_store import PriceStore
+from write_buffer import WriteBuffer
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -12,34 +20,82 @@ log = logging.getLogger(__name__)
 class AlertEngine:
     """Engine for checking stock prices against user alerts and triggering notifications"""
     
-    def __init__(self, supabase_url: str, supabase_key: str):
+    # Overlap applied to the delta-sync watermark to absorb clock skew
+    SYNC_OVERLAP = timedelta(seconds=60)
+    
+    def __init__(self, supabase_url: str, supabase_key: str, incremental: bool = None,
+                 evaluator: str = None, adaptive_polling: bool = None):
         """
         Initialize the alert engine
         
         Args:
             supabase_url: Supabase project URL
             supabase_key: Supabase service role key
+            incremental: Only re-evaluate stocks whose price or alerts changed
+                         since the previous run (ALERT_INCREMENTAL)
+            evaluator: 'vectorized' (AlertBook) or 'index' (ThresholdIndex) (ALERT_EVALUATOR)
+            adaptive_polling: Poll each stock on its own schedule instead of every
+                              run (ALERT_ADAPTIVE_POLLING)
         """
         self.supabase: Client = create_client(supabase_url, supabase_key)
         self.scraper = StockScraper()
+        # price_history and alert_logs rows are batched and flushed per run
+        self.writes = WriteBuffer(self.supabase)
+        self.price_history = PriceHistoryReader(self.supabase)
+        # Optional local memmap copy of price_history for history reads (PRICE_STORE)
+        use_store = os.getenv("PRICE_STORE", "false").lower() in ("1", "true", "yes")
+        self.price_store: Optional[PriceStore] = PriceStore() if use_store else None
+        # Skips price_history rows that would repeat the last stored price
+        self.deadband = PriceDeadband()
+        # Suppresses repeat triggers until an alert re-arms
+        self.trigger_state = AlertStateTracker()
+        
+        # Incremental mode state: cached alert rows and last-seen price per stock
+        if incremental is None:
+            incremental = os.getenv("ALERT_INCREMENTAL", "false").lower() in ("1", "true", "yes")
+        self.incremental = incremental
+        self.full_resync_interval = timedelta(minutes=float(os.getenv("ALERT_FULL_RESYNC_MINUTES", "30")))
+        self._alert_cache: Dict[str, Dict] = {}
+        self._alerts_synced_at: Optional[datetime] = None
+        self._last_full_sync: Optional[datetime] = None
+        self._last_prices: Dict[str, float] = {}
+        # Alerts on the stocks polled in the latest run (for the run summary)
+        self.alerts_checked = 0
+        
+        # 'index' keeps per-stock sorted trigger prices, rebuilt only when alerts change
+        self.evaluator = (evaluator or os.getenv("ALERT_EVALUATOR", "vectorized")).lower()
+        self._threshold_index: Optional[ThresholdIndex] = None
+        
+        # Adaptive polling: stocks near a trigger or volatile are scraped more often
+        if adaptive_polling is None:
+            adaptive_polling = os.getenv("ALERT_ADAPTIVE_POLLING", "false").lower() in ("1", "true", "yes")
+        self.scheduler: Optional[PollScheduler] = PollScheduler() if adaptive_polling else None
+        
+        # Keyset-paginated user_alerts queries (ALERT_PAGE_SIZE rows per request)
+        self.alert_reader = AlertReader(self.supabase)
+    
+    def iter_alerts(self, since: Optional[datetime] = None) -> Iterator[Dict]:
+        """
+        Stream alert rows in keyset-paginated pages (see AlertReader.iter_alerts)
+        
+        Args:
+            since: When given, every alert updated after this time; otherwise
+                   active alerts on interested stocks
+        """
+        return self.alert_reader.iter_alerts(since)
     
-    def get_active_alerts(self) -> List[Dict]:
+    def get_active_alerts(self) -> Optional[List[Dict]]:
         """
-        Fetch all active alerts from database
+        Fetch all active alerts on interested stocks from database
         
         Returns:
-            List of active alert configurations
+            List of active alert configurations, or None if the query failed
         """
         try:
-            response = self.supabase.table('user_alerts')\
-                .select('*, stocks(*), user_profiles(*)')\
-                .eq('is_active', True)\
-                .execute()
-            
-            return response.data
+            return list(self.iter_alerts())
         except Exception as e:
             log.error(f"Error fetching active alerts: {str(e)}")
-            return []
+            return None
     
     def check_alert_condition(self, current_price: float, baseline_price: float, 
                             gain_threshold: float, loss_threshold: float) -> Dict:
@@ -75,30 +131,32 @@ class AlertEngine:
             'baseline_price': baseline_price
         }
     
-    def save_price_history(self, stock_id: str, price: float):
+    def save_price_history(self, stock_id: str, price: float, force: bool = False):
         """
-        Save price data to history table
+        Queue price data for the history table (written on flush_writes), unless
+        the price is inside the deadband around the last stored price
         
         Args:
             stock_id: Stock UUID
             price: Current price
+            force: Store even inside the deadband
         """
-        try:
-            self.supabase.table('price_history').insert({
-                'stock_id': stock_id,
-                'price': price,
-                'recorded_at': datetime.utcnow().isoformat()
-            }).execute()
-            
-            log.info(f"Saved price history for stock {stock_id}: {price}")
-        except Exception as e:
-            log.error(f"Error saving price history: {str(e)}")
+        if not self.deadband.should_store(stock_id, price, force=force):
+            return
+        
+        self.writes.add('price_history', {
+            'stock_id': stock_id,
+            'price': price,
+            'recorded_at': datetime.utcnow().isoformat()
+        })
+        
+        log.info(f"Queued price history for stock {stock_id}: {price}")
     
     def log_alert(self, alert_id: str, user_id: str, stock_id: str, 
                   trigger_price: float, baseline_price: float, 
                   percent_change: float, alert_type: str, message: str):
         """
-        Log triggered alert to database
+        Queue triggered alert for the alert log (written on flush_writes)
         
         Args:
             alert_id: Alert UUID
@@ -110,105 +168,384 @@ class AlertEngine:
             alert_type: Type of alert (GAIN/LOSS)
             message: Alert message
         """
-        try:
-            self.supabase.table('alert_logs').insert({
-                'alert_id': alert_id,
-                'user_id': user_id,
-                'stock_id': stock_id,
-                'trigger_price': trigger_price,
-                'baseline_price': baseline_price,
-                'percent_change': percent_change,
-                'alert_type': alert_type,
-                'message': message,
-                'triggered_at': datetime.utcnow().isoformat()
-            }).execute()
-            
-            log.info(f"Logged alert for user {user_id}: {message}")
-        except Exception as e:
-            log.error(f"Error logging alert: {str(e)}")
+        self.writes.add('alert_logs', {
+            'alert_id': alert_id,
+            'user_id': user_id,
+            'stock_id': stock_id,
+            'trigger_price': trigger_price,
+            'baseline_price': baseline_price,
+            'percent_change': percent_change,
+            'alert_type': alert_type,
+            'message': message,
+            'triggered_at': datetime.utcnow().isoformat()
+        })
+        
+        log.info(f"Queued alert log for user {user_id}: {message}")
     
-    def process_alerts(self) -> List[Dict]:
+    def flush_writes(self) -> int:
         """
-        Main method to process all active alerts
+        Write all queued price_history and alert_logs rows in batched inserts
         
         Returns:
-            List of triggered alerts
+            Number of rows written
         """
-        log.info("Starting alert processing...")
-        
-        active_alerts = self.get_active_alerts()
-        log.info(f"Found {len(active_alerts)} active alerts")
+        return self.writes.flush()
+    
+    def group_alerts_by_stock(self, alerts: List[Dict]) -> Dict[str, Dict]:
+        """
+        Group alerts by stock so each stock is scraped only once per run
         
-        triggered_alerts = []
+        Args:
+            alerts: Active alert rows joined with their stock
+            
+        Returns:
+            Dict of stock_id -> { company_name, alerts }
+        """
+        groups = {}
         
-        for alert in active_alerts:
+        for alert in alerts:
             try:
                 company_name = alert['stocks']['company_name']
                 stock_id = alert['stock_id']
                 
-                # Skip non-interested companies
+                # Skip non-interested companies (delta-synced rows are not filtered in the query)
                 stock_interest = alert['stocks'].get('interest', 'not-interested')
                 if stock_interest != 'interested':
                     log.info(f"Skipping {company_name} - interest: {stock_interest}")
                     continue
                 
-                # Scrape current price
-                log.info(f"Checking price for {company_name}")
-                scrape_result = self.scraper.scrape_stock_price(company_name)
-                
+                group = groups.setdefault(stock_id, {
+                    'company_name': company_name,
+                    'alerts': []
+                })
+                group['alerts'].append(alert)
+            
+            except Exception as e:
+                log.error(f"Error grouping alert {alert.get('id', 'unknown')}: {str(e)}")
+                continue
+        
+        return groups
+    
+    def get_changed_alerts(self, since: datetime) -> Optional[List[Dict]]:
+        """
+        Fetch alerts (active or not) updated after a point in time
+        
+        Args:
+            since: Only rows with updated_at later than this are returned
+            
+        Returns:
+            List of alert rows, or None if the query failed
+        """
+        try:
+            return list(self.iter_alerts(since))
+        except Exception as e:
+            log.error(f"Error fetching changed alerts: {str(e)}")
+            return None
+    
+    def sync_alerts(self) -> Tuple[List[Dict], List[Dict], Set[str]]:
+        """
+        Refresh the cached alert book, fetching only rows updated since the
+        previous sync; a full reload runs every ALERT_FULL_RESYNC_MINUTES to pick
+        up deleted alerts and stock-level changes
+        
+        Returns:
+            (all active alerts, rows fetched in this sync, stock ids whose alerts changed)
+        """
+        started = datetime.utcnow()
+        changed_stock_ids = set()
+        
+        if self._alerts_synced_at is None or started - self._last_full_sync >= self.full_resync_interval:
+            fetched = self.get_active_alerts()
+            if fetched is None:
+                # Keep the cached book and both watermarks so the next tick retries the full load
+                return list(self._alert_cache.values()), [], changed_stock_ids
+            previous, self._alert_cache = self._alert_cache, {row['id']: row for row in fetched}
+            for alert_id in previous.keys() | self._alert_cache.keys():
+                old_row, new_row = previous.get(alert_id), self._alert_cache.get(alert_id)
+                if old_row != new_row:
+                    changed_stock_ids.add((new_row or old_row)['stock_id'])
+            self._last_full_sync = started
+        else:
+            fetched = self.get_changed_alerts(self._alerts_synced_at - self.SYNC_OVERLAP)
+            if fetched is None:
+                # Keep the old watermark so the next tick retries the delta
+                return list(self._alert_cache.values()), [], changed_stock_ids
+            for row in fetched:
+                old_row = self._alert_cache.pop(row['id'], None)
+                if old_row:
+                    changed_stock_ids.add(old_row['stock_id'])
+                if row.get('is_active'):
+                    self._alert_cache[row['id']] = row
+                changed_stock_ids.add(row['stock_id'])
+        
+        self._alerts_synced_at = started
+        log.info(f"Synced alerts: {len(fetched)} rows fetched, {len(changed_stock_ids)} stocks changed")
+        return list(self._alert_cache.values()), fetched, changed_stock_ids
+    
+    def save_current_prices(self, stock_groups: Dict[str, Dict], prices: Dict[str, float]):
+        """
+        Record moved prices in stocks.current_price (the last scraped price;
+        alert baselines live only in user_alerts) and as the last-seen price
+        
+        Args:
+            stock_groups: Output of group_alerts_by_stock (for company names)
+            prices: Dict of stock_id -> price that moved since last seen
+        """
+        for stock_id, price in prices.items():
+            self._last_prices[stock_id] = price
+            self.writes.add('stocks', {
+                'id': stock_id,
+                'company_name': stock_groups[stock_id]['company_name'],
+                'current_price': price
+            }, on_conflict='id')
+    
+    def seed_poll_scheduler(self, stock_ids: List[str], lookback_hours: float = 24, limit: int = 500):
+        """
+        Seed the poll scheduler's volatility estimates from each stock's most
+        recent price_history; stocks without history stay unseeded and are
+        retried next run
+        
+        Args:
+            stock_ids: Stocks the scheduler has no history for yet
+            lookback_hours: How far back to read
+            limit: Maximum rows to read per stock (the newest are kept)
+        """
+        if not stock_ids:
+            return
+        since = datetime.utcnow() - timedelta(hours=lookback_hours)
+        if self.price_store is not None:
+            try:
+                # Only ticks newer than the local copy cross the network
+                self.price_store.sync(self.price_history, stock_ids)
+                series = self.price_store.series(stock_ids, since)
+                self.scheduler.load_series(series, list(series))
+            except Exception as e:
+                log.error(f"Error loading price history for poll scheduler: {str(e)}")
+            return
+        
+        for stock_id in stock_ids:
+            try:
+                rows = self.price_history.recent(stock_id, since, limit)
+            except Exception as e:
+                log.error(f"Error loading price history for poll scheduler ({stock_id}): {str(e)}")
+                continue
+            if rows:
+                self.scheduler.load_history(rows, [stock_id])
+    
+    def seed_price_deadband(self, stock_ids: List[str], chunk_size: int = 200):
+        """
+        Load the last stored price of each stock so the deadband continues from
+        the stored series instead of re-storing a point per stock on start-up
+        
+        Args:
+            stock_ids: Stocks the deadband has not seen yet
+            chunk_size: Maximum ids per request (keeps the PostgREST URL short)
+        """
+        for start in range(0, len(stock_ids), chunk_size):
+            chunk = stock_ids[start:start + chunk_size]
+            try:
+                response = self.supabase.table('price_history_latest')\
+                    .select('stock_id, price, recorded_at')\
+                    .in_('stock_id', chunk)\
+                    .execute()
+                self.deadband.seed(response.data, chunk)
+            except Exception as e:
+                # The chunk stays unseeded and is retried next run
+                log.error(f"Error loading latest prices for the deadband: {str(e)}")
+    
+    def persist_trigger_state(self, chunk_size: int = 200):
+        """
+        Write re-armed / fired state changes back to user_alerts, one update per
+        state and chunk of ids rather than one per alert
+        
+        Args:
+            chunk_size: Maximum ids per update request
+        """
+        rearmed, fired = self.trigger_state.pending_updates()
+        now = datetime.utcnow().isoformat()
+        updates = [({'trigger_state': 'armed'}, rearmed)]
+        updates += [
+            ({'trigger_state': 'fired', 'last_triggered_at': now, 'last_trigger_type': alert_type}, ids)
+            for alert_type, ids in fired.items()
+        ]
+        
+        for values, ids in updates:
+            for start in range(0, len(ids), chunk_size):
+                try:
+                    self.supabase.table('user_alerts')\
+                        .update(values)\
+                        .in_('id', ids[start:start + chunk_size])\
+                        .execute()
+                except Exception as e:
+                    log.error(f"Error saving trigger state: {str(e)}")
+    
+    def process_alerts(self) -> List[Dict]:
+        """
+        Main method to process all active alerts
+        
+        Alerts are grouped by stock first, so every distinct stock is scraped
+        and recorded once no matter how many users are watching it.
+        
+        Returns:
+            List of triggered alerts
+        """
+        return list(self.stream_alerts())
+    
+    def stream_alerts(self) -> Iterator[Dict]:
+        """
+        Process all active alerts, yielding each triggered alert as soon as its
+        stock's price arrives instead of after the whole run
+        
+        Yields:
+            Triggered alert dicts (see AlertBook.evaluate), in completion order
+        """
+        log.info("Starting alert processing...")
+        
+        if self.incremental:
+            active_alerts, fetched_alerts, changed_stock_ids = self.sync_alerts()
+        else:
+            active_alerts = fetched_alerts = self.get_active_alerts() or []
+            changed_stock_ids = None
+        log.info(f"Found {len(active_alerts)} active alerts")
+        # Only freshly fetched rows carry current trigger state; cached rows may be stale
+        self.trigger_state.load(fetched_alerts)
+        
+        stock_groups = self.group_alerts_by_stock(active_alerts)
+        log.info(f"Checking {len(stock_groups)} distinct stocks")
+        
+        # Seed last-seen prices for stocks we have not priced in this process yet
+        for stock_id, group in stock_groups.items():
+            if stock_id not in self._last_prices:
+                stock_price = group['alerts'][0]['stocks'].get('current_price')
+                if stock_price is not None:
+                    self._last_prices[stock_id] = float(stock_price)
+        
+        # Adaptive polling scrapes only the stocks that are due, within the request budget
+        poll_stock_ids = list(stock_groups)
+        if self.scheduler is not None:
+            self.seed_poll_scheduler([
+                stock_id for stock_id in poll_stock_ids if not self.scheduler.knows(stock_id)
+            ])
+            due = set(self.scheduler.due(poll_stock_ids))
+            # Edited alerts are checked right away, whatever their stock's schedule
+            due |= (changed_stock_ids or set()) & stock_groups.keys()
+            poll_stock_ids = [stock_id for stock_id in poll_stock_ids if stock_id in due]
+            log.info(f"Polling {len(poll_stock_ids)} of {len(stock_groups)} stocks")
+        
+        self.seed_price_deadband([
+            stock_id for stock_id in poll_stock_ids if not self.deadband.knows(stock_id)
+        ])
+        
+        # company_name is unique in the stocks table
+        stock_ids_by_name = {
+            stock_groups[stock_id]['company_name']: stock_id for stock_id in poll_stock_ids
+        }
+        
+        self.alerts_checked = sum(len(stock_groups[stock_id]['alerts']) for stock_id in poll_stock_ids)
+        triggered_count = 0
+        evaluated_count = 0
+        polled_prices = {}
+        book, evaluator = self._build_evaluator(stock_groups, poll_stock_ids, changed_stock_ids)
+        # Triggers held back by a cooldown that has now ended must be re-checked at a flat price
+        cooled_stock_ids = self.trigger_state.cooldown_expired()
+        
+        try:
+            # Scrape concurrently, recording and evaluating each price as it arrives
+            for company_name, scrape_result in self.scraper.iter_stock_prices(list(stock_ids_by_name)):
                 if not scrape_result['success']:
                     log.error(f"Failed to scrape {company_name}: {scrape_result['error']}")
                     continue
                 
-                current_price = scrape_result['price']
+                stock_id = stock_ids_by_name[company_name]
+                price = scrape_result['price']
+                polled_prices[stock_id] = price
+                if self.scheduler is not None:
+                    self.scheduler.observe(stock_id, price)
                 
-                # Save price history
-                self.save_price_history(stock_id, current_price)
+                moved = self._last_prices.get(stock_id) != price
+                if moved:
+                    self.save_current_prices(stock_groups, {stock_id: price})
                 
-                # Check alert condition
-                alert_check = self.check_alert_condition(
-                    current_price,
-                    float(alert['baseline_price']),
-                    float(alert['gain_threshold_percent']),
-                    float(alert['loss_threshold_percent'])
-                )
+                # Incremental mode skips stocks whose price and alerts are both unchanged
+                if (self.incremental and not moved and stock_id not in changed_stock_ids
+                        and stock_id not in cooled_stock_ids):
+                    self.save_price_history(stock_id, price)
+                    continue
+                evaluated_count += 1
+                self.trigger_state.clear_cooldown(stock_id)
                 
-                if alert_check['triggered']:
-                    alert_info = {
-                        'alert_id': alert['id'],
-                        'user_id': alert['user_id'],
-                        'stock_id': stock_id,
-                        'company_name': company_name,
-                        'alert_type': alert_check['type'],
-                        'current_price': current_price,
-                        'baseline_price': float(alert['baseline_price']),
-                        'percent_change': alert_check['percent_change'],
-                        'user_email': alert['user_profiles']['email']
-                    }
-                    
-                    triggered_alerts.append(alert_info)
-                    
-                    # Log the alert
-                    message = f"{company_name} {alert_check['type']}: {alert_check['percent_change']:.2f}% change"
-                    self.log_alert(
-                        alert['id'],
-                        alert['user_id'],
-                        stock_id,
-                        current_price,
-                        float(alert['baseline_price']),
-                        alert_check['percent_change'],
-                        alert_check['type'],
-                        message
-                    )
-                    
-                    log.info(f"Alert triggered: {message}")
+                # Re-arm alerts back inside their band, then drop repeat triggers
+                # before any logging or notification work
+                # Both steps touch only this stock's rows of the book
+                self.trigger_state.rearm(book, {stock_id: price}, book.positions_for(stock_id))
+                triggered = self.trigger_state.filter_triggered(evaluator.evaluate_stock(stock_id, price))
+                # A price that fires an alert is always stored, so history replays it
+                self.save_price_history(stock_id, price, force=bool(triggered))
+                for alert_info in triggered:
+                    self.record_triggered_alert(alert_info)
+                    triggered_count += 1
+                    yield alert_info
             
-            except Exception as e:
-                log.error(f"Error processing alert {alert.get('id', 'unknown')}: {str(e)}")
-                continue
+            if self.incremental:
+                log.info(f"Re-evaluated {evaluated_count} of {len(stock_groups)} stocks")
+            if self.scheduler is not None:
+                self.scheduler.reschedule(book, polled_prices)
+        finally:
+            written = self.flush_writes()
+            log.info(
+                f"Flushed {written} history/log rows "
+                f"(deadband stored {self.deadband.stored}, skipped {self.deadband.dropped} prices so far)"
+            )
+            self.persist_trigger_state()
+        
+        log.info(f"Alert processing complete. {triggered_count} alerts triggered.")
+    
+    def _build_evaluator(self, stock_groups: Dict[str, Dict], stock_ids: List[str],
+                         changed_stock_ids: Optional[Set[str]]):
+        """
+        Return (book, evaluator) for this run
+        
+        Args:
+            stock_groups: Output of group_alerts_by_stock
+            stock_ids: Stocks polled this run
+            changed_stock_ids: Stocks whose alerts changed (None when every row was reloaded)
+        """
+        if self.evaluator == 'index':
+            if self._threshold_index is None or changed_stock_ids is None or changed_stock_ids:
+                all_alerts = [alert for group in stock_groups.values() for alert in group['alerts']]
+                self._threshold_index = ThresholdIndex(AlertBook(all_alerts))
+            return self._threshold_index.book, self._threshold_index
+        
+        # Columnar view of the polled stocks' alerts; each price is checked against it on arrival
+        book = AlertBook([alert for stock_id in stock_ids for alert in stock_groups[stock_id]['alerts']])
+        return book, book
+    
+    def close(self):
+        """Flush pending writes and release the scraper's connections."""
+        self.flush_writes()
+        self.persist_trigger_state()
+        self.scraper.close()
+    
+    def record_triggered_alert(self, alert_info: Dict):
+        """
+        Log a triggered alert to the alert log
+        
+        Args:
+            alert_info: Triggered alert dict as produced by AlertBook.evaluate
+        """
+        message = f"{alert_info['company_name']} {alert_info['alert_type']}: {alert_info['percent_change']:.2f}% change"
+        self.log_alert(
+            alert_info['alert_id'],
+            alert_info['user_id'],
+            alert_info['stock_id'],
+            alert_info['current_price'],
+            alert_info['baseline_price'],
+            alert_info['percent_change'],
+            alert_info['alert_type'],
+            message
+        )
         
-        log.info(f"Alert processing complete. {len(triggered_alerts)} alerts triggered.")
-        return triggered_alerts
+        log.info(f"Alert triggered: {message}")
 
 
 if __name__ == "__main__":
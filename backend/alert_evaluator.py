@@ -0,0 +1,259 @@
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class AlertBook:
+    """Columnar view of active alerts for evaluating the whole book in one vectorized pass"""
+
+    def __init__(self, alerts: List[Dict]):
+        """
+        Build columnar arrays from alert rows (joined with stocks and user_profiles)
+
+        Args:
+            alerts: Alert rows as returned by AlertEngine.get_active_alerts
+        """
+        baselines, gains, losses, stock_index = [], [], [], []
+        self.alert_ids: List[str] = []
+        self.user_ids: List[str] = []
+        self.user_emails: List[str] = []
+        self.stock_ids: List[str] = []
+        self.company_names: List[str] = []
+        self._stock_positions: Dict[str, int] = {}
+
+        for alert in alerts:
+            try:
+                # Parse every field before appending so a bad row never misaligns columns
+                baseline = float(alert['baseline_price'])
+                gain = float(alert['gain_threshold_percent'])
+                loss = float(alert['loss_threshold_percent'])
+                alert_id, user_id = alert['id'], alert['user_id']
+                user_email = alert['user_profiles']['email']
+                stock_id = alert['stock_id']
+                company_name = alert['stocks']['company_name']
+            except Exception as e:
+                log.error(f"Skipping malformed alert {alert.get('id', 'unknown')}: {str(e)}")
+                continue
+
+            if stock_id not in self._stock_positions:
+                self._stock_positions[stock_id] = len(self.stock_ids)
+                self.stock_ids.append(stock_id)
+                self.company_names.append(company_name)
+
+            baselines.append(baseline)
+            gains.append(gain)
+            losses.append(loss)
+            stock_index.append(self._stock_positions[stock_id])
+            self.alert_ids.append(alert_id)
+            self.user_ids.append(user_id)
+            self.user_emails.append(user_email)
+
+        self.baseline = np.array(baselines, dtype=np.float64)
+        self.gain = np.array(gains, dtype=np.float64)
+        self.loss = np.array(losses, dtype=np.float64)
+        self.stock_index = np.array(stock_index, dtype=np.intp)
+        self.alert_positions: Dict[str, int] = {alert_id: i for i, alert_id in enumerate(self.alert_ids)}
+
+        # stock_id -> sorted alert positions, so one stock's price touches only its rows
+        order = np.argsort(self.stock_index, kind='stable')
+        boundaries = np.flatnonzero(np.diff(self.stock_index[order])) + 1
+        self._positions_by_stock: Dict[str, np.ndarray] = {
+            self.stock_ids[self.stock_index[group[0]]]: group
+            for group in (np.split(order, boundaries) if len(order) else [])
+        }
+
+    def __len__(self) -> int:
+        return len(self.alert_ids)
+
+    def positions_for(self, stock_id: str) -> np.ndarray:
+        """Return the sorted positions of a stock's alerts (empty if it has none)."""
+        return self._positions_by_stock.get(stock_id, np.empty(0, dtype=np.intp))
+
+    def price_vector(self, prices: Dict[str, float]) -> np.ndarray:
+        """Map {stock_id: price} onto the book's stock order; missing stocks are NaN."""
+        vector = np.full(len(self.stock_ids), np.nan, dtype=np.float64)
+        for stock_id, price in prices.items():
+            position = self._stock_positions.get(stock_id)
+            if position is not None and price is not None:
+                vector[position] = price
+        return vector
+
+    def percent_changes(self, prices: Dict[str, float], positions: Optional[np.ndarray] = None):
+        """
+        Compute alerts' percent change from their baseline
+
+        Args:
+            prices: Dict of stock_id -> current price
+            positions: Optional alert positions to restrict the computation to
+
+        Returns:
+            (current price, percent change, valid mask) arrays aligned with the
+            book, or with ``positions`` when given
+        """
+        if positions is None:
+            current = self.price_vector(prices)[self.stock_index]
+            baseline = self.baseline
+        else:
+            # Look up only the stocks in ``prices`` rather than building a book-wide vector
+            by_position = {
+                self._stock_positions[stock_id]: price for stock_id, price in prices.items()
+                if stock_id in self._stock_positions and price is not None
+            }
+            current = np.array(
+                [by_position.get(j, np.nan) for j in self.stock_index[positions].tolist()], dtype=np.float64
+            )
+            baseline = self.baseline[positions]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percent_change = ((current - baseline) / baseline) * 100
+
+        # Unpriced stocks and zero baselines (a ZeroDivisionError in the scalar path) never fire
+        valid = ~np.isnan(current) & (baseline != 0)
+        return current, percent_change, valid
+
+    def evaluate(self, prices: Dict[str, float]) -> List[Dict]:
+        """
+        Check every alert against the latest prices, matching
+        AlertEngine.check_alert_condition (GAIN takes precedence over LOSS)
+
+        Args:
+            prices: Dict of stock_id -> current price; alerts on other stocks are skipped
+
+        Returns:
+            List of triggered alert_info dicts, in book order
+        """
+        if not len(self):
+            return []
+
+        return self.evaluate_positions(prices, None)
+
+    def evaluate_stock(self, stock_id: str, price: float) -> List[Dict]:
+        """
+        Check one stock's alerts against its new price, touching only that
+        stock's rows
+
+        Args:
+            stock_id: Stock UUID
+            price: Current price
+
+        Returns:
+            List of triggered alert_info dicts, in book order
+        """
+        positions = self.positions_for(stock_id)
+        if not len(positions):
+            return []
+        return self.evaluate_positions({stock_id: price}, positions)
+
+    def evaluate_positions(self, prices: Dict[str, float], positions: Optional[np.ndarray]) -> List[Dict]:
+        """
+        Evaluate only the alerts at the given book positions (all when None)
+
+        Args:
+            prices: Dict of stock_id -> current price
+            positions: Sorted alert positions, or None for the whole book
+
+        Returns:
+            List of triggered alert_info dicts, in book order
+        """
+        current, percent_change, valid = self.percent_changes(prices, positions)
+        gain = self.gain if positions is None else self.gain[positions]
+        loss = self.loss if positions is None else self.loss[positions]
+        gain_mask = valid & (percent_change >= gain)
+        loss_mask = valid & ~gain_mask & (percent_change <= -loss)
+
+        triggered = []
+        for j in np.flatnonzero(gain_mask | loss_mask):
+            i = j if positions is None else positions[j]
+            stock_position = self.stock_index[i]
+            triggered.append({
+                'alert_id': self.alert_ids[i],
+                'user_id': self.user_ids[i],
+                'stock_id': self.stock_ids[stock_position],
+                'company_name': self.company_names[stock_position],
+                'alert_type': "GAIN" if gain_mask[j] else "LOSS",
+                'current_price': float(current[j]),
+                'baseline_price': float(self.baseline[i]),
+                'percent_change': float(percent_change[j]),
+                'user_email': self.user_emails[i]
+            })
+        return triggered
+
+
+class ThresholdIndex:
+    """
+    Per-stock sorted trigger prices so a new price finds every crossed alert by
+    binary search in O(log n + k), instead of checking every alert on the stock.
+
+    Candidates are confirmed with the exact percent-change test, so results are
+    identical to AlertBook.evaluate.
+    """
+
+    # Relative slack on the binary search so float rounding never hides a candidate
+    EPSILON = 1e-9
+
+    def __init__(self, book: AlertBook):
+        """
+        Build the index
+
+        Args:
+            book: Alert book to index
+        """
+        self.book = book
+        positive = book.baseline > 0
+        gain_price = book.baseline * (1 + book.gain / 100)
+        loss_price = book.baseline * (1 - book.loss / 100)
+
+        # stock position -> (sorted gain prices, positions), (sorted loss prices, positions), unindexed
+        self._gain: Dict[int, tuple] = {}
+        self._loss: Dict[int, tuple] = {}
+        self._unindexed: Dict[int, np.ndarray] = {}
+
+        order = np.argsort(book.stock_index, kind='stable')
+        boundaries = np.flatnonzero(np.diff(book.stock_index[order])) + 1
+        for group in np.split(order, boundaries) if len(order) else []:
+            stock_position = int(book.stock_index[group[0]])
+            indexed = group[positive[group]]
+            by_gain = indexed[np.argsort(gain_price[indexed], kind='stable')]
+            by_loss = indexed[np.argsort(loss_price[indexed], kind='stable')]
+            self._gain[stock_position] = (gain_price[by_gain], by_gain)
+            self._loss[stock_position] = (loss_price[by_loss], by_loss)
+            # Negative baselines flip the inequalities; zero baselines never fire but
+            # are checked anyway so behaviour stays identical to the book
+            self._unindexed[stock_position] = group[~positive[group]]
+
+    def candidates(self, stock_id: str, price: float) -> np.ndarray:
+        """Return positions of alerts on a stock that the price may have crossed."""
+        stock_position = self.book._stock_positions.get(stock_id)
+        if stock_position is None or price is None:
+            return np.empty(0, dtype=np.intp)
+
+        gain_prices, gain_positions = self._gain[stock_position]
+        loss_prices, loss_positions = self._loss[stock_position]
+        gain_hits = gain_positions[:np.searchsorted(gain_prices, price * (1 + self.EPSILON), side='right')]
+        loss_hits = loss_positions[np.searchsorted(loss_prices, price * (1 - self.EPSILON), side='left'):]
+        return np.concatenate([gain_hits, loss_hits, self._unindexed[stock_position]])
+
+    def evaluate(self, prices: Dict[str, float]) -> List[Dict]:
+        """
+        Drop-in replacement for AlertBook.evaluate
+
+        Args:
+            prices: Dict of stock_id -> current price
+
+        Returns:
+            List of triggered alert_info dicts, in book order
+        """
+        hits = [self.candidates(stock_id, price) for stock_id, price in prices.items()]
+        if not hits:
+            return []
+        positions = np.unique(np.concatenate(hits))
+        if not len(positions):
+            return []
+        return self.book.evaluate_positions(prices, positions)
+
+    def evaluate_stock(self, stock_id: str, price: float) -> List[Dict]:
+        """Drop-in replacement for AlertBook.evaluate_stock."""
+        return self.evaluate({stock_id: price})
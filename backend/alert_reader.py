@@ -0,0 +1,67 @@
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class AlertReader:
+    """
+    Read user_alerts rows joined with the stock and user columns the engine and
+    backtester use, in keyset-paginated pages
+    """
+
+    # Only the columns the engine reads; stocks!inner lets the interest filter run in the query
+    ALERT_COLUMNS = (
+        'id, user_id, stock_id, baseline_price, gain_threshold_percent, loss_threshold_percent, '
+        'is_active, trigger_state, last_triggered_at, '
+        'stocks!inner(company_name, interest, current_price), user_profiles(email)'
+    )
+    # Delta sync must also see alerts on stocks that are no longer interesting, to drop them
+    CHANGED_ALERT_COLUMNS = ALERT_COLUMNS.replace('stocks!inner(', 'stocks(')
+
+    def __init__(self, supabase: Client, page_size: int = None):
+        """
+        Initialize the reader
+
+        Args:
+            supabase: Supabase client
+            page_size: Rows per request; keep <= PostgREST max rows (ALERT_PAGE_SIZE)
+        """
+        self.supabase = supabase
+        self.page_size = int(page_size or os.getenv("ALERT_PAGE_SIZE", "1000"))
+
+    def iter_alerts(self, since: Optional[datetime] = None) -> Iterator[Dict]:
+        """
+        Stream alert rows in keyset-paginated pages (ordered by id)
+
+        Args:
+            since: When given, every alert (active or not, any interest) updated
+                   after this time; otherwise active alerts on interested stocks
+
+        Yields:
+            Alert rows joined with the stock and user columns
+        """
+        last_id = None
+        while True:
+            if since is None:
+                query = self.supabase.table('user_alerts')\
+                    .select(self.ALERT_COLUMNS)\
+                    .eq('is_active', True)\
+                    .eq('stocks.interest', 'interested')
+            else:
+                query = self.supabase.table('user_alerts')\
+                    .select(self.CHANGED_ALERT_COLUMNS)\
+                    .gt('updated_at', since.isoformat())
+            if last_id is not None:
+                query = query.gt('id', last_id)
+
+            page = query.order('id').limit(self.page_size).execute().data
+            yield from page
+            if len(page) < self.page_size:
+                return
+            last_id = page[-1]['id']
@@ -0,0 +1,187 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from alert_evaluator import AlertBook
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class AlertStateTracker:
+    """
+    Per-alert trigger state (armed / fired) so an alert fires once per excursion
+    instead of on every run while the price stays beyond its threshold.
+
+    A fired alert re-arms once the price comes back within ``rearm_band_percent``
+    of its baseline (or, with no band configured, once its condition clears).
+    ``cooldown_minutes`` additionally enforces a minimum gap between two fires.
+    """
+
+    def __init__(self, cooldown_minutes: float = None, rearm_band_percent: float = None):
+        """
+        Initialize the tracker
+
+        Args:
+            cooldown_minutes: Minimum minutes between fires of one alert (ALERT_COOLDOWN_MINUTES)
+            rearm_band_percent: Re-arm only within this % of baseline (ALERT_REARM_BAND_PERCENT)
+        """
+        self.cooldown = timedelta(minutes=float(
+            cooldown_minutes if cooldown_minutes is not None
+            else os.getenv("ALERT_COOLDOWN_MINUTES", "0")
+        ))
+        band = rearm_band_percent if rearm_band_percent is not None else os.getenv("ALERT_REARM_BAND_PERCENT")
+        self.rearm_band_percent = float(band) if band not in (None, "") else None
+
+        self._fired_ids: Set[str] = set()
+        self._last_triggered_at: Dict[str, datetime] = {}
+        self._rearmed: List[str] = []
+        self._newly_fired: Dict[str, List[str]] = {}
+        # stock_id -> earliest end of a cooldown that suppressed one of its alerts
+        self._cooling_until: Dict[str, datetime] = {}
+
+    def load(self, alerts: List[Dict]):
+        """
+        Load trigger state from user_alerts rows (trigger_state, last_triggered_at)
+
+        Args:
+            alerts: Active alert rows
+        """
+        for alert in alerts:
+            alert_id = alert.get('id')
+            if alert_id is None:
+                continue
+            if alert.get('trigger_state') == 'fired':
+                self._fired_ids.add(alert_id)
+            else:
+                self._fired_ids.discard(alert_id)
+            last = alert.get('last_triggered_at')
+            if last:
+                try:
+                    parsed = datetime.fromisoformat(last)
+                    if parsed.tzinfo is None:
+                        parsed = parsed.replace(tzinfo=timezone.utc)
+                    self._last_triggered_at[alert_id] = parsed
+                except ValueError:
+                    log.warning(f"Unparseable last_triggered_at for alert {alert_id}: {last}")
+
+    def rearm(self, book: AlertBook, prices: Dict[str, float], positions: Optional[np.ndarray] = None) -> int:
+        """
+        Re-arm fired alerts whose price has returned to the re-arm band
+
+        Args:
+            book: Alert book being evaluated this run
+            prices: Dict of stock_id -> current price
+            positions: Book positions to consider (e.g. one stock's rows); all when None
+
+        Returns:
+            int: Number of alerts re-armed
+        """
+        # Only fired alerts can re-arm, so compute their percent change alone
+        if positions is None:
+            positions = np.array(sorted(
+                book.alert_positions[alert_id] for alert_id in self._fired_ids
+                if alert_id in book.alert_positions
+            ), dtype=np.intp)
+        else:
+            positions = np.array(
+                [i for i in positions.tolist() if book.alert_ids[i] in self._fired_ids], dtype=np.intp
+            )
+        if not len(positions):
+            return 0
+
+        _, percent_change, valid = book.percent_changes(prices, positions)
+        if self.rearm_band_percent is not None:
+            inside = np.abs(percent_change) <= self.rearm_band_percent
+        else:
+            inside = (percent_change < book.gain[positions]) & (percent_change > -book.loss[positions])
+
+        count = 0
+        for i in positions[valid & inside]:
+            alert_id = book.alert_ids[i]
+            self._fired_ids.discard(alert_id)
+            self._rearmed.append(alert_id)
+            count += 1
+        if count:
+            log.info(f"Re-armed {count} alerts")
+        return count
+
+    def should_fire(self, alert_id: str, now: Optional[datetime] = None) -> bool:
+        """Return True if the alert is armed and outside its cooldown."""
+        if alert_id in self._fired_ids:
+            return False
+        last = self._last_triggered_at.get(alert_id)
+        if last is not None and self.cooldown:
+            now = now or datetime.now(timezone.utc)
+            if now - last < self.cooldown:
+                return False
+        return True
+
+    def mark_fired(self, alert_id: str, alert_type: str, now: Optional[datetime] = None):
+        """Disarm an alert after it fires."""
+        self._fired_ids.add(alert_id)
+        self._last_triggered_at[alert_id] = now or datetime.now(timezone.utc)
+        self._newly_fired.setdefault(alert_type, []).append(alert_id)
+
+    def dedup_key(self, alert_id: str, alert_type: str) -> str:
+        """
+        Identify one excursion of an alert: the same until the fire is persisted,
+        so a run that crashes before persisting re-fires under the same key
+        """
+        last = self._last_triggered_at.get(alert_id)
+        return f"{alert_id}:{alert_type}:{last.isoformat() if last else 'first'}"
+
+    def filter_triggered(self, triggered: List[Dict]) -> List[Dict]:
+        """
+        Drop repeat triggers and disarm the alerts that do fire
+
+        Args:
+            triggered: Triggered alert dicts from AlertBook.evaluate
+
+        Returns:
+            Alerts that should be logged and notified, with dedup_key and triggered_at set
+        """
+        now = datetime.now(timezone.utc)
+        firing = []
+        for alert_info in triggered:
+            alert_id = alert_info['alert_id']
+            if self.should_fire(alert_id, now):
+                alert_info['dedup_key'] = self.dedup_key(alert_id, alert_info['alert_type'])
+                alert_info['triggered_at'] = now.isoformat()
+                self.mark_fired(alert_id, alert_info['alert_type'], now)
+                firing.append(alert_info)
+            elif alert_id not in self._fired_ids:
+                # Armed but inside its cooldown: remember when the stock must be re-checked
+                until = self._last_triggered_at[alert_id] + self.cooldown
+                stock_id = alert_info['stock_id']
+                self._cooling_until[stock_id] = min(until, self._cooling_until.get(stock_id, until))
+        suppressed = len(triggered) - len(firing)
+        if suppressed:
+            log.info(f"Suppressed {suppressed} repeat triggers")
+        return firing
+
+    def cooldown_expired(self, now: Optional[datetime] = None) -> Set[str]:
+        """
+        Stocks with a trigger that was suppressed by a cooldown which has since
+        ended, so they are re-checked even if their price has not moved
+        """
+        now = now or datetime.now(timezone.utc)
+        return {stock_id for stock_id, until in self._cooling_until.items() if until <= now}
+
+    def clear_cooldown(self, stock_id: str):
+        """Forget a stock's suppressed triggers before it is re-evaluated (filter_triggered re-records them)."""
+        self._cooling_until.pop(stock_id, None)
+
+    def pending_updates(self):
+        """
+        Return and clear state changes that still need persisting
+
+        Returns:
+            (re-armed alert ids, {alert_type: fired alert ids})
+        """
+        rearmed, fired = self._rearmed, self._newly_fired
+        self._rearmed, self._newly_fired = [], {}
+        return rearmed, fired
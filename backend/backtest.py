@@ -0,0 +1,472 @@
+import os
+import csv
+import sys
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from supabase import create_client
+
+from alert_evaluator import AlertBook
+from alert_reader import AlertReader
+from alert_state import AlertStateTracker
+from price_history import PriceHistoryReader
+from price_store import PriceStore, to_datetime64
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# stock_id -> (recorded_at as datetime64[us] UTC, price), both sorted by time
+PriceSeries = Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+
+def build_series(rows: Iterable[Dict]) -> PriceSeries:
+    """
+    Group price_history-shaped rows into per-stock time-sorted arrays
+
+    Args:
+        rows: Dicts with stock_id, price and recorded_at
+
+    Returns:
+        PriceSeries
+    """
+    columns: Dict[str, Tuple[List, List]] = {}
+    for row in rows:
+        try:
+            recorded_at = to_datetime64(row['recorded_at'])
+            price = float(row['price'])
+        except Exception as e:
+            log.warning(f"Skipping malformed price row: {str(e)}")
+            continue
+        times, prices = columns.setdefault(row['stock_id'], ([], []))
+        times.append(recorded_at)
+        prices.append(price)
+
+    series = {}
+    for stock_id, (times, prices) in columns.items():
+        times = np.array(times, dtype='datetime64[us]')
+        prices = np.array(prices, dtype=np.float64)
+        order = np.argsort(times, kind='stable')
+        series[stock_id] = times[order], prices[order]
+    return series
+
+
+def load_prices_csv(path: str) -> PriceSeries:
+    """
+    Load prices from a CSV export of price_history
+
+    Args:
+        path: CSV with stock_id, price and recorded_at columns
+
+    Returns:
+        PriceSeries
+    """
+    with open(path, newline='') as f:
+        return build_series(csv.DictReader(f))
+
+
+def load_alerts_csv(path: str) -> List[Dict]:
+    """
+    Load alert configs from a CSV
+
+    Args:
+        path: CSV with id, stock_id, baseline_price, gain_threshold_percent and
+              loss_threshold_percent columns (user_id and company_name optional)
+
+    Returns:
+        Alert rows shaped like AlertEngine.get_active_alerts results
+    """
+    with open(path, newline='') as f:
+        return [
+            {
+                'id': row['id'],
+                'user_id': row.get('user_id') or None,
+                'stock_id': row['stock_id'],
+                'baseline_price': row['baseline_price'],
+                'gain_threshold_percent': row['gain_threshold_percent'],
+                'loss_threshold_percent': row['loss_threshold_percent'],
+                'stocks': {'company_name': row.get('company_name') or row['stock_id']},
+                'user_profiles': {'email': row.get('user_email') or None},
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def sweep_alerts(stock_id: str, baseline_price: float, gains: Iterable[float],
+                 losses: Iterable[float]) -> List[Dict]:
+    """
+    Build one alert config per (gain, loss) pair for threshold tuning
+
+    Args:
+        stock_id: Stock to sweep
+        baseline_price: Baseline shared by every config
+        gains: Gain thresholds (%) to try
+        losses: Loss thresholds (%) to try
+
+    Returns:
+        Alert rows with ids like ``<stock_id>:g5:l3``
+    """
+    losses = list(losses)
+    return [
+        {
+            'id': f"{stock_id}:g{gain:g}:l{loss:g}",
+            'user_id': None,
+            'stock_id': stock_id,
+            'baseline_price': baseline_price,
+            'gain_threshold_percent': gain,
+            'loss_threshold_percent': loss,
+            'stocks': {'company_name': stock_id},
+            'user_profiles': {'email': None},
+        }
+        for gain in gains
+        for loss in losses
+    ]
+
+
+class AlertBacktester:
+    """
+    Replay historical prices through a set of alert configs and report which
+    alerts would have fired, and when
+
+    Each tick is checked exactly like AlertEngine.check_alert_condition (GAIN,
+    ``>=``, takes precedence over LOSS, ``<=``), and firing follows
+    AlertStateTracker: an alert fires once per excursion and re-arms once the
+    price is back inside its band (re-arming is applied before the check, as in
+    the live engine). Alerts start armed.
+
+    Without a cooldown the replay is vectorized over time x alerts per stock,
+    in chunks of about ``chunk_cells`` cells; a cooldown makes firing depend on
+    the previous fire, so each alert jumps from fire to fire with binary
+    searches over its trigger and re-arm ticks (one step per fire, not per tick).
+    """
+
+    def __init__(self, rearm_band_percent: float = None, cooldown_minutes: float = None,
+                 chunk_cells: int = None):
+        """
+        Initialize the backtester
+
+        Args:
+            rearm_band_percent: Re-arm only within this % of baseline (ALERT_REARM_BAND_PERCENT)
+            cooldown_minutes: Minimum minutes between fires of one alert (ALERT_COOLDOWN_MINUTES)
+            chunk_cells: Time x alert cells evaluated per chunk (BACKTEST_CHUNK_CELLS)
+        """
+        # Same defaults and env variables as the live tracker
+        tracker = AlertStateTracker(cooldown_minutes, rearm_band_percent)
+        self.rearm_band_percent = tracker.rearm_band_percent
+        self.cooldown = np.timedelta64(int(tracker.cooldown / timedelta(microseconds=1)), 'us')
+        self.chunk_cells = int(chunk_cells or os.getenv("BACKTEST_CHUNK_CELLS", "4000000"))
+
+    def run(self, series: PriceSeries, alerts: List[Dict]) -> List[Dict]:
+        """
+        Replay price series through alert configs
+
+        Args:
+            series: PriceSeries covering the alerts' stocks
+            alerts: Alert rows (AlertEngine.get_active_alerts, load_alerts_csv or sweep_alerts)
+
+        Returns:
+            Fire events ordered by time, shaped like the live engine's alert_info
+            dicts (alert_id, user_id, stock_id, company_name, alert_type,
+            current_price, baseline_price, percent_change, triggered_at)
+        """
+        book = AlertBook(alerts)
+        order = np.argsort(book.stock_index, kind='stable')
+        boundaries = np.flatnonzero(np.diff(book.stock_index[order])) + 1
+
+        events = []
+        for group in np.split(order, boundaries) if len(order) else []:
+            stock_position = int(book.stock_index[group[0]])
+            stock_id = book.stock_ids[stock_position]
+            if stock_id not in series:
+                log.warning(f"No price history for stock {stock_id}; skipping {len(group)} alerts")
+                continue
+            times, prices = series[stock_id]
+            for columns, rows, is_gain, percent_change in self._replay_stock(book, group, times, prices):
+                fired_at = times[rows].tolist()
+                for i, row, gain_fire, change, at in zip(
+                    group[columns].tolist(), rows.tolist(), is_gain.tolist(), percent_change.tolist(), fired_at
+                ):
+                    events.append((at, {
+                        'alert_id': book.alert_ids[i],
+                        'user_id': book.user_ids[i],
+                        'stock_id': stock_id,
+                        'company_name': book.company_names[stock_position],
+                        'alert_type': "GAIN" if gain_fire else "LOSS",
+                        'current_price': float(prices[row]),
+                        'baseline_price': float(book.baseline[i]),
+                        'percent_change': change,
+                        'triggered_at': at.replace(tzinfo=timezone.utc).isoformat(),
+                    }))
+
+        events.sort(key=lambda event: event[0])
+        return [event for _, event in events]
+
+    def _conditions(self, book: AlertBook, positions: np.ndarray, prices: np.ndarray):
+        """
+        Trigger and re-arm masks for a block of ticks
+
+        Returns:
+            (percent change, gain mask, loss mask, re-arm mask) arrays of shape
+            (alerts, ticks), so per-alert scans run over contiguous memory
+        """
+        baseline = book.baseline[positions][:, None]
+        gain = book.gain[positions][:, None]
+        loss = book.loss[positions][:, None]
+        # Same operation order as check_alert_condition, computed in place
+        percent_change = prices[None, :] - baseline
+        percent_change /= baseline
+        percent_change *= 100
+
+        # Missing (NaN) prices compare False everywhere, so they never fire or re-arm
+        gain_mask = percent_change >= gain
+        loss_mask = percent_change <= -loss
+        loss_mask &= ~gain_mask
+        if self.rearm_band_percent is not None:
+            rearm_mask = np.abs(percent_change) <= self.rearm_band_percent
+        else:
+            rearm_mask = percent_change < gain
+            rearm_mask &= percent_change > -loss
+        return percent_change, gain_mask, loss_mask, rearm_mask
+
+    def _replay_stock(self, book: AlertBook, positions: np.ndarray, times: np.ndarray, prices: np.ndarray):
+        """
+        Replay one stock's alerts chunk by chunk
+
+        Yields:
+            (alert columns, ticks, is-GAIN flags, percent changes) arrays for
+            the fires found in each chunk
+        """
+        # Zero baselines never fire (a ZeroDivisionError in the scalar path), as in AlertBook
+        positions = positions[book.baseline[positions] != 0]
+        count = len(positions)
+        if not count:
+            return
+        chunk_rows = max(1, self.chunk_cells // count)
+        tick_dtype = np.int32 if len(prices) < np.iinfo(np.int32).max else np.int64
+
+        # Carried across chunks: last re-arm tick and last trigger tick per alert
+        # (-1 means "armed at the start"; -2 "never triggered")
+        last_rearm = np.full(count, -1, dtype=tick_dtype)
+        last_trigger = np.full(count, -2, dtype=tick_dtype)
+        # Cooldown state: armed flag and last fire time per alert
+        armed = np.ones(count, dtype=bool)
+        last_fire = np.full(count, np.datetime64('NaT'), dtype='datetime64[us]')
+
+        for start in range(0, len(prices), chunk_rows):
+            stop = min(start + chunk_rows, len(prices))
+            percent_change, gain_mask, loss_mask, rearm_mask = self._conditions(book, positions, prices[start:stop])
+            trigger_mask = gain_mask | loss_mask
+
+            if self.cooldown:
+                fires = self._fires_with_cooldown(times[start:stop], trigger_mask, rearm_mask, armed, last_fire)
+            else:
+                ticks = np.arange(start, stop, dtype=tick_dtype)
+                rearm_upto = np.maximum.accumulate(np.where(rearm_mask, ticks, tick_dtype(-1)), axis=1)
+                np.maximum(rearm_upto, last_rearm[:, None], out=rearm_upto)
+                trigger_upto = np.maximum.accumulate(np.where(trigger_mask, ticks, tick_dtype(-2)), axis=1)
+                np.maximum(trigger_upto, last_trigger[:, None], out=trigger_upto)
+                # Armed at a tick iff it re-armed (same tick included) after the last trigger before it
+                fires = np.empty_like(trigger_mask)
+                fires[:, 0] = trigger_mask[:, 0] & (rearm_upto[:, 0] > last_trigger)
+                np.greater(rearm_upto[:, 1:], trigger_upto[:, :-1], out=fires[:, 1:])
+                fires[:, 1:] &= trigger_mask[:, 1:]
+                last_rearm, last_trigger = rearm_upto[:, -1], trigger_upto[:, -1]
+
+            columns, rows = np.nonzero(fires)
+            yield columns, start + rows, gain_mask[columns, rows], percent_change[columns, rows]
+
+    def _fires_with_cooldown(self, times: np.ndarray, trigger_mask: np.ndarray, rearm_mask: np.ndarray,
+                             armed: np.ndarray, last_fire: np.ndarray) -> np.ndarray:
+        """
+        Fires under a cooldown, updating armed/last_fire in place
+
+        An armed alert fires at its first trigger at least one cooldown after its
+        last fire (earlier triggers are suppressed and leave it armed); a fired
+        alert waits for its next re-arm tick. Both are found with searchsorted.
+        """
+        fires = np.zeros_like(trigger_mask)
+        count = trigger_mask.shape[0]
+        columns, rows = np.nonzero(trigger_mask)
+        trigger_bounds = np.searchsorted(columns, np.arange(count + 1))
+        rearm_columns, rearm_rows = np.nonzero(rearm_mask)
+        rearm_bounds = np.searchsorted(rearm_columns, np.arange(count + 1))
+
+        # Alerts without a trigger in this chunk can only re-arm
+        quiet = trigger_bounds[:-1] == trigger_bounds[1:]
+        armed[quiet] |= rearm_bounds[:-1][quiet] < rearm_bounds[1:][quiet]
+
+        for column in np.flatnonzero(~quiet).tolist():
+            triggers = rows[trigger_bounds[column]:trigger_bounds[column + 1]]
+            rearms = rearm_rows[rearm_bounds[column]:rearm_bounds[column + 1]]
+            tick = 0
+            while True:
+                if not armed[column]:
+                    # Re-arming precedes the trigger check, so a trigger on this tick counts
+                    k = int(np.searchsorted(rearms, tick))
+                    if k == len(rearms):
+                        break
+                    tick = int(rearms[k])
+                    armed[column] = True
+                if not np.isnat(last_fire[column]):
+                    tick = max(tick, int(np.searchsorted(times, last_fire[column] + self.cooldown)))
+                k = int(np.searchsorted(triggers, tick))
+                if k == len(triggers):
+                    break
+                tick = int(triggers[k])
+                fires[column, tick] = True
+                armed[column] = False
+                last_fire[column] = times[tick]
+                tick += 1
+        return fires
+
+def summarize(events: List[Dict], alerts: List[Dict]) -> List[Dict]:
+    """
+    Per-alert fire counts, including alerts that never fired
+
+    Args:
+        events: Result of AlertBacktester.run
+        alerts: The alert rows that were replayed
+
+    Returns:
+        Dicts with alert_id, stock_id, baseline_price, gain_threshold_percent,
+        loss_threshold_percent, fires, gain_fires, loss_fires, first_fired_at
+        and last_fired_at
+    """
+    summary = {}
+    for alert in alerts:
+        try:
+            summary[alert['id']] = {
+                'alert_id': alert['id'],
+                'stock_id': alert['stock_id'],
+                'baseline_price': float(alert['baseline_price']),
+                'gain_threshold_percent': float(alert['gain_threshold_percent']),
+                'loss_threshold_percent': float(alert['loss_threshold_percent']),
+                'fires': 0,
+                'gain_fires': 0,
+                'loss_fires': 0,
+                'first_fired_at': None,
+                'last_fired_at': None,
+            }
+        except Exception:
+            # Malformed rows were already reported and skipped by AlertBook
+            continue
+    for event in events:
+        row = summary[event['alert_id']]
+        row['fires'] += 1
+        row['gain_fires' if event['alert_type'] == "GAIN" else 'loss_fires'] += 1
+        row['first_fired_at'] = row['first_fired_at'] or event['triggered_at']
+        row['last_fired_at'] = event['triggered_at']
+    return list(summary.values())
+
+
+def write_csv(rows: List[Dict], out):
+    """Write dict rows as CSV (nothing for an empty list)."""
+    if not rows:
+        return
+    writer = csv.DictWriter(out, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def load_from_supabase(days: float, store: PriceStore = None,
+                       extra_stock_ids: Iterable[str] = ()) -> Tuple[PriceSeries, List[Dict]]:
+    """
+    Load active alerts and their stocks' raw price history from Supabase
+
+    Args:
+        days: Days of history to replay
+        store: Local price store to sync and read from instead of reading
+               price_history row by row
+        extra_stock_ids: Stocks to load prices for besides the alerts' stocks
+
+    Returns:
+        (PriceSeries, alert rows)
+    """
+    # A plain client: no scraper session or write buffer, so nothing but reads reaches the network
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    alerts = list(AlertReader(supabase).iter_alerts())
+    stock_ids = sorted({alert['stock_id'] for alert in alerts} | set(extra_stock_ids))
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    reader = PriceHistoryReader(supabase)
+    if store is not None:
+        store.sync(reader, stock_ids)
+        series = store.series(stock_ids, start)
+    else:
+        series = build_series(reader.iter_raw(stock_ids, start))
+    return series, alerts
+
+
+def parse_args(argv=None):
+    """Parse command-line options for a backtest run"""
+    parser = argparse.ArgumentParser(description="Replay price history through alert configs")
+    parser.add_argument("--prices", help="CSV of stock_id, price, recorded_at (default: price_history in Supabase)")
+    parser.add_argument("--alerts", help="CSV of alert configs (default: active alerts in Supabase)")
+    parser.add_argument(
+        "--days", type=float, default=float(os.getenv("BACKTEST_DAYS", "30")),
+        help="Days of history to replay from Supabase or the local price store"
+    )
+    parser.add_argument(
+        "--store", action="store_true",
+        help="Read prices from the local price store (PRICE_STORE_DIR), synced from price_history first"
+    )
+    parser.add_argument("--no-sync", action="store_true", help="With --store, replay what is stored without Supabase")
+    parser.add_argument("--sweep-stock", help="Sweep thresholds for this stock instead of using --alerts")
+    parser.add_argument("--baseline", type=float, help="Baseline for --sweep-stock (default: first price)")
+    parser.add_argument("--gains", default="2,5,10", help="Comma-separated gain thresholds for --sweep-stock")
+    parser.add_argument("--losses", default="2,5,10", help="Comma-separated loss thresholds for --sweep-stock")
+    parser.add_argument("--rearm-band", type=float, help="Re-arm band in percent (default: ALERT_REARM_BAND_PERCENT)")
+    parser.add_argument("--cooldown", type=float, help="Cooldown in minutes (default: ALERT_COOLDOWN_MINUTES)")
+    parser.add_argument("--events", action="store_true", help="Print every fire instead of the per-alert summary")
+    parser.add_argument("--output", help="Write CSV here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run a backtest from the command line"""
+    args = parse_args(argv)
+
+    sweep_stock_ids = [args.sweep_stock] if args.sweep_stock else []
+    if args.prices and (args.alerts or args.sweep_stock):
+        series = load_prices_csv(args.prices)
+        alerts = load_alerts_csv(args.alerts) if args.alerts else []
+    elif args.store and args.no_sync:
+        alerts = load_alerts_csv(args.alerts) if args.alerts else []
+        start = datetime.now(timezone.utc) - timedelta(days=args.days)
+        series = PriceStore().series({alert['stock_id'] for alert in alerts} | set(sweep_stock_ids), start)
+    else:
+        series, alerts = load_from_supabase(args.days, PriceStore() if args.store else None, sweep_stock_ids)
+        if args.prices:
+            series = load_prices_csv(args.prices)
+        if args.alerts:
+            alerts = load_alerts_csv(args.alerts)
+
+    if args.sweep_stock:
+        if args.sweep_stock not in series:
+            log.error(f"No price history for stock {args.sweep_stock}")
+            return 1
+        baseline = args.baseline if args.baseline is not None else float(series[args.sweep_stock][1][0])
+        alerts = sweep_alerts(
+            args.sweep_stock, baseline,
+            [float(value) for value in args.gains.split(',')],
+            [float(value) for value in args.losses.split(',')]
+        )
+
+    ticks = sum(len(prices) for _, prices in series.values())
+    log.info(f"Replaying {ticks} prices for {len(series)} stocks through {len(alerts)} alerts")
+    backtester = AlertBacktester(args.rearm_band, args.cooldown)
+    events = backtester.run(series, alerts)
+    log.info(f"{len(events)} alerts would have fired")
+
+    rows = events if args.events else summarize(events, alerts)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_csv(rows, f)
+    else:
+        write_csv(rows, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
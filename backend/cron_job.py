@@ -1,9 +1,15 @@
 import os
+import sys
+import time
+import signal
 import logging
+import argparse
+import threading
 from datetime import datetime
 import pytz
 from alert_engine import AlertEngine
 from discord_notifier import DiscordNotifier
+from notification_outbox import NotificationDispatcher, NotificationOutbox
 
 logging.basicConfig(
     level=logging.INFO,
@@ -40,10 +46,101 @@ def is_market_open():
         return False
 
 
-def main():
+def parse_args(argv=None):
+    """Parse command-line options for one-shot or daemon mode"""
+    parser = argparse.ArgumentParser(description="Check stock alerts and send Discord notifications")
+    parser.add_argument(
+        "--daemon", action="store_true",
+        default=os.getenv("CRON_DAEMON", "false").lower() in ("1", "true", "yes"),
+        help="Keep polling while the market is open instead of running once"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=float(os.getenv("POLL_INTERVAL_SECONDS", "60")),
+        help="Seconds between polls in daemon mode"
+    )
+    parser.add_argument(
+        "--max-runtime-minutes", type=float, default=float(os.getenv("DAEMON_MAX_RUNTIME_MINUTES", "0")),
+        help="Exit the daemon after this many minutes (0 = run until market close)"
+    )
+    return parser.parse_args(argv)
+
+
+def run_once(engine: AlertEngine, dispatcher: NotificationDispatcher):
+    """
+    Process alerts once, handing each triggered alert to the notification
+    workers as soon as it is found
+    
+    Args:
+        engine: Alert engine to run
+        dispatcher: Notification workers for triggered alerts
+    """
+    # Retry anything an earlier (possibly crashed) run left undelivered
+    dispatcher.drain_pending()
+    
+    # Process alerts; notifications go out while later stocks are still being scraped
+    log.info("Processing alerts...")
+    triggered_count = 0
+    for alert_info in engine.stream_alerts():
+        dispatcher.submit(alert_info)
+        triggered_count += 1
+    
+    sent, failed = dispatcher.wait(total_alerts=engine.alerts_checked)
+    if triggered_count or sent or failed:
+        log.info(f"{triggered_count} alerts triggered; sent {sent} notifications, {failed} failed")
+    else:
+        log.info("No alerts triggered")
+
+
+def run_daemon(engine: AlertEngine, dispatcher: NotificationDispatcher, interval: float,
+               max_runtime_minutes: float = 0):
+    """
+    Poll on a short interval while the market is open, reusing the warm engine
+    (HTTP sessions, Supabase client, cached alerts) between ticks
+    
+    Args:
+        engine: Alert engine to run
+        dispatcher: Notification workers for triggered alerts
+        interval: Seconds between the start of consecutive polls
+        max_runtime_minutes: Stop after this long (0 = until market close)
+    """
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        log.info(f"Received signal {signum}, stopping after the current poll")
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    deadline = time.monotonic() + max_runtime_minutes * 60 if max_runtime_minutes else None
+    ticks = 0
+    
+    while not stop.is_set() and is_market_open():
+        if deadline and time.monotonic() >= deadline:
+            log.info("Reached maximum daemon runtime")
+            break
+        
+        started = time.monotonic()
+        try:
+            run_once(engine, dispatcher)
+        except Exception as e:
+            # One bad tick must not take the daemon down
+            log.error(f"Error in poll: {str(e)}", exc_info=True)
+        ticks += 1
+        
+        elapsed = time.monotonic() - started
+        log.info(f"Poll {ticks} took {elapsed:.1f}s")
+        stop.wait(max(0.0, interval - elapsed))
+    
+    log.info(f"Daemon stopping after {ticks} polls")
+
+
+def main(argv=None):
     """Main cron job function"""
+    args = parse_args(argv)
+    
     log.info("=" * 60)
-    log.info("Stock Alert Cron Job Started")
+    log.info("Stock Alert Cron Job Started" + (" (daemon mode)" if args.daemon else ""))
     log.info("=" * 60)
     
     # Check if market is open
@@ -69,24 +166,28 @@ def main():
         log.error("DISCORD_WEBHOOK_URL environment variable not set")
         return
     
+    engine = None
+    notifier = None
+    dispatcher = None
     try:
-        # Initialize alert engine
+        # Initialize alert engine; the daemon keeps alert state between polls
         log.info("Initializing alert engine...")
-        engine = AlertEngine(supabase_url, supabase_key)
-        
-        # Process alerts
-        log.info("Processing alerts...")
-        triggered_alerts = engine.process_alerts()
+        engine = AlertEngine(
+            supabase_url, supabase_key,
+            incremental=True if args.daemon else None,
+            adaptive_polling=True if args.daemon else None
+        )
+        notifier = DiscordNotifier(discord_webhook)
+        # Durable outbox (notification_outbox table) for at-least-once delivery
+        use_outbox = os.getenv("NOTIFICATION_OUTBOX", "true").lower() in ("1", "true", "yes")
+        dispatcher = NotificationDispatcher(
+            notifier, NotificationOutbox(engine.supabase) if use_outbox else None
+        )
         
-        # Send Discord notifications
-        if triggered_alerts:
-            log.info(f"Sending {len(triggered_alerts)} Discord notifications...")
-            notifier = DiscordNotifier(discord_webhook)
-            
-            success_count = notifier.send_batch_alerts(triggered_alerts)
-            log.info(f"Successfully sent {success_count}/{len(triggered_alerts)} notifications")
+        if args.daemon:
+            run_daemon(engine, dispatcher, args.interval, args.max_runtime_minutes)
         else:
-            log.info("No alerts triggered")
+            run_once(engine, dispatcher)
         
         log.info("=" * 60)
         log.info("Stock Alert Cron Job Completed Successfully")
@@ -95,7 +196,17 @@ def main():
     except Exception as e:
         log.error(f"Error in cron job: {str(e)}", exc_info=True)
         raise
+    
+    finally:
+        if dispatcher is not None:
+            dispatcher.close()
+        if notifier is not None:
+            # Last chance for messages that failed during the run
+            notifier.flush_retries()
+            notifier.close()
+        if engine is not None:
+            engine.close()
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
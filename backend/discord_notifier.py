@@ -1,5 +1,12 @@
+import os
+import random
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List
 
 logging.basicConfig(level=logging.INFO)
@@ -9,84 +16,287 @@ log = logging.getLogger(__name__)
 class DiscordNotifier:
     """Send notifications to Discord via webhook"""
     
-    def __init__(self, webhook_url: str):
+    # Discord caps a webhook message at 10 embeds and 6000 characters of embed text
+    MAX_EMBEDS_PER_MESSAGE = 10
+    MAX_EMBED_CHARS_PER_MESSAGE = 6000
+    # ... and an embed description at 4096 characters
+    MAX_DESCRIPTION_CHARS = 4096
+    
+    def __init__(self, webhook_url: str, timeout: float = None, max_retries: int = None,
+                 workers: int = None, retry_queue_size: int = None):
         """
         Initialize Discord notifier
         
         Args:
             webhook_url: Discord webhook URL
+            timeout: Seconds before a webhook request is abandoned (DISCORD_TIMEOUT_SECONDS)
+            max_retries: Retries per message on 429/5xx/network errors (DISCORD_MAX_RETRIES)
+            workers: Messages sent concurrently (DISCORD_WORKERS)
+            retry_queue_size: Failed messages kept for a later retry (DISCORD_RETRY_QUEUE_SIZE)
         """
         self.webhook_url = webhook_url
+        self.timeout = float(timeout or os.getenv("DISCORD_TIMEOUT_SECONDS", "10"))
+        self.max_retries = int(
+            max_retries if max_retries is not None
+            else os.getenv("DISCORD_MAX_RETRIES", "5")
+        )
+        self.workers = int(workers or os.getenv("DISCORD_WORKERS", "4"))
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.workers, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # Webhook payloads that exhausted their retries, re-sent on the next batch
+        self.retry_queue = deque(maxlen=int(retry_queue_size or os.getenv("DISCORD_RETRY_QUEUE_SIZE", "1000")))
+        # Monotonic time until which the webhook's rate-limit bucket is exhausted
+        self._blocked_until = 0.0
+        self._rate_lock = threading.Lock()
     
-    def send_alert(self, alert_info: Dict) -> bool:
+    def close(self):
+        """Release pooled connections."""
+        self.session.close()
+    
+    # ──────────────────────────────────────────────────────────────
+    #  Embeds
+    # ──────────────────────────────────────────────────────────────
+    
+    @staticmethod
+    def build_embed(alert_info: Dict) -> Dict:
         """
-        Send alert notification to Discord
+        Build the rich embed for one triggered alert
         
         Args:
             alert_info: Dictionary containing alert details
             
         Returns:
-            bool: True if successful, False otherwise
+            dict: Discord embed
         """
-        try:
-            # Determine color based on alert type
-            color = 0x00FF00 if alert_info['alert_type'] == 'GAIN' else 0xFF0000
-            
-            # Determine emoji
-            emoji = "📈" if alert_info['alert_type'] == 'GAIN' else "📉"
-            
-            # Format percentage change
-            percent_change = alert_info['percent_change']
-            percent_str = f"+{percent_change:.2f}%" if percent_change > 0 else f"{percent_change:.2f}%"
+        # Determine color based on alert type
+        color = 0x00FF00 if alert_info['alert_type'] == 'GAIN' else 0xFF0000
+        
+        # Determine emoji
+        emoji = "📈" if alert_info['alert_type'] == 'GAIN' else "📉"
+        
+        # Format percentage change
+        percent_change = alert_info['percent_change']
+        percent_str = f"+{percent_change:.2f}%" if percent_change > 0 else f"{percent_change:.2f}%"
+        
+        return {
+            "title": f"{emoji} Stock Alert: {alert_info['company_name']}",
+            "description": f"**{alert_info['alert_type']} Alert Triggered!**",
+            "color": color,
+            "fields": [
+                {
+                    "name": "Current Price",
+                    "value": f"₹{alert_info['current_price']:,.2f}",
+                    "inline": True
+                },
+                {
+                    "name": "Baseline Price",
+                    "value": f"₹{alert_info['baseline_price']:,.2f}",
+                    "inline": True
+                },
+                {
+                    "name": "Change",
+                    "value": percent_str,
+                    "inline": True
+                }
+            ],
+            "footer": {
+                "text": f"Alert for {alert_info.get('user_email', 'user')}"
+            },
+            "timestamp": None  # Discord will use current time
+        }
+    
+    @staticmethod
+    def embed_length(embed: Dict) -> int:
+        """Characters an embed counts towards Discord's per-message limit."""
+        length = len(embed.get("title") or "") + len(embed.get("description") or "")
+        length += len((embed.get("footer") or {}).get("text") or "")
+        for field in embed.get("fields", []):
+            length += len(field.get("name") or "") + len(field.get("value") or "")
+        return length
+    
+    @staticmethod
+    def digest_line(alert_info: Dict) -> str:
+        """One line of a digest: direction, company, change and prices."""
+        emoji = "📈" if alert_info['alert_type'] == 'GAIN' else "📉"
+        percent_change = alert_info['percent_change']
+        percent_str = f"+{percent_change:.2f}%" if percent_change > 0 else f"{percent_change:.2f}%"
+        return (
+            f"{emoji} **{alert_info['company_name']}** {percent_str} · "
+            f"₹{alert_info['current_price']:,.2f} (from ₹{alert_info['baseline_price']:,.2f})"
+        )
+    
+    @classmethod
+    def build_digest_embeds(cls, alerts: List[Dict]) -> List[Dict]:
+        """
+        Build one user's digest: a single embed listing every alert, biggest
+        move first, continued in further embeds when it overflows the
+        description limit
+        
+        Args:
+            alerts: One user's triggered alerts
             
-            # Create rich embed message
-            embed = {
-                "title": f"{emoji} Stock Alert: {alert_info['company_name']}",
-                "description": f"**{alert_info['alert_type']} Alert Triggered!**",
+        Returns:
+            List of Discord embeds
+        """
+        alerts = sorted(alerts, key=lambda alert: abs(alert['percent_change']), reverse=True)
+        gains = sum(1 for alert in alerts if alert['alert_type'] == 'GAIN')
+        losses = len(alerts) - gains
+        if not losses:
+            color = 0x00FF00
+        elif not gains:
+            color = 0xFF0000
+        else:
+            color = 0x3498db
+        
+        # Split lines into descriptions that fit the limit
+        descriptions, current = [], ""
+        for line in (cls.digest_line(alert) for alert in alerts):
+            line = line[:cls.MAX_DESCRIPTION_CHARS]
+            if current and len(current) + 1 + len(line) > cls.MAX_DESCRIPTION_CHARS:
+                descriptions.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        descriptions.append(current)
+        
+        user_email = alerts[0].get('user_email', 'user')
+        title = f"📊 {len(alerts)} Stock Alerts ({gains} gain, {losses} loss)"
+        embeds = []
+        for part, description in enumerate(descriptions, start=1):
+            suffix = f" — {part}/{len(descriptions)}" if len(descriptions) > 1 else ""
+            embeds.append({
+                "title": title + suffix,
+                "description": description,
                 "color": color,
-                "fields": [
-                    {
-                        "name": "Current Price",
-                        "value": f"₹{alert_info['current_price']:,.2f}",
-                        "inline": True
-                    },
-                    {
-                        "name": "Baseline Price",
-                        "value": f"₹{alert_info['baseline_price']:,.2f}",
-                        "inline": True
-                    },
-                    {
-                        "name": "Change",
-                        "value": percent_str,
-                        "inline": True
-                    }
-                ],
                 "footer": {
-                    "text": f"Alert for {alert_info.get('user_email', 'user')}"
+                    "text": f"Digest for {user_email}"
                 },
                 "timestamp": None  # Discord will use current time
-            }
-            
-            payload = {
-                "embeds": [embed]
-            }
-            
-            response = requests.post(self.webhook_url, json=payload)
+            })
+        return embeds
+    
+    def pack_embeds(self, embeds: List[Dict]) -> List[List[Dict]]:
+        """
+        Split embeds into as few webhook messages as Discord allows
+        
+        Args:
+            embeds: Embeds in send order
             
-            if response.status_code == 204:
-                log.info(f"Successfully sent Discord notification for {alert_info['company_name']}")
-                return True
+        Returns:
+            List of embed lists, one per message
+        """
+        messages, current, current_length = [], [], 0
+        for embed in embeds:
+            length = self.embed_length(embed)
+            if current and (len(current) == self.MAX_EMBEDS_PER_MESSAGE
+                            or current_length + length > self.MAX_EMBED_CHARS_PER_MESSAGE):
+                messages.append(current)
+                current, current_length = [], 0
+            current.append(embed)
+            current_length += length
+        if current:
+            messages.append(current)
+        return messages
+    
+    # ──────────────────────────────────────────────────────────────
+    #  Delivery
+    # ──────────────────────────────────────────────────────────────
+    
+    def _wait_for_rate_limit(self):
+        with self._rate_lock:
+            delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _block_for(self, seconds: float):
+        with self._rate_lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+    
+    @staticmethod
+    def _seconds(value, default: float = 1.0) -> float:
+        """Parse a rate-limit delay from a header or JSON body, falling back to ``default``."""
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return default
+    
+    def _post(self, payload: Dict) -> bool:
+        """
+        POST a webhook message, honouring Discord's rate limits
+        
+        Waits out an exhausted bucket (X-RateLimit-Remaining / X-RateLimit-Reset-After),
+        retries 429s after ``retry_after`` and 5xx/network errors with jittered
+        exponential backoff.
+        
+        Returns:
+            bool: True if Discord accepted the message
+        """
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                log.warning(f"Discord webhook request failed: {str(e)}")
+                delay = (2 ** attempt) * 0.5 + random.uniform(0, 0.5)
             else:
-                log.error(f"Failed to send Discord notification. Status: {response.status_code}")
-                return False
+                if response.headers.get("X-RateLimit-Remaining") == "0":
+                    self._block_for(self._seconds(response.headers.get("X-RateLimit-Reset-After")))
+                
+                if response.status_code in (200, 204):
+                    return True
+                
+                if response.status_code == 429:
+                    try:
+                        retry_after = response.json().get("retry_after")
+                    except (ValueError, AttributeError):
+                        retry_after = None
+                    delay = self._seconds(retry_after if retry_after is not None else response.headers.get("Retry-After"))
+                    # Every sender shares the webhook's bucket, so block them all
+                    self._block_for(delay)
+                    log.warning(f"Discord rate limited, retrying in {delay:.1f}s")
+                    continue
+                
+                if response.status_code < 500:
+                    log.error(f"Discord rejected notification. Status: {response.status_code} {response.text[:200]}")
+                    return False
+                delay = (2 ** attempt) * 0.5 + random.uniform(0, 0.5)
+                log.warning(f"Discord returned {response.status_code}, retrying in {delay:.1f}s")
+            
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        
+        log.error(f"Giving up on Discord notification after {self.max_retries + 1} attempts")
+        return False
+    
+    def send_alert(self, alert_info: Dict) -> bool:
+        """
+        Send alert notification to Discord
         
+        Args:
+            alert_info: Dictionary containing alert details
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            payload = {"embeds": [self.build_embed(alert_info)]}
         except Exception as e:
-            log.error(f"Error sending Discord notification: {str(e)}")
+            log.error(f"Error building Discord notification: {str(e)}")
             return False
+        
+        if self._post(payload):
+            log.info(f"Successfully sent Discord notification for {alert_info['company_name']}")
+            return True
+        return False
     
     def send_batch_alerts(self, alerts: List[Dict]) -> int:
         """
-        Send multiple alerts to Discord
+        Send multiple alerts to Discord, up to 10 embeds per message, with
+        messages delivered concurrently; messages that still fail are queued and
+        retried on the next call (or by flush_retries)
         
         Args:
             alerts: List of alert dictionaries
@@ -94,14 +304,149 @@ class DiscordNotifier:
         Returns:
             int: Number of successfully sent alerts
         """
-        success_count = 0
+        self.flush_retries()
         
+        embeds = []
         for alert in alerts:
-            if self.send_alert(alert):
-                success_count += 1
+            try:
+                embeds.append(self.build_embed(alert))
+            except Exception as e:
+                log.error(f"Skipping malformed alert {alert.get('alert_id', 'unknown')}: {str(e)}")
+        
+        payloads = [{"embeds": message} for message in self.pack_embeds(embeds)]
+        return self._send_payloads(payloads)
+    
+    def send_alert_group(self, alerts: List[Dict], queue_failures: bool = False) -> bool:
+        """
+        Send a small group of alerts (normally up to 10) as packed messages
         
+        Args:
+            alerts: List of alert dictionaries
+            queue_failures: Put messages that fail on the retry queue; leave this
+                            off when the caller tracks delivery itself (outbox)
+            
+        Returns:
+            bool: True if every message was accepted
+        """
+        try:
+            embeds = [self.build_embed(alert) for alert in alerts]
+        except Exception as e:
+            log.error(f"Error building Discord notification: {str(e)}")
+            return False
+        delivered = True
+        for message in self.pack_embeds(embeds):
+            payload = {"embeds": message}
+            if not self._post(payload):
+                delivered = False
+                if queue_failures:
+                    self.retry_queue.append(payload)
+        if not delivered and queue_failures:
+            log.warning(f"{len(self.retry_queue)} Discord messages queued for retry")
+        return delivered
+    
+    def queue_for_retry(self, alerts: List[Dict]):
+        """
+        Put alerts on the retry queue as packed embed messages (for alerts whose
+        delivery failed outside the queue, e.g. an undelivered digest)
+        
+        Args:
+            alerts: List of alert dictionaries
+        """
+        try:
+            embeds = [self.build_embed(alert) for alert in alerts]
+        except Exception as e:
+            log.error(f"Error building Discord notification: {str(e)}")
+            return
+        for message in self.pack_embeds(embeds):
+            self.retry_queue.append({"embeds": message})
+        log.warning(f"{len(self.retry_queue)} Discord messages queued for retry")
+    
+    def send_digest(self, alerts: List[Dict], total_alerts: int = None) -> List[Dict]:
+        """
+        Send one digest message per user instead of one embed per alert (a
+        user whose digest overflows a message gets continuation messages), then
+        the run summary
+        
+        Args:
+            alerts: Triggered alerts, grouped by user_id (or user_email)
+            total_alerts: Active alerts checked this run; sends the summary when given
+            
+        Returns:
+            Alerts whose digest could not be delivered
+        """
+        if not alerts:
+            return []
+        
+        by_user: Dict[str, List[Dict]] = {}
+        for alert in alerts:
+            user_key = alert.get('user_id') or alert.get('user_email') or 'unknown'
+            by_user.setdefault(user_key, []).append(alert)
+        
+        jobs = []
+        failed = []
+        for user_alerts in by_user.values():
+            try:
+                embeds = self.build_digest_embeds(user_alerts)
+            except Exception as e:
+                log.error(f"Error building digest: {str(e)}")
+                failed.extend(user_alerts)
+                continue
+            jobs.append(([{"embeds": message} for message in self.pack_embeds(embeds)], user_alerts))
+        
+        def send_user_digest(payloads: List[Dict]) -> bool:
+            return all(self._post(payload) for payload in payloads)
+        
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs)),
+                                    thread_name_prefix="discord") as pool:
+                futures = {pool.submit(send_user_digest, payloads): user_alerts for payloads, user_alerts in jobs}
+                for future in as_completed(futures):
+                    if not future.result():
+                        failed.extend(futures[future])
+        
+        log.info(
+            f"Sent digests for {len(by_user)} users covering {len(alerts) - len(failed)} alerts "
+            f"({len(failed)} undelivered)"
+        )
+        if total_alerts is not None:
+            self.send_summary(total_alerts, len(alerts))
+        return failed
+    
+    def _send_payloads(self, payloads: List[Dict]) -> int:
+        """Send messages concurrently; queue the failures. Returns alerts delivered."""
+        if not payloads:
+            return 0
+        
+        success_count = 0
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(payloads)),
+                                thread_name_prefix="discord") as pool:
+            futures = {pool.submit(self._post, payload): payload for payload in payloads}
+            for future in as_completed(futures):
+                payload = futures[future]
+                if future.result():
+                    success_count += len(payload["embeds"])
+                else:
+                    self.retry_queue.append(payload)
+        
+        log.info(f"Delivered {success_count} alerts in {len(payloads)} Discord messages")
+        if self.retry_queue:
+            log.warning(f"{len(self.retry_queue)} Discord messages queued for retry")
         return success_count
     
+    def flush_retries(self) -> int:
+        """
+        Re-send messages that failed earlier
+        
+        Returns:
+            int: Number of alerts delivered from the retry queue
+        """
+        if not self.retry_queue:
+            return 0
+        payloads = list(self.retry_queue)
+        self.retry_queue.clear()
+        log.info(f"Retrying {len(payloads)} queued Discord messages")
+        return self._send_payloads(payloads)
+    
     def send_summary(self, total_alerts: int, triggered_alerts: int):
         """
         Send summary message to Discord
@@ -113,7 +458,7 @@ class DiscordNotifier:
         try:
             embed = {
                 "title": "📊 Stock Alert Summary",
-                "description": "Hourly alert check completed",
+                "description": "Alert check completed",
                 "color": 0x3498db,
                 "fields": [
                     {
@@ -130,7 +475,7 @@ class DiscordNotifier:
             }
             
             payload = {"embeds": [embed]}
-            requests.post(self.webhook_url, json=payload)
+            self._post(payload)
             
         except Exception as e:
             log.error(f"Error sending summary: {str(e)}")
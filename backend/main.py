@@ -1,9 +1,20 @@
 from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from supabase import create_client, Client
 from scraper import StockScraper
+from quote_cache import QuoteCache
+from price_history import PriceHistoryReader
+from price_store import PriceStore, to_datetime64
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
-from typing import Optional
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 import os
 
 # Setup logging
@@ -22,6 +33,107 @@ app.add_middleware(
 )
 
 
+# One long-lived scraper per worker: pooled connections, cookies refreshed in the background
+COOKIE_REFRESH_SECONDS = float(os.getenv("SCRAPER_COOKIE_REFRESH_SECONDS", "1800"))
+
+_scraper: Optional[StockScraper] = None
+_scraper_lock = threading.Lock()
+
+
+def get_scraper() -> StockScraper:
+    """Return the worker's shared StockScraper, creating it on first use."""
+    global _scraper
+    if _scraper is None:
+        with _scraper_lock:
+            if _scraper is None:
+                scraper = StockScraper(prime_session=False)
+                scraper.start_cookie_refresh(COOKIE_REFRESH_SECONDS)
+                _scraper = scraper
+    return _scraper
+
+
+# Scrapes use blocking requests code; run them on a bounded pool off the event loop
+SCRAPE_WORKERS = int(os.getenv("API_SCRAPE_WORKERS", "16"))
+_scrape_executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="api-scrape")
+
+
+async def run_scrape(func, *args):
+    """Await a blocking scraper call without stalling other requests on this worker."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_scrape_executor, func, *args)
+
+
+# Dashboard pages ask for the same companies repeatedly — serve them from a short-TTL cache
+quote_cache = QuoteCache()
+
+
+def quote_key(kind: str, company_name: str) -> tuple:
+    """Key quotes by resolved screener URL when known, else by normalized name."""
+    resolved = get_scraper().url_cache.get(company_name)
+    if resolved:
+        return kind, resolved[1]
+    return kind, " ".join(company_name.lower().split())
+
+
+async def cached_scrape(kind: str, func, company_name: str):
+    """Return (result, age_seconds), coalescing concurrent scrapes of the same company."""
+    return await quote_cache.get_or_fetch(
+        quote_key(kind, company_name),
+        lambda: run_scrape(func, company_name),
+    )
+
+
+# Stock ids in batch requests are resolved to company names via Supabase
+_supabase: Optional[Client] = None
+
+
+def get_supabase() -> Optional[Client]:
+    """Return a Supabase client if credentials are configured, else None."""
+    global _supabase
+    if _supabase is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+        if url and key:
+            _supabase = create_client(url, key)
+    return _supabase
+
+
+# Local memmap copy of price_history that serves raw chart ranges (PRICE_STORE)
+_price_store: Optional[PriceStore] = (
+    PriceStore() if os.getenv("PRICE_STORE", "false").lower() in ("1", "true", "yes") else None
+)
+
+
+def stored_raw_series(reader: PriceHistoryReader, stock_id: str, start: datetime) -> Dict:
+    """
+    Raw ticks from the local price store, topped up with the newest rows
+    (still inside the store's settle window) straight from price_history
+    """
+    _price_store.sync(reader, [stock_id])
+    times, prices = _price_store.slice(stock_id, start)
+    points = [
+        {'time': at.replace(tzinfo=timezone.utc).isoformat(), 'price': price}
+        for at, price in zip(times.tolist(), prices.tolist())
+    ]
+    tail_start = start
+    if len(times):
+        tail_start = max(start, times[-1].astype(datetime).replace(tzinfo=timezone.utc))
+    points.extend(
+        {'time': row['recorded_at'], 'price': float(row['price'])}
+        for row in reader.iter_raw([stock_id], tail_start)
+        if not len(times) or to_datetime64(row['recorded_at']) > times[-1]
+    )
+    return {'resolution': 'raw', 'points': points}
+
+
+@app.on_event("shutdown")
+def close_scraper():
+    """Release the shared scraper's connections when the worker stops."""
+    _scrape_executor.shutdown(wait=False)
+    if _scraper is not None:
+        _scraper.close()
+
+
 class SearchRequest(BaseModel):
     company_name: str
 
@@ -31,6 +143,25 @@ class SearchResponse(BaseModel):
     price: Optional[float]
     success: bool
     error: Optional[str] = None
+    age_seconds: Optional[float] = None
+
+
+class QuotesRequest(BaseModel):
+    company_names: List[str] = []
+    stock_ids: List[str] = []
+    stream: bool = False
+
+
+class QuoteResult(SearchResponse):
+    query: str
+    stock_id: Optional[str] = None
+
+
+class QuotesResponse(BaseModel):
+    results: List[QuoteResult]
+
+
+MAX_BATCH_QUOTES = 200
 
 
 class StockDetailsResponse(BaseModel):
@@ -44,6 +175,7 @@ class StockDetailsResponse(BaseModel):
     description: Optional[str] = None
     success: bool
     error: Optional[str] = None
+    age_seconds: Optional[float] = None
 
 
 @app.get("/")
@@ -73,16 +205,94 @@ async def search_stock(request: SearchRequest, response: Response):
     try:
         log.info(f"Searching for stock: {request.company_name}")
 
-        scraper = StockScraper()
-        result = scraper.scrape_stock_price(request.company_name)
+        scraper = get_scraper()
+        result, age = await cached_scrape("price", scraper.scrape_stock_price, request.company_name)
+        response.headers["Age"] = str(int(age))
 
-        return SearchResponse(**result)
+        return SearchResponse(**result, age_seconds=round(age, 1))
 
     except Exception as e:
         log.error(f"Error in search endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def is_stock_id(value: str) -> bool:
+    """Whether a value is a UUID, the format of stocks.id."""
+    try:
+        uuid.UUID(value)
+        return True
+    except (ValueError, TypeError, AttributeError):
+        return False
+
+
+def resolve_stock_ids(stock_ids: List[str]) -> dict:
+    """Map stock ids to company names with one Supabase query (malformed ids are left out)."""
+    supabase = get_supabase()
+    stock_ids = [stock_id for stock_id in stock_ids if is_stock_id(stock_id)]
+    if supabase is None or not stock_ids:
+        return {}
+    rows = supabase.table('stocks')\
+        .select('id, company_name')\
+        .in_('id', stock_ids)\
+        .execute().data
+    return {row['id']: row['company_name'] for row in rows}
+
+
+async def fetch_quote(query: str, company_name: Optional[str], stock_id: Optional[str] = None) -> QuoteResult:
+    """Fetch one quote of a batch through the shared cache; never raises."""
+    if company_name is None:
+        error = f'Unknown stock id "{stock_id}"' if is_stock_id(stock_id) else f'Invalid stock id "{stock_id}"'
+        return QuoteResult(query=query, stock_id=stock_id, company_name=query, price=None,
+                           success=False, error=error)
+    try:
+        result, age = await cached_scrape("price", get_scraper().scrape_stock_price, company_name)
+        return QuoteResult(**result, query=query, stock_id=stock_id, age_seconds=round(age, 1))
+    except Exception as e:
+        log.error(f"Error fetching quote for {query}: {str(e)}")
+        return QuoteResult(query=query, stock_id=stock_id, company_name=company_name, price=None,
+                           success=False, error=str(e))
+
+
+@app.post("/api/quotes", response_model=QuotesResponse)
+async def get_quotes(request: QuotesRequest, response: Response):
+    """
+    Fetch current prices for many stocks in one call, scraped concurrently
+
+    Args:
+        request: QuotesRequest with company_names and/or stock_ids; set stream
+                 to receive NDJSON lines as each quote completes
+
+    Returns:
+        QuotesResponse in request order, or an NDJSON stream of QuoteResult
+    """
+    if len(request.company_names) + len(request.stock_ids) > MAX_BATCH_QUOTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUOTES} stocks per request")
+
+    try:
+        names_by_id = await run_scrape(resolve_stock_ids, request.stock_ids) if request.stock_ids else {}
+    except Exception as e:
+        log.error(f"Error resolving stock ids: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    tasks = [asyncio.ensure_future(fetch_quote(name, name)) for name in request.company_names]
+    tasks += [
+        asyncio.ensure_future(fetch_quote(stock_id, names_by_id.get(stock_id), stock_id))
+        for stock_id in request.stock_ids
+    ]
+    no_cache_headers = {"Cache-Control": "no-store, no-cache, must-revalidate", "Pragma": "no-cache"}
+
+    if request.stream:
+        async def ndjson():
+            for task in asyncio.as_completed(tasks):
+                quote = await task
+                yield json.dumps(quote.model_dump()) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=no_cache_headers)
+
+    response.headers.update(no_cache_headers)
+    return QuotesResponse(results=await asyncio.gather(*tasks))
+
+
 @app.post("/api/stock-details", response_model=StockDetailsResponse)
 async def get_stock_details(request: SearchRequest, response: Response):
     """
@@ -101,16 +311,57 @@ async def get_stock_details(request: SearchRequest, response: Response):
     try:
         log.info(f"Fetching stock details for: {request.company_name}")
 
-        scraper = StockScraper()
-        result = scraper.scrape_stock_details(request.company_name)
+        scraper = get_scraper()
+        result, age = await cached_scrape("details", scraper.scrape_stock_details, request.company_name)
+        response.headers["Age"] = str(int(age))
 
-        return StockDetailsResponse(**result)
+        return StockDetailsResponse(**result, age_seconds=round(age, 1))
 
     except Exception as e:
         log.error(f"Error in stock-details endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class PriceHistoryResponse(BaseModel):
+    stock_id: str
+    resolution: str
+    points: List[Dict]
+
+
+@app.get("/api/price-history/{stock_id}", response_model=PriceHistoryResponse)
+async def get_price_history(stock_id: str, days: float = 30, resolution: Optional[str] = None):
+    """
+    Price history for a stock: raw ticks for short recent ranges, daily OHLC
+    rollups for longer ones.
+
+    Args:
+        stock_id: Stock UUID
+        days: How many days back to read
+        resolution: Force 'raw' or 'daily' (chosen from the range when omitted)
+
+    Returns:
+        PriceHistoryResponse with the points in time order
+    """
+    if resolution not in (None, "raw", "daily"):
+        raise HTTPException(status_code=400, detail="resolution must be 'raw' or 'daily'")
+    supabase = get_supabase()
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Price history is unavailable: Supabase is not configured")
+
+    try:
+        start = datetime.now(timezone.utc) - timedelta(days=days)
+        reader = PriceHistoryReader(supabase)
+        if _price_store is not None and (resolution or reader.resolution_for(start)) == 'raw':
+            series = await run_scrape(stored_raw_series, reader, stock_id, start)
+        else:
+            series = await run_scrape(reader.series, stock_id, start, None, resolution)
+        return PriceHistoryResponse(stock_id=stock_id, **series)
+
+    except Exception as e:
+        log.error(f"Error in price-history endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
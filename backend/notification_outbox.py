@@ -0,0 +1,321 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from supabase import Client
+
+from discord_notifier import DiscordNotifier
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class NotificationOutbox:
+    """
+    Durable record of triggered alerts awaiting delivery (notification_outbox table)
+
+    Every alert is written here before it is sent and marked sent afterwards,
+    so alerts from a run that crashed mid-way are delivered by the next run.
+    The dedup_key column is unique: re-enqueueing the same excursion is a no-op.
+    """
+
+    TABLE = 'notification_outbox'
+
+    def __init__(self, supabase: Client, max_attempts: int = None):
+        """
+        Initialize the outbox
+
+        Args:
+            supabase: Supabase client
+            max_attempts: Deliveries tried before a row is given up as failed (NOTIFICATION_MAX_ATTEMPTS)
+        """
+        self.supabase = supabase
+        self.max_attempts = int(max_attempts or os.getenv("NOTIFICATION_MAX_ATTEMPTS", "10"))
+
+    def enqueue(self, alert_info: Dict) -> Optional[Dict]:
+        """
+        Record a triggered alert
+
+        Args:
+            alert_info: Triggered alert dict with dedup_key set
+
+        Returns:
+            The new outbox row, or None if this dedup_key was already recorded
+
+        Raises:
+            Exception: If the row could not be written
+        """
+        response = self.supabase.table(self.TABLE)\
+            .upsert({
+                'dedup_key': alert_info['dedup_key'],
+                'user_id': alert_info['user_id'],
+                'payload': alert_info,
+                'status': 'pending'
+            }, on_conflict='dedup_key', ignore_duplicates=True)\
+            .execute()
+        return response.data[0] if response.data else None
+
+    def pending(self, limit: int = 500) -> List[Dict]:
+        """Return undelivered rows, oldest first."""
+        try:
+            response = self.supabase.table(self.TABLE)\
+                .select('*')\
+                .eq('status', 'pending')\
+                .order('created_at')\
+                .limit(limit)\
+                .execute()
+            return response.data
+        except Exception as e:
+            log.error(f"Error loading pending notifications: {str(e)}")
+            return []
+
+    def mark_sent(self, ids: List[str]):
+        try:
+            self.supabase.table(self.TABLE)\
+                .update({'status': 'sent', 'sent_at': datetime.utcnow().isoformat()})\
+                .in_('id', ids)\
+                .execute()
+        except Exception as e:
+            # The rows stay pending and are re-sent: at-least-once, not exactly-once
+            log.error(f"Error marking notifications sent: {str(e)}")
+
+    def mark_failed(self, rows: List[Dict], error: str):
+        for row in rows:
+            attempts = row.get('attempts', 0) + 1
+            try:
+                self.supabase.table(self.TABLE)\
+                    .update({
+                        'attempts': attempts,
+                        'status': 'failed' if attempts >= self.max_attempts else 'pending',
+                        'last_error': error
+                    })\
+                    .eq('id', row['id'])\
+                    .execute()
+            except Exception as e:
+                log.error(f"Error recording failed notification {row['id']}: {str(e)}")
+
+
+class NotificationDispatcher:
+    """
+    Worker pool that delivers triggered alerts while the engine is still
+    producing them
+
+    Alerts are recorded in the outbox first, then queued for the workers; each
+    worker sends whatever is queued (up to one 10-embed message) in one request.
+    Without an outbox, failed messages go on the notifier's retry queue, which
+    is retried after each run.
+
+    In digest mode alerts are instead held until the end of the run (or of the
+    digest window, which may span several daemon polls) and sent as one summary
+    message per user.
+    """
+
+    _STOP = object()
+
+    def __init__(self, notifier: DiscordNotifier, outbox: Optional[NotificationOutbox] = None,
+                 workers: int = None, digest: bool = None, digest_window: float = None):
+        """
+        Initialize and start the dispatcher
+
+        Args:
+            notifier: Discord notifier used for delivery
+            outbox: Durable outbox; without one, alerts are sent best-effort
+            workers: Delivery threads (NOTIFICATION_WORKERS)
+            digest: Send one digest per user instead of one embed per alert (NOTIFICATION_DIGEST)
+            digest_window: Seconds to collect alerts for a digest; 0 sends at the
+                           end of every run (NOTIFICATION_DIGEST_WINDOW_SECONDS)
+        """
+        self.notifier = notifier
+        self.outbox = outbox
+        self.workers = int(workers or os.getenv("NOTIFICATION_WORKERS", "2"))
+        if digest is None:
+            digest = os.getenv("NOTIFICATION_DIGEST", "false").lower() in ("1", "true", "yes")
+        self.digest = digest
+        self.digest_window = float(
+            digest_window if digest_window is not None
+            else os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", "0")
+        )
+        self._digest: List[Tuple[Optional[Dict], Dict]] = []
+        self._digest_started: Optional[float] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        # Outbox rows currently queued or being sent, so a re-drain never doubles them
+        self._in_flight: Set[str] = set()
+        self._sent = 0
+        self._failed = 0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"notify-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, alert_info: Dict):
+        """
+        Record an alert in the outbox and queue it for delivery
+
+        Args:
+            alert_info: Triggered alert dict (with dedup_key when an outbox is used)
+        """
+        row = None
+        if self.outbox is not None:
+            try:
+                row = self.outbox.enqueue(alert_info)
+            except Exception as e:
+                log.error(f"Outbox write failed, sending {alert_info['alert_id']} without it: {str(e)}")
+            else:
+                if row is None:
+                    log.info(f"Skipping duplicate notification {alert_info['dedup_key']}")
+                    return
+        self._put(row, alert_info)
+
+    def drain_pending(self) -> int:
+        """
+        Queue outbox rows left undelivered by earlier runs
+
+        Returns:
+            int: Number of rows queued
+        """
+        if self.outbox is None:
+            return 0
+        count = 0
+        for row in self.outbox.pending():
+            if self._put(row, row['payload']):
+                count += 1
+        if count:
+            log.info(f"Re-queued {count} undelivered notifications from the outbox")
+        return count
+
+    def _put(self, row: Optional[Dict], alert_info: Dict) -> bool:
+        if row is not None:
+            with self._lock:
+                if row['id'] in self._in_flight:
+                    return False
+                self._in_flight.add(row['id'])
+        if self.digest:
+            with self._lock:
+                if not self._digest:
+                    self._digest_started = time.monotonic()
+                self._digest.append((row, alert_info))
+            return True
+        self._queue.put((row, alert_info))
+        return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                self._queue.task_done()
+                return
+
+            # Pack whatever else is already waiting into the same message
+            batch = [item]
+            stop_seen = False
+            while len(batch) < DiscordNotifier.MAX_EMBEDS_PER_MESSAGE:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is self._STOP:
+                    stop_seen = True
+                    break
+                batch.append(extra)
+
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop_seen:
+                self._queue.task_done()
+                return
+
+    def _deliver(self, batch: List[Tuple[Optional[Dict], Dict]]):
+        try:
+            # Without an outbox the notifier's retry queue is the only second chance
+            delivered = self.notifier.send_alert_group(
+                [alert_info for _, alert_info in batch], queue_failures=self.outbox is None
+            )
+        except Exception as e:
+            log.error(f"Error delivering notifications: {str(e)}")
+            delivered = False
+
+        self._record(batch if delivered else [], [] if delivered else batch)
+
+    def _record(self, delivered: List[Tuple[Optional[Dict], Dict]], failed: List[Tuple[Optional[Dict], Dict]]):
+        """Update the outbox and counters after a delivery attempt."""
+        if self.outbox is not None:
+            sent_ids = [row['id'] for row, _ in delivered if row is not None]
+            if sent_ids:
+                self.outbox.mark_sent(sent_ids)
+            failed_rows = [row for row, _ in failed if row is not None]
+            if failed_rows:
+                self.outbox.mark_failed(failed_rows, "Discord delivery failed")
+        with self._lock:
+            for row, _ in delivered + failed:
+                if row is not None:
+                    self._in_flight.discard(row['id'])
+            self._sent += len(delivered)
+            self._failed += len(failed)
+
+    def flush_digest(self, total_alerts: int = None, force: bool = False):
+        """
+        Send the collected digest once its window has elapsed
+
+        Args:
+            total_alerts: Active alerts checked, for the run summary
+            force: Send even if the window is still open
+        """
+        with self._lock:
+            if not self._digest:
+                return
+            if not force and self.digest_window and time.monotonic() - self._digest_started < self.digest_window:
+                return
+            batch, self._digest = self._digest, []
+
+        try:
+            undelivered = self.notifier.send_digest([alert_info for _, alert_info in batch], total_alerts)
+        except Exception as e:
+            log.error(f"Error delivering digest: {str(e)}")
+            undelivered = [alert_info for _, alert_info in batch]
+        if undelivered and self.outbox is None:
+            self.notifier.queue_for_retry(undelivered)
+        undelivered_ids = {id(alert_info) for alert_info in undelivered}
+        self._record(
+            [item for item in batch if id(item[1]) not in undelivered_ids],
+            [item for item in batch if id(item[1]) in undelivered_ids]
+        )
+
+    def wait(self, total_alerts: int = None) -> Tuple[int, int]:
+        """
+        Block until everything queued so far has been attempted (in digest
+        mode: send the digest if its window has elapsed)
+
+        Args:
+            total_alerts: Active alerts checked this run, for the digest summary
+
+        Returns:
+            (alerts delivered, alerts failed) since the previous wait
+        """
+        self._queue.join()
+        if self.digest:
+            self.flush_digest(total_alerts)
+        if self.outbox is None:
+            # Outbox rows are re-sent by drain_pending; without one, retry queued messages here
+            self.notifier.flush_retries()
+        with self._lock:
+            counts = (self._sent, self._failed)
+            self._sent = self._failed = 0
+        return counts
+
+    def close(self):
+        """Finish queued deliveries, send any held digest and stop the workers."""
+        self.flush_digest(force=True)
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
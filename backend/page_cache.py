@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class PageCache:
+    """
+    On-disk cache of screener.in company pages, gzip-compressed, plus the
+    slow-moving fields parsed from them.
+
+    Raw pages are kept with their ETag / Last-Modified so the next fetch can be a
+    conditional request; parsed fundamentals are served for ``fields_ttl_hours``
+    without re-parsing the whole page. Entries are evicted once older than
+    ``max_age_hours`` or, oldest first, once the directory exceeds ``max_mb``.
+    """
+
+    DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "screener_page_cache")
+    DEFAULT_MAX_MB = 64
+    DEFAULT_MAX_AGE_HOURS = 48
+    DEFAULT_FIELDS_TTL_HOURS = 12
+    # Minimum seconds between two directory scans for eviction
+    EVICT_INTERVAL = 60
+
+    def __init__(self, directory: str = None, max_mb: float = None,
+                 max_age_hours: float = None, fields_ttl_hours: float = None):
+        """
+        Initialize the cache
+
+        Args:
+            directory: Directory to store entries in (SCREENER_PAGE_CACHE_DIR)
+            max_mb: Size limit of the directory in MB (SCREENER_PAGE_CACHE_MAX_MB)
+            max_age_hours: Hours before an entry is evicted (SCREENER_PAGE_CACHE_MAX_AGE_HOURS)
+            fields_ttl_hours: Hours parsed fundamentals are served for (SCREENER_FUNDAMENTALS_TTL_HOURS)
+        """
+        self.directory = directory or os.getenv("SCREENER_PAGE_CACHE_DIR", self.DEFAULT_DIR)
+        self.max_bytes = 1024 * 1024 * float(
+            max_mb if max_mb is not None
+            else os.getenv("SCREENER_PAGE_CACHE_MAX_MB", self.DEFAULT_MAX_MB)
+        )
+        self.max_age_seconds = 3600 * float(
+            max_age_hours if max_age_hours is not None
+            else os.getenv("SCREENER_PAGE_CACHE_MAX_AGE_HOURS", self.DEFAULT_MAX_AGE_HOURS)
+        )
+        self.fields_ttl_seconds = 3600 * float(
+            fields_ttl_hours if fields_ttl_hours is not None
+            else os.getenv("SCREENER_FUNDAMENTALS_TTL_HOURS", self.DEFAULT_FIELDS_TTL_HOURS)
+        )
+        self._lock = threading.Lock()
+        self._last_evicted = 0.0
+
+    def _path(self, url: str, kind: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.{kind}.json.gz")
+
+    def _read(self, path: str) -> Optional[Dict]:
+        try:
+            # mtime is refreshed on revalidation, so age counts from the last 304/200
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"Ignoring unreadable page cache entry {path}: {e}")
+            return None
+
+    def _write(self, path: str, entry: Dict):
+        """Write an entry atomically so concurrent readers never see a torn file."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(entry).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.warning(f"Could not write page cache entry {path}: {e}")
+            return
+        self._maybe_evict()
+
+    # ──────────────────────────────────────────────────────────────
+    #  Raw pages (conditional revalidation)
+    # ──────────────────────────────────────────────────────────────
+
+    def get_page(self, url: str) -> Optional[Dict]:
+        """Return {html, etag, last_modified, stored_at} for a cached page, or None."""
+        return self._read(self._path(url, "page"))
+
+    def put_page(self, url: str, html: str, etag: str = None, last_modified: str = None):
+        """Store a page; pages without validators can't be revalidated and are skipped."""
+        if not etag and not last_modified:
+            return
+        self._write(self._path(url, "page"), {
+            "url": url,
+            "html": html,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+        })
+
+    def touch_page(self, url: str):
+        """Mark a page as revalidated (the server answered 304 Not Modified)."""
+        path = self._path(url, "page")
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # ──────────────────────────────────────────────────────────────
+    #  Parsed fields (served without refetching the page)
+    # ──────────────────────────────────────────────────────────────
+
+    def get_fields(self, url: str) -> Optional[Dict]:
+        """Return the page's cached parsed fields if younger than the fields TTL."""
+        entry = self._read(self._path(url, "fields"))
+        if not entry or time.time() - entry["stored_at"] > self.fields_ttl_seconds:
+            return None
+        return entry["fields"]
+
+    def put_fields(self, url: str, fields: Dict):
+        """Remember fields parsed from a page."""
+        self._write(self._path(url, "fields"), {
+            "url": url,
+            "fields": fields,
+            "stored_at": time.time(),
+        })
+
+    # ──────────────────────────────────────────────────────────────
+    #  Eviction
+    # ──────────────────────────────────────────────────────────────
+
+    def _maybe_evict(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_evicted < self.EVICT_INTERVAL:
+                return
+            self._last_evicted = now
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Delete expired entries, then the least recently stored until the
+        directory fits within the size limit
+
+        Returns:
+            int: Number of files deleted
+        """
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".json.gz"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return 0
+
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        deleted = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            deleted += 1
+        if deleted:
+            log.info(f"Evicted {deleted} page cache entries")
+        return deleted
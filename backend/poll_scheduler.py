@@ -0,0 +1,191 @@
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from alert_evaluator import AlertBook
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """
+    Adaptive per-stock polling: each stock gets a next-poll time from how far its
+    price is from the nearest alert trigger and how volatile it has been.
+
+    Treating the price as a random walk with per-second volatility ``sigma``, a
+    move of relative size ``d`` takes on the order of ``(d / (z * sigma))**2``
+    seconds at ``z`` standard deviations, so quiet stocks far from any trigger
+    are polled rarely and stocks near a threshold often. A token bucket caps the
+    number of polls handed out per minute.
+    """
+
+    # 2% daily move over a 6h15m trading session, used until a stock has history
+    DEFAULT_DAILY_VOLATILITY = 0.02
+    TRADING_SECONDS_PER_DAY = 6.25 * 3600
+    # Weight of the previous variance in the EWMA volatility estimate
+    EWMA_DECAY = 0.94
+
+    def __init__(self, min_interval: float = None, max_interval: float = None,
+                 budget_per_minute: float = None, z_score: float = None):
+        """
+        Initialize the scheduler
+
+        Args:
+            min_interval: Shortest gap between polls of one stock, seconds (POLL_MIN_INTERVAL_SECONDS)
+            max_interval: Longest gap between polls of one stock, seconds (POLL_MAX_INTERVAL_SECONDS)
+            budget_per_minute: Polls allowed per minute across all stocks (POLL_BUDGET_PER_MINUTE)
+            z_score: Safety margin in standard deviations (POLL_Z_SCORE)
+        """
+        self.min_interval = float(min_interval or os.getenv("POLL_MIN_INTERVAL_SECONDS", "60"))
+        self.max_interval = float(max_interval or os.getenv("POLL_MAX_INTERVAL_SECONDS", "1800"))
+        self.budget_per_minute = float(budget_per_minute or os.getenv("POLL_BUDGET_PER_MINUTE", "120"))
+        self.z_score = float(z_score or os.getenv("POLL_Z_SCORE", "3"))
+
+        default_sigma = self.DEFAULT_DAILY_VOLATILITY / math.sqrt(self.TRADING_SECONDS_PER_DAY)
+        self._default_variance = default_sigma ** 2
+        self._variance: Dict[str, float] = {}
+        self._last_observed: Dict[str, tuple] = {}
+        self._next_poll: Dict[str, float] = {}
+        self._distance: Dict[str, float] = {}
+        self._seeded: Set[str] = set()
+
+        self._tokens = self.budget_per_minute
+        self._tokens_at = time.monotonic()
+
+    def knows(self, stock_id: str) -> bool:
+        """Return True if the stock's history has already been loaded."""
+        return stock_id in self._seeded
+
+    def observe(self, stock_id: str, price: float, at: Optional[float] = None):
+        """
+        Update the stock's volatility estimate with a new price
+
+        Args:
+            stock_id: Stock UUID
+            price: Observed price
+            at: Observation time as a UNIX timestamp (defaults to now)
+        """
+        at = time.time() if at is None else at
+        previous = self._last_observed.get(stock_id)
+        self._last_observed[stock_id] = (at, price)
+        if previous is None or price <= 0 or previous[1] <= 0:
+            return
+
+        elapsed = at - previous[0]
+        if elapsed <= 0:
+            return
+        # Per-second variance of log returns, smoothed with an EWMA
+        sample = math.log(price / previous[1]) ** 2 / elapsed
+        variance = self._variance.get(stock_id, self._default_variance)
+        self._variance[stock_id] = self.EWMA_DECAY * variance + (1 - self.EWMA_DECAY) * sample
+
+    def load_history(self, rows: Iterable[Dict], stock_ids: Iterable[str] = ()):
+        """
+        Seed volatility from price_history rows ordered by recorded_at
+
+        Args:
+            rows: Dicts with stock_id, price and recorded_at
+            stock_ids: Stocks the rows were loaded for, marked as seeded even without history
+        """
+        self._seeded.update(stock_ids)
+        for row in rows:
+            try:
+                at = datetime.fromisoformat(row['recorded_at']).timestamp()
+                self.observe(row['stock_id'], float(row['price']), at)
+            except Exception as e:
+                log.warning(f"Skipping price_history row: {str(e)}")
+
+    def load_series(self, series: Dict[str, tuple], stock_ids: Iterable[str] = ()):
+        """
+        Seed volatility from time-sorted price arrays (PriceStore.series)
+
+        Args:
+            series: stock_id -> (datetime64 times, prices)
+            stock_ids: Stocks the series were loaded for, marked as seeded even without history
+        """
+        self._seeded.update(stock_ids)
+        for stock_id, (times, prices) in series.items():
+            seconds = times.astype('datetime64[us]').astype(np.int64) / 1e6
+            for at, price in zip(seconds.tolist(), prices.tolist()):
+                self.observe(stock_id, price, at)
+
+    def reschedule(self, book: AlertBook, prices: Dict[str, float], now: Optional[float] = None):
+        """
+        Set the next poll time of every priced stock
+
+        Args:
+            book: Alerts on the priced stocks; a stock missing from the book keeps
+                  its previous trigger distance (its price and alerts are unchanged)
+            prices: Dict of stock_id -> latest price
+            now: Monotonic time of the poll (defaults to now)
+        """
+        now = time.monotonic() if now is None else now
+        self._distance.update(self.trigger_distances(book, prices))
+        for stock_id in prices:
+            distance = self._distance.get(stock_id, math.inf)
+            sigma = math.sqrt(self._variance.get(stock_id, self._default_variance))
+            if math.isinf(distance) or sigma == 0:
+                interval = self.max_interval
+            else:
+                interval = (distance / (self.z_score * sigma)) ** 2
+            self._next_poll[stock_id] = now + min(self.max_interval, max(self.min_interval, interval))
+
+    @staticmethod
+    def trigger_distances(book: AlertBook, prices: Dict[str, float]) -> Dict[str, float]:
+        """
+        Relative distance from each stock's price to its nearest alert trigger
+
+        Returns:
+            Dict of stock_id -> distance as a fraction of price (0 when already crossed)
+        """
+        if not len(book):
+            return {}
+        price_vector = book.price_vector(prices)
+        current = price_vector[book.stock_index]
+        gain_price = book.baseline * (1 + book.gain / 100)
+        loss_price = book.baseline * (1 - book.loss / 100)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            to_gain = np.maximum(gain_price - current, 0) / current
+            to_loss = np.maximum(current - loss_price, 0) / current
+        per_alert = np.fmin(to_gain, to_loss)
+        per_alert[np.isnan(per_alert)] = np.inf
+
+        nearest = np.full(len(book.stock_ids), np.inf)
+        np.minimum.at(nearest, book.stock_index, per_alert)
+        return {
+            stock_id: float(nearest[position])
+            for position, stock_id in enumerate(book.stock_ids)
+            if not np.isnan(price_vector[position])
+        }
+
+    def due(self, stock_ids: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """
+        Return the stocks to poll now, most overdue first, within the request budget
+
+        Args:
+            stock_ids: Candidate stocks (never-polled stocks are always due)
+            now: Monotonic time (defaults to now)
+        """
+        now = time.monotonic() if now is None else now
+        self._tokens = min(
+            self.budget_per_minute,
+            self._tokens + (now - self._tokens_at) * self.budget_per_minute / 60
+        )
+        self._tokens_at = now
+
+        overdue = sorted(
+            (self._next_poll.get(stock_id, -math.inf), stock_id)
+            for stock_id in stock_ids
+            if self._next_poll.get(stock_id, -math.inf) <= now
+        )
+        selected = [stock_id for _, stock_id in overdue[:int(self._tokens)]]
+        self._tokens -= len(selected)
+        if len(selected) < len(overdue):
+            log.info(f"Poll budget exhausted: deferring {len(overdue) - len(selected)} stocks")
+        return selected
@@ -0,0 +1,89 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class PriceDeadband:
+    """
+    Deadband compression for price_history writes: a price is stored only when
+    it leaves the band around the last stored price for its stock, or when the
+    heartbeat interval has passed since that point was stored.
+
+    The band's half-width is the larger of ``absolute`` and ``percent`` of the
+    last stored price; with both at 0 only unchanged prices are dropped.
+    Alert evaluation always sees every scraped price — only storage is thinned.
+    """
+
+    def __init__(self, absolute: float = None, percent: float = None, heartbeat_minutes: float = None):
+        """
+        Initialize the deadband
+
+        Args:
+            absolute: Minimum absolute move to store, in ₹ (PRICE_DEADBAND_ABSOLUTE)
+            percent: Minimum percent move to store (PRICE_DEADBAND_PERCENT)
+            heartbeat_minutes: Store a point at least this often, whatever the move
+                               (PRICE_HEARTBEAT_MINUTES)
+        """
+        self.absolute = float(absolute if absolute is not None else os.getenv("PRICE_DEADBAND_ABSOLUTE", "0"))
+        self.percent = float(percent if percent is not None else os.getenv("PRICE_DEADBAND_PERCENT", "0"))
+        self.heartbeat = timedelta(minutes=float(
+            heartbeat_minutes if heartbeat_minutes is not None
+            else os.getenv("PRICE_HEARTBEAT_MINUTES", "30")
+        ))
+        self._last: Dict[str, Tuple[float, datetime]] = {}
+        self._seeded: Set[str] = set()
+        self.stored = 0
+        self.dropped = 0
+
+    def knows(self, stock_id: str) -> bool:
+        """Return True if the stock's last stored price has been loaded or seen."""
+        return stock_id in self._seeded
+
+    def seed(self, rows: Iterable[Dict], stock_ids: Iterable[str] = ()):
+        """
+        Load the last stored price per stock (price_history_latest rows)
+
+        Args:
+            rows: Dicts with stock_id, price and recorded_at
+            stock_ids: Stocks the rows were loaded for, marked as seeded even without history
+        """
+        self._seeded.update(stock_ids)
+        for row in rows:
+            try:
+                recorded_at = datetime.fromisoformat(row['recorded_at'])
+                if recorded_at.tzinfo is None:
+                    recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+                self._last[row['stock_id']] = (float(row['price']), recorded_at)
+            except Exception as e:
+                log.warning(f"Skipping latest-price row: {str(e)}")
+
+    def should_store(self, stock_id: str, price: float, at: Optional[datetime] = None,
+                     force: bool = False) -> bool:
+        """
+        Decide whether a scraped price is stored, remembering it if so
+
+        Args:
+            stock_id: Stock UUID
+            price: Scraped price
+            at: Scrape time (defaults to now, UTC)
+            force: Store regardless of the band (e.g. the price triggered an alert)
+
+        Returns:
+            bool: True if the price should be written to price_history
+        """
+        at = at or datetime.now(timezone.utc)
+        self._seeded.add(stock_id)
+        last = self._last.get(stock_id)
+        if not force and last is not None:
+            last_price, last_at = last
+            band = max(self.absolute, abs(last_price) * self.percent / 100)
+            if abs(price - last_price) <= band and at - last_at < self.heartbeat:
+                self.dropped += 1
+                return False
+        self._last[stock_id] = (price, at)
+        self.stored += 1
+        return True
@@ -0,0 +1,203 @@
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class PriceHistoryReader:
+    """
+    Read price history at the resolution a time range needs: raw ticks from
+    price_history for short, recent ranges and daily OHLC rows from
+    price_history_daily otherwise (raw ticks are only kept for the retention
+    window; see migration_alert_engine.sql section 5)
+    """
+
+    RAW_TABLE = 'price_history'
+    DAILY_TABLE = 'price_history_daily'
+    SETTINGS_TABLE = 'price_history_settings'
+    DEFAULT_RETENTION_DAYS = 90.0
+    SETTINGS_TTL_SECONDS = 300
+
+    # Process-wide cache of price_history_settings.retention_days: (value, read at)
+    _retention_cache: Optional[tuple] = None
+
+    def __init__(self, supabase: Client, raw_max_days: float = None, retention_days: float = None,
+                 page_size: int = None):
+        """
+        Initialize the reader
+
+        Args:
+            supabase: Supabase client
+            raw_max_days: Longest range served from raw ticks (PRICE_HISTORY_RAW_MAX_DAYS)
+            retention_days: Days raw ticks are kept before purging (read from
+                price_history_settings, the value the pg_cron purge uses, when omitted)
+            page_size: Rows per request (PostgREST caps responses at 1000 by default)
+        """
+        self.supabase = supabase
+        self.raw_max_days = float(raw_max_days or os.getenv("PRICE_HISTORY_RAW_MAX_DAYS", "31"))
+        self._retention_days = float(retention_days) if retention_days else None
+        self.page_size = page_size or 1000
+
+    @property
+    def retention_days(self) -> float:
+        """Days raw ticks are kept; price_history_settings is the single source of truth."""
+        if self._retention_days is not None:
+            return self._retention_days
+        cached = PriceHistoryReader._retention_cache
+        if cached is not None and time.monotonic() - cached[1] < self.SETTINGS_TTL_SECONDS:
+            return cached[0]
+        try:
+            rows = self.supabase.table(self.SETTINGS_TABLE).select('retention_days').limit(1).execute().data
+            retention_days = float(rows[0]['retention_days']) if rows else self.DEFAULT_RETENTION_DAYS
+        except Exception as e:
+            log.warning(f"Could not read {self.SETTINGS_TABLE}, assuming {self.DEFAULT_RETENTION_DAYS:g} days: {str(e)}")
+            return cached[0] if cached is not None else self.DEFAULT_RETENTION_DAYS
+        PriceHistoryReader._retention_cache = (retention_days, time.monotonic())
+        return retention_days
+
+    def resolution_for(self, start: datetime, end: Optional[datetime] = None) -> str:
+        """Return 'raw' or 'daily' for a time range."""
+        now = datetime.now(timezone.utc)
+        end = end or now
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        if end - start <= timedelta(days=self.raw_max_days) and start >= now - timedelta(days=self.retention_days):
+            return 'raw'
+        return 'daily'
+
+    def iter_raw(self, stock_ids: Iterable[str], start: datetime, end: Optional[datetime] = None) -> Iterator[Dict]:
+        """
+        Stream raw ticks ordered by (recorded_at, id), keyset-paginated
+
+        Args:
+            stock_ids: Stocks to read
+            start: Inclusive lower bound on recorded_at
+            end: Exclusive upper bound on recorded_at (defaults to now)
+
+        Yields:
+            Dicts with id, stock_id, price and recorded_at
+        """
+        stock_ids = list(stock_ids)
+        if not stock_ids:
+            return
+        cursor = None
+        while True:
+            query = self.supabase.table(self.RAW_TABLE)\
+                .select('id, stock_id, price, recorded_at')\
+                .in_('stock_id', stock_ids)\
+                .gte('recorded_at', start.isoformat())
+            if end is not None:
+                query = query.lt('recorded_at', end.isoformat())
+            if cursor is not None:
+                recorded_at, row_id = cursor
+                query = query.or_(
+                    f'recorded_at.gt."{recorded_at}",'
+                    f'and(recorded_at.eq."{recorded_at}",id.gt.{row_id})'
+                )
+
+            page = query.order('recorded_at').order('id').limit(self.page_size).execute().data
+            yield from page
+            if len(page) < self.page_size:
+                return
+            cursor = page[-1]['recorded_at'], page[-1]['id']
+
+    def recent(self, stock_id: str, since: datetime, limit: int) -> List[Dict]:
+        """
+        The newest ``limit`` raw ticks of one stock since a point in time, in
+        time order (read newest-first, so a cap drops the oldest ticks)
+
+        Args:
+            stock_id: Stock UUID
+            since: Inclusive lower bound on recorded_at
+            limit: Maximum rows (at most one request's worth, page_size)
+
+        Returns:
+            Dicts with id, stock_id, price and recorded_at
+        """
+        rows = self.supabase.table(self.RAW_TABLE)\
+            .select('id, stock_id, price, recorded_at')\
+            .eq('stock_id', stock_id)\
+            .gte('recorded_at', since.isoformat())\
+            .order('recorded_at', desc=True)\
+            .limit(min(limit, self.page_size))\
+            .execute().data
+        return rows[::-1]
+
+    def daily(self, stock_ids: Iterable[str], start: datetime, end: Optional[datetime] = None) -> List[Dict]:
+        """
+        Return daily OHLC rows ordered by trade_date
+
+        Args:
+            stock_ids: Stocks to read
+            start: First trading day (inclusive)
+            end: Last trading day (inclusive, defaults to today)
+
+        Returns:
+            Dicts with stock_id, trade_date, open, high, low, close and samples
+        """
+        stock_ids = list(stock_ids)
+        if not stock_ids:
+            return []
+        rows = []
+        cursor = None
+        while True:
+            query = self.supabase.table(self.DAILY_TABLE)\
+                .select('stock_id, trade_date, open, high, low, close, samples')\
+                .in_('stock_id', stock_ids)\
+                .gte('trade_date', start.date().isoformat())
+            if end is not None:
+                query = query.lte('trade_date', end.date().isoformat())
+            if cursor is not None:
+                # (stock_id, trade_date) is the primary key, so this keyset is exact
+                trade_date, cursor_stock_id = cursor
+                query = query.or_(
+                    f'trade_date.gt.{trade_date},'
+                    f'and(trade_date.eq.{trade_date},stock_id.gt.{cursor_stock_id})'
+                )
+            page = query.order('trade_date').order('stock_id').limit(self.page_size).execute().data
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            cursor = page[-1]['trade_date'], page[-1]['stock_id']
+
+    def series(self, stock_id: str, start: datetime, end: Optional[datetime] = None,
+               resolution: Optional[str] = None) -> Dict:
+        """
+        Price series for one stock at the requested or automatic resolution
+
+        Args:
+            stock_id: Stock UUID
+            start: Start of the range
+            end: End of the range (defaults to now)
+            resolution: 'raw', 'daily' or None to choose by range
+
+        Returns:
+            {resolution, points}: raw points are {time, price}; daily points are
+            {time, open, high, low, close}
+        """
+        resolution = resolution or self.resolution_for(start, end)
+        if resolution == 'raw':
+            points = [
+                {'time': row['recorded_at'], 'price': float(row['price'])}
+                for row in self.iter_raw([stock_id], start, end)
+            ]
+        else:
+            points = [
+                {
+                    'time': row['trade_date'],
+                    'open': float(row['open']),
+                    'high': float(row['high']),
+                    'low': float(row['low']),
+                    'close': float(row['close']),
+                }
+                for row in self.daily([stock_id], start, end)
+            ]
+        return {'resolution': resolution, 'points': points}
@@ -0,0 +1,262 @@
+import logging
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from price_history import PriceHistoryReader
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class PriceStore:
+    """
+    Local columnar copy of price_history: per stock, one file of timestamps
+    (int64 microseconds since the epoch, UTC) and one of prices (float64),
+    read through NumPy memmaps.
+
+    Files are append-only and kept in time order, so a time range is found by
+    binary search and returned as a view of the memmap without copying or
+    decoding. ``sync`` appends rows newer than the last stored tick; rows
+    younger than ``settle_seconds`` are left for the next sync so a batch the
+    cron job has not flushed yet is never skipped over. Stocks whose last ticks
+    lie within ``sync_bucket_minutes`` of each other share one query, so a
+    stale stock never drags the others' downloads back to its watermark.
+    """
+
+    DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "price_store")
+    TIME_DTYPE = np.dtype('datetime64[us]')
+    PRICE_DTYPE = np.dtype(np.float64)
+    # Rows buffered per stock before they are appended during a sync
+    SYNC_FLUSH_ROWS = 10000
+    _SAFE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+    def __init__(self, directory: str = None, initial_days: float = None, settle_seconds: float = None,
+                 sync_bucket_minutes: float = None):
+        """
+        Initialize the store
+
+        Args:
+            directory: Directory holding the column files (PRICE_STORE_DIR)
+            initial_days: History fetched for a stock the store has never seen
+                          (PRICE_STORE_INITIAL_DAYS)
+            settle_seconds: Newest rows left unsynced, in seconds (PRICE_STORE_SETTLE_SECONDS)
+            sync_bucket_minutes: Spread of last ticks synced by one query
+                                 (PRICE_STORE_SYNC_BUCKET_MINUTES)
+        """
+        self.directory = directory or os.getenv("PRICE_STORE_DIR", self.DEFAULT_DIR)
+        self.initial_days = float(initial_days or os.getenv("PRICE_STORE_INITIAL_DAYS", "90"))
+        self.settle = timedelta(seconds=float(
+            settle_seconds if settle_seconds is not None
+            else os.getenv("PRICE_STORE_SETTLE_SECONDS", "600")
+        ))
+        self.sync_bucket = np.timedelta64(int(60 * float(
+            sync_bucket_minutes if sync_bucket_minutes is not None
+            else os.getenv("PRICE_STORE_SYNC_BUCKET_MINUTES", "60")
+        )), 's')
+        self._lock = threading.Lock()
+        # stock_id -> (times, prices) memmaps, dropped whenever the stock is appended to
+        self._maps: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _paths(self, stock_id: str) -> Tuple[str, str]:
+        name = stock_id if self._SAFE_NAME.match(stock_id) else hashlib.sha1(stock_id.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name)
+        return f"{base}.time.bin", f"{base}.price.bin"
+
+    def _length(self, stock_id: str) -> int:
+        """Complete rows on disk (a crash mid-append can leave one column longer)."""
+        sizes = []
+        for path, dtype in zip(self._paths(stock_id), (self.TIME_DTYPE, self.PRICE_DTYPE)):
+            try:
+                sizes.append(os.path.getsize(path) // dtype.itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(sizes)
+
+    def columns(self, stock_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Full (times, prices) columns of a stock as read-only memmaps
+
+        Args:
+            stock_id: Stock UUID
+
+        Returns:
+            (datetime64[us] UTC times, float64 prices); empty arrays for an unknown stock
+        """
+        with self._lock:
+            cached = self._maps.get(stock_id)
+            if cached is not None:
+                return cached
+            length = self._length(stock_id)
+            if not length:
+                return np.empty(0, self.TIME_DTYPE), np.empty(0, self.PRICE_DTYPE)
+            time_path, price_path = self._paths(stock_id)
+            columns = (
+                np.memmap(time_path, dtype=self.TIME_DTYPE, mode='r', shape=(length,)),
+                np.memmap(price_path, dtype=self.PRICE_DTYPE, mode='r', shape=(length,)),
+            )
+            self._maps[stock_id] = columns
+            return columns
+
+    def last_time(self, stock_id: str) -> Optional[np.datetime64]:
+        """Return the newest stored timestamp of a stock, or None."""
+        times, _ = self.columns(stock_id)
+        return times[-1] if len(times) else None
+
+    def slice(self, stock_id: str, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ticks of one stock in [start, end), as views of the memmaps (no copy)
+
+        Args:
+            stock_id: Stock UUID
+            start: Inclusive lower bound (naive times are UTC)
+            end: Exclusive upper bound (naive times are UTC)
+
+        Returns:
+            (times, prices)
+        """
+        times, prices = self.columns(stock_id)
+        lo = np.searchsorted(times, to_datetime64(start), side='left') if start is not None else 0
+        hi = np.searchsorted(times, to_datetime64(end), side='left') if end is not None else len(times)
+        return times[lo:hi], prices[lo:hi]
+
+    def series(self, stock_ids: Iterable[str], start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Slices for several stocks, shaped like backtest.PriceSeries
+
+        Args:
+            stock_ids: Stocks to read; stocks without stored ticks are left out
+            start: Inclusive lower bound
+            end: Exclusive upper bound
+
+        Returns:
+            stock_id -> (times, prices)
+        """
+        series = {}
+        for stock_id in stock_ids:
+            times, prices = self.slice(stock_id, start, end)
+            if len(times):
+                series[stock_id] = times, prices
+        return series
+
+    def append(self, stock_id: str, times: np.ndarray, prices: np.ndarray) -> int:
+        """
+        Append ticks to a stock's columns
+
+        Ticks at or before the newest stored one are dropped, so the columns stay
+        time-ordered and re-syncing an overlapping range is harmless.
+
+        Args:
+            stock_id: Stock UUID
+            times: datetime64 timestamps (UTC)
+            prices: Prices aligned with ``times``
+
+        Returns:
+            int: Ticks appended
+        """
+        times = np.asarray(times, dtype=self.TIME_DTYPE)
+        prices = np.asarray(prices, dtype=self.PRICE_DTYPE)
+        if len(times) > 1 and np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind='stable')
+            times, prices = times[order], prices[order]
+        with self._lock:
+            length = self._length(stock_id)
+            time_path, price_path = self._paths(stock_id)
+            if length:
+                last = np.memmap(
+                    time_path, dtype=self.TIME_DTYPE, mode='r',
+                    offset=(length - 1) * self.TIME_DTYPE.itemsize, shape=(1,)
+                )[0]
+                keep = times > last
+                times, prices = times[keep], prices[keep]
+            if not len(times):
+                return 0
+
+            os.makedirs(self.directory, exist_ok=True)
+            for path, column, dtype in ((time_path, times, self.TIME_DTYPE), (price_path, prices, self.PRICE_DTYPE)):
+                with open(path, 'ab') as f:
+                    # Drop a partial append left by a crash before adding new rows
+                    f.truncate(length * dtype.itemsize)
+                    f.write(column.tobytes())
+            self._maps.pop(stock_id, None)
+            return len(times)
+
+    def sync(self, reader: PriceHistoryReader, stock_ids: Iterable[str], now: Optional[datetime] = None) -> int:
+        """
+        Append price_history rows newer than each stock's last stored tick
+
+        Args:
+            reader: Reader over the Supabase price_history table
+            stock_ids: Stocks to sync
+            now: Current time (defaults to now, UTC)
+
+        Returns:
+            int: Ticks appended across all stocks
+        """
+        now = now or datetime.now(timezone.utc)
+        end = now - self.settle
+        known: List[Tuple[np.datetime64, str]] = []
+        new: List[str] = []
+        for stock_id in set(stock_ids):
+            last = self.last_time(stock_id)
+            if last is None:
+                new.append(stock_id)
+            else:
+                known.append((last, stock_id))
+
+        # Bucket stored stocks by last tick: each bucket is one query from its oldest
+        # watermark, and append() drops the (at most one bucket wide) overlap
+        buckets: List[Tuple[np.datetime64, List[str]]] = []
+        for last, stock_id in sorted(known):
+            if not buckets or last - buckets[-1][0] > self.sync_bucket:
+                buckets.append((last, []))
+            buckets[-1][1].append(stock_id)
+
+        appended = 0
+        for start, bucket in buckets:
+            appended += self._sync_from(reader, bucket, start.astype(datetime).replace(tzinfo=timezone.utc), end)
+        if new:
+            appended += self._sync_from(reader, new, now - timedelta(days=self.initial_days), end)
+        if appended:
+            log.info(f"Price store: appended {appended} ticks")
+        return appended
+
+    def _sync_from(self, reader: PriceHistoryReader, stock_ids: List[str], start: datetime, end: datetime) -> int:
+        if start >= end:
+            return 0
+        buffers: Dict[str, Tuple[List, List]] = {}
+        appended = 0
+        # iter_raw orders by recorded_at, so each buffer is already time-sorted
+        for row in reader.iter_raw(stock_ids, start, end):
+            try:
+                recorded_at = to_datetime64(row['recorded_at'])
+                price = float(row['price'])
+            except Exception as e:
+                log.warning(f"Skipping malformed price_history row: {str(e)}")
+                continue
+            times, prices = buffers.setdefault(row['stock_id'], ([], []))
+            times.append(recorded_at)
+            prices.append(price)
+            if len(times) >= self.SYNC_FLUSH_ROWS:
+                appended += self.append(row['stock_id'], times, prices)
+                buffers[row['stock_id']] = ([], [])
+        for stock_id, (times, prices) in buffers.items():
+            if times:
+                appended += self.append(stock_id, times, prices)
+        return appended
+
+
+def to_datetime64(value) -> np.datetime64:
+    """Parse a datetime or ISO timestamp (naive times are UTC) into datetime64[us] UTC."""
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(parsed, 'us')
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Tuple
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class QuoteCache:
+    """Short-TTL LRU cache for scrape results that coalesces concurrent fetches"""
+
+    DEFAULT_TTL_SECONDS = 15
+    DEFAULT_MAX_ENTRIES = 1024
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        """
+        Initialize the cache
+
+        Args:
+            ttl_seconds: How long a successful quote is served (QUOTE_CACHE_TTL_SECONDS)
+            max_entries: Entries kept before least-recently-used eviction (QUOTE_CACHE_MAX_ENTRIES)
+        """
+        self.ttl_seconds = float(
+            ttl_seconds if ttl_seconds is not None
+            else os.getenv("QUOTE_CACHE_TTL_SECONDS", self.DEFAULT_TTL_SECONDS)
+        )
+        self.max_entries = int(
+            max_entries if max_entries is not None
+            else os.getenv("QUOTE_CACHE_MAX_ENTRIES", self.DEFAULT_MAX_ENTRIES)
+        )
+        self._entries: "OrderedDict[Hashable, Tuple[float, dict]]" = OrderedDict()
+        self._in_flight = {}
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result, age
+
+    def _store(self, key: Hashable, result: dict):
+        # Only successful quotes are cached; failures are retried on the next request
+        if not result.get("success"):
+            return
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, key: Hashable,
+                           fetch: Callable[[], Awaitable[dict]]) -> Tuple[dict, float]:
+        """
+        Return a cached quote or fetch it, sharing one upstream call between
+        all concurrent callers asking for the same key.
+
+        Args:
+            key: Cache key identifying the resolved company and result kind
+            fetch: Coroutine factory performing the actual scrape
+
+        Returns:
+            (result dict, age of the quote in seconds)
+        """
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        pending = self._in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(fetch())
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda future: self._on_done(key, future))
+        else:
+            log.info(f"Coalescing request for {key}")
+
+        # Shielded so one disconnecting caller never cancels the shared fetch
+        result = await asyncio.shield(pending)
+        return result, 0.0
+
+    def _on_done(self, key: Hashable, future: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._store(key, future.result())
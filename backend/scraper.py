@@ -1,21 +1,72 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib3.util import make_headers
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import os
 import re
 import logging
+import threading
 import time
+from url_cache import CompanyURLCache
+from page_cache import PageCache
+from throttle import CircuitOpenError, backoff_delay, host_guard, parse_retry_after
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+# Failures worth retrying: the connection dropped, stalled or broke off mid-body
+RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+)
+
 
 class StockScraper:
     """Scraper for fetching stock data from screener.in using HTTP requests (no browser needed)"""
 
-    BASE_URL = "https://www.screener.in"
-    SEARCH_URL = "https://www.screener.in/api/company/search/"
+    # SCREENER_BASE_URL points the scraper at another host (e.g. a local stub server)
+    BASE_URL = os.getenv("SCREENER_BASE_URL", "https://www.screener.in").rstrip("/")
+    SEARCH_URL = BASE_URL + "/api/company/search/"
+
+    # Concurrency defaults — override via SCRAPER_MAX_WORKERS / SCRAPER_PER_HOST_LIMIT
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_PER_HOST_LIMIT = 4
+
+    # Retry defaults — override via SCREENER_MAX_RETRIES / SCREENER_BACKOFF_BASE / SCREENER_BACKOFF_CAP
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_BACKOFF_BASE = 0.5
+    DEFAULT_BACKOFF_CAP = 30.0
+
+    # Slow-moving fields served from the page cache for SCREENER_FUNDAMENTALS_TTL_HOURS;
+    # the price is always fetched fresh
+    FUNDAMENTAL_FIELDS = ("market_cap", "roe", "roce", "description")
+
+    def __init__(self, headless=False, max_workers: int = None, per_host_limit: int = None,
+                 url_cache: CompanyURLCache = None, prime_session: bool = True,
+                 page_cache: PageCache = None):  # Deprecated: headless param kept for backward compatibility
+        self.url_cache = url_cache or CompanyURLCache()
+        self.page_cache = page_cache or PageCache()
+        self.max_workers = max_workers or int(
+            os.getenv("SCRAPER_MAX_WORKERS", self.DEFAULT_MAX_WORKERS)
+        )
+        self.per_host_limit = per_host_limit or int(
+            os.getenv("SCRAPER_PER_HOST_LIMIT", self.DEFAULT_PER_HOST_LIMIT)
+        )
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+        self.max_retries = int(os.getenv("SCREENER_MAX_RETRIES", self.DEFAULT_MAX_RETRIES))
+        self.backoff_base = float(os.getenv("SCREENER_BACKOFF_BASE", self.DEFAULT_BACKOFF_BASE))
+        self.backoff_cap = float(os.getenv("SCREENER_BACKOFF_CAP", self.DEFAULT_BACKOFF_CAP))
 
-    def __init__(self, headless=False):  # Deprecated: headless param kept for backward compatibility
         self.session = requests.Session()
+        # Size the connection pool so concurrent workers reuse keep-alive connections
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_workers, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self.session.headers.update({
             "User-Agent": (
                 "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -24,24 +75,108 @@ class StockScraper:
             ),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.9",
-            "Accept-Encoding": "gzip, deflate, br",
+            # Only advertise encodings urllib3 can decode (br needs the brotli package)
+            "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"],
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
         })
-        # Prime the session with a homepage visit to collect cookies
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
+        if prime_session:
+            self._prime_session()
+
+    def _prime_session(self):
+        """Visit the homepage to collect (or refresh) screener.in cookies."""
         try:
-            self.session.get(self.BASE_URL, timeout=10)
+            self._get(self.BASE_URL, timeout=10)
             log.info("Session initialized with screener.in cookies")
         except Exception as e:
             log.warning(f"Could not prime session: {e}")
 
+    def start_cookie_refresh(self, interval_seconds: float = 1800):
+        """
+        Prime the session and keep its cookies fresh from a daemon thread, so
+        long-lived scrapers never block a caller on the homepage round-trip.
+        """
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+
+        def _refresh_loop():
+            while True:
+                self._prime_session()
+                if self._refresh_stop.wait(interval_seconds):
+                    break
+
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(
+            target=_refresh_loop, name="scraper-cookie-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def close(self):
+        """Stop the cookie refresher and release pooled connections."""
+        self._refresh_stop.set()
+        self.session.close()
+
     # ──────────────────────────────────────────────────────────────
     #  Internal helpers
     # ──────────────────────────────────────────────────────────────
 
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        """Return the semaphore capping in-flight requests to the URL's host."""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET through the shared session, respecting the per-host concurrency cap.
+
+        Every request takes a token from the host's process-wide rate limiter.
+        429/5xx responses and connection errors are retried with jittered
+        exponential backoff (honouring Retry-After); once the host's circuit
+        breaker opens, calls fail fast with CircuitOpenError. Every request that
+        passes the breaker records an outcome, so a half-open trial always settles.
+        """
+        host = urlparse(url).netloc
+        limiter, breaker = host_guard(host)
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} is failing, not sending requests for now")
+            limiter.acquire()
+            retry_after = None
+            try:
+                with self._host_semaphore(url):
+                    response = self.session.get(url, **kwargs)
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+            except Exception:
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    # Leave it to the caller's raise_for_status()
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+
+            if breaker.state == "open":
+                raise CircuitOpenError(f"{host} is failing, not sending requests for now")
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, retry_after)
+            log.warning(f"GET {url} failed (attempt {attempt + 1}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
     def _search_company(self, company_name: str):
         """Search for a company and return (found_name, company_url) or raise."""
-        search_resp = self.session.get(
+        search_resp = self._get(
             self.SEARCH_URL,
             params={"q": company_name, "v": "3", "fts": "1"},
             headers={
@@ -61,15 +196,74 @@ class StockScraper:
         log.info(f"Found: {found_name} → {company_url}")
         return found_name, company_url
 
-    def _fetch_page(self, url: str) -> BeautifulSoup:
-        """Fetch and parse a screener.in page."""
-        page_resp = self.session.get(
+    def _resolve_company(self, company_name: str):
+        """
+        Return (found_name, company_url, from_cache), consulting the URL cache
+        before falling back to the search API.
+        """
+        cached = self.url_cache.get(company_name)
+        if cached:
+            return cached[0], cached[1], True
+        found_name, company_url = self._search_company(company_name)
+        if found_name:
+            self.url_cache.set(company_name, found_name, company_url)
+        return found_name, company_url, False
+
+    def _fetch_page(self, url: str, price_only: bool = False) -> BeautifulSoup:
+        """
+        Fetch and parse a screener.in page.
+
+        With price_only, only the #top-ratios block is parsed instead of the
+        whole (several hundred KB) company page.
+        """
+        return self._parse_page(self._fetch_html(url), price_only)
+
+    def _fetch_html(self, url: str) -> str:
+        """
+        Download a page, revalidating the cached copy with If-None-Match /
+        If-Modified-Since so an unchanged page costs a 304 instead of a download.
+        """
+        headers = {"Referer": self.BASE_URL + "/"}
+        cached = self.page_cache.get_page(url)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        page_resp = self._get(url, headers=headers, timeout=20)
+        if page_resp.status_code == 304 and cached:
+            self.page_cache.touch_page(url)
+            return cached["html"]
+        page_resp.raise_for_status()
+        self.page_cache.put_page(
             url,
-            headers={"Referer": self.BASE_URL + "/"},
-            timeout=20,
+            page_resp.text,
+            page_resp.headers.get("ETag"),
+            page_resp.headers.get("Last-Modified"),
         )
-        page_resp.raise_for_status()
-        return BeautifulSoup(page_resp.text, "html.parser")
+        return page_resp.text
+
+    def _parse_page(self, html: str, price_only: bool = False) -> BeautifulSoup:
+        """Parse page HTML with lxml, optionally restricted to #top-ratios."""
+        if not price_only:
+            return BeautifulSoup(html, "lxml")
+
+        # Cut the <ul id="top-ratios"> block out of the raw HTML so the parser
+        # never sees the rest of the page
+        marker = html.find('id="top-ratios"')
+        if marker != -1:
+            start = html.rfind("<ul", 0, marker)
+            end = html.find("</ul>", marker)
+            if start != -1 and end != -1:
+                return BeautifulSoup(html[start:end + len("</ul>")], "lxml")
+
+        # Markup changed — still skip building a tree for everything else
+        soup = BeautifulSoup(html, "lxml", parse_only=SoupStrainer("ul", id="top-ratios"))
+        if soup.find("ul", id="top-ratios"):
+            return soup
+        # No #top-ratios at all: parse the whole page so the price fallbacks still apply
+        return BeautifulSoup(html, "lxml")
 
     def _parse_number(self, raw: str):
         """
@@ -108,20 +302,30 @@ class StockScraper:
             ratios[label] = " / ".join(values) if values else ""
         return ratios
 
-    def _extract_price(self, soup: BeautifulSoup):
-        """Parse current price from a screener.in company HTML page."""
+    def _extract_price(self, soup: BeautifulSoup, ratios: dict = None):
+        """
+        Parse current price from a screener.in company HTML page.
+        Pass the already-extracted top-ratios dict to avoid walking them again.
+        """
         try:
-            top_ratios = soup.find("ul", id="top-ratios")
-            if top_ratios:
-                for li in top_ratios.find_all("li"):
-                    name_span = li.find("span", class_="name")
-                    if name_span and "Current Price" in name_span.get_text():
-                        number_span = li.find("span", class_="number")
-                        if number_span:
-                            raw = number_span.get_text(strip=True)
-                            cleaned = re.sub(r"[₹,\s]", "", raw)
-                            cleaned = cleaned.split("/")[0].strip()
-                            return float(cleaned)
+            if ratios is not None:
+                for key, val in ratios.items():
+                    if "Current Price" in key:
+                        price = self._parse_number(val)
+                        if price is not None:
+                            return price
+            else:
+                top_ratios = soup.find("ul", id="top-ratios")
+                if top_ratios:
+                    for li in top_ratios.find_all("li"):
+                        name_span = li.find("span", class_="name")
+                        if name_span and "Current Price" in name_span.get_text():
+                            number_span = li.find("span", class_="number")
+                            if number_span:
+                                raw = number_span.get_text(strip=True)
+                                cleaned = re.sub(r"[₹,\s]", "", raw)
+                                cleaned = cleaned.split("/")[0].strip()
+                                return float(cleaned)
 
             # Fallback: first .number span with a sane price
             for span in soup.find_all("span", class_="number"):
@@ -190,7 +394,7 @@ class StockScraper:
         Returns:
             dict: { company_name, price, success, error }
         """
-        result = self.scrape_stock_details(company_name)
+        result = self._scrape_company(company_name, full=False)
         # Return only price-relevant fields for backward compatibility
         return {
             "company_name": result["company_name"],
@@ -209,6 +413,17 @@ class StockScraper:
                 description, success, error
             }
         """
+        return self._scrape_company(company_name, full=True)
+
+    def _scrape_company(self, company_name: str, full: bool = True) -> dict:
+        """
+        Resolve, fetch and parse a company page.
+
+        With full=False only the #top-ratios block is parsed (fast path used for
+        price checks); the description is left empty. With full=True and fresh
+        fundamentals in the page cache, the page is still fetched for the price
+        but only #top-ratios is parsed and the cached fields fill in the rest.
+        """
         base_result = {
             "company_name": company_name,
             "price": None,
@@ -223,8 +438,8 @@ class StockScraper:
         }
 
         try:
-            # ── Step 1: Search for company ──────────────────────────────
-            found_name, company_url = self._search_company(company_name)
+            # ── Step 1: Resolve company URL (cached or via search) ──────
+            found_name, company_url, from_cache = self._resolve_company(company_name)
 
             if not found_name:
                 base_result["error"] = f'No company found matching "{company_name}" on screener.in'
@@ -233,14 +448,28 @@ class StockScraper:
             base_result["company_name"] = found_name
 
             # ── Step 2: Fetch company page ──────────────────────────────
-            soup = self._fetch_page(company_url)
+            fundamentals = self.page_cache.get_fields(company_url) if full else None
+            try:
+                soup = self._fetch_page(company_url, price_only=not full or fundamentals is not None)
+            except requests.exceptions.HTTPError as e:
+                # A cached URL can go stale (renamed/relisted company) — re-resolve once
+                if not from_cache or e.response is None or e.response.status_code != 404:
+                    raise
+                self.url_cache.invalidate(company_name)
+                found_name, company_url, _ = self._resolve_company(company_name)
+                if not found_name:
+                    base_result["error"] = f'No company found matching "{company_name}" on screener.in'
+                    return base_result
+                base_result["company_name"] = found_name
+                fundamentals = self.page_cache.get_fields(company_url) if full else None
+                soup = self._fetch_page(company_url, price_only=not full or fundamentals is not None)
 
             # ── Step 3: Extract all top-ratio fields ────────────────────
             ratios = self._extract_top_ratios(soup)
             log.info(f"Top-ratio labels found: {list(ratios.keys())}")
 
             # Current price
-            price = self._extract_price(soup)
+            price = self._extract_price(soup, ratios)
             base_result["price"] = price
 
             # 52-week High / Low
@@ -267,8 +496,17 @@ class StockScraper:
                     base_result["roce"] = val
                     break
 
-            # Company description
-            base_result["description"] = self._extract_description(soup)
+            # Company description (and any fundamentals the fresh ratios lacked)
+            if fundamentals is not None:
+                for field, value in fundamentals.items():
+                    if not base_result.get(field):
+                        base_result[field] = value
+            elif full:
+                base_result["description"] = self._extract_description(soup)
+                if price is not None:
+                    self.page_cache.put_fields(
+                        company_url, {field: base_result[field] for field in self.FUNDAMENTAL_FIELDS}
+                    )
 
             if price is None:
                 base_result["error"] = "Could not extract current price from screener.in page"
@@ -288,29 +526,46 @@ class StockScraper:
             base_result["error"] = "Request to screener.in timed out — try again shortly"
         except requests.exceptions.HTTPError as e:
             base_result["error"] = f"HTTP error from screener.in: {e}"
+        except CircuitOpenError:
+            base_result["error"] = "screener.in is temporarily unavailable — try again shortly"
         except Exception as e:
             log.error(f"Unexpected error scraping {company_name}: {e}")
             base_result["error"] = str(e)
 
         return base_result
 
-    def scrape_multiple_stocks(self, company_names: list) -> list:
+    def iter_stock_prices(self, company_names: list):
         """
-        Scrape prices for multiple companies with a small delay between requests.
+        Scrape prices for many companies concurrently on a bounded thread pool.
+
+        Requests to screener.in never exceed ``per_host_limit`` in flight, no
+        matter how many workers are configured.
 
         Args:
             company_names (list): List of company name strings
 
-        Returns:
-            list: List of result dicts
+        Yields:
+            tuple: (company_name, result dict) in completion order
         """
-        results = []
-        for i, name in enumerate(company_names):
-            result = self.scrape_stock_price(name)
-            results.append(result)
-            if i < len(company_names) - 1:
-                time.sleep(1)  # polite delay between requests
-        return results
+        unique_names = list(dict.fromkeys(company_names))
+        if not unique_names:
+            return
+
+        workers = min(self.max_workers, len(unique_names))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scraper") as pool:
+            futures = {pool.submit(self.scrape_stock_price, name): name for name in unique_names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    yield name, future.result()
+                except Exception as e:
+                    log.error(f"Unexpected error scraping {name}: {e}")
+                    yield name, {
+                        "company_name": name,
+                        "price": None,
+                        "success": False,
+                        "error": str(e),
+                    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alert_engine  # noqa: E402
+
+
+class FakeQuery:
+    """Chainable stand-in for a PostgREST query builder; records every request."""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = None
+        self.payload = None
+        self.filters = []
+        self.limit_count = None
+
+    def select(self, *args, **kwargs):
+        self.op = 'select'
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.op, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.op, self.payload = 'upsert', rows
+        return self
+
+    def update(self, values):
+        self.op, self.payload = 'update', values
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def __getattr__(self, name):
+        def add_filter(*args, **kwargs):
+            self.filters.append((name, args + tuple(sorted(kwargs.items()))))
+            return self
+        return add_filter
+
+    def execute(self):
+        self.db.calls.append((self.table, self.op, self.filters, self.payload))
+        if self.table in self.db.failing:
+            raise self.db.failing[self.table]
+        data = self.db.select(self) if self.op == 'select' else []
+        return types.SimpleNamespace(data=data)
+
+
+class FakeSupabase:
+    """
+    In-memory Supabase client: user_alerts returns ``alerts`` (keyset-paginated
+    by id) or ``changed`` for updated_at queries; other tables return ``rows``.
+    Tables in ``failing`` raise the given exception.
+    """
+
+    def __init__(self, alerts=(), rows=None):
+        self.alerts = list(alerts)
+        self.changed = []
+        self.rows = rows or {}
+        self.failing = {}
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def select(self, query):
+        filters = dict((name, args) for name, args in query.filters)
+        if query.table != 'user_alerts':
+            return self._select_rows(query)
+        if 'gt' in filters and filters['gt'][0] == 'updated_at':
+            return list(self.changed)
+        last_ids = [args[1] for name, args in query.filters if name == 'gt' and args[0] == 'id']
+        rows = sorted(self.alerts, key=lambda row: row['id'])
+        rows = [row for row in rows if not last_ids or row['id'] > last_ids[-1]]
+        return rows[:query.limit_count] if query.limit_count else rows
+
+    def _select_rows(self, query):
+        rows = list(self.rows.get(query.table, []))
+        for name, args in query.filters:
+            if name == 'eq':
+                rows = [row for row in rows if row[args[0]] == args[1]]
+            elif name == 'in_':
+                rows = [row for row in rows if row[args[0]] in args[1]]
+            elif name == 'gte':
+                rows = [row for row in rows if row[args[0]] >= args[1]]
+            elif name == 'lt':
+                rows = [row for row in rows if row[args[0]] < args[1]]
+            elif name == 'order':
+                rows.sort(key=lambda row: row[args[0]], reverse=('desc', True) in args)
+        return rows[:query.limit_count] if query.limit_count else rows
+
+
+class FakeScraper:
+    """Returns fixed prices per company name."""
+
+    def __init__(self, prices):
+        self.prices = prices
+
+    def iter_stock_prices(self, company_names):
+        for name in company_names:
+            yield name, {'company_name': name, 'price': self.prices[name], 'success': True, 'error': None}
+
+    def close(self):
+        pass
+
+
+def make_alert(alert_id, stock_id, baseline=100.0, gain=5.0, loss=5.0, **extra):
+    row = {
+        'id': alert_id,
+        'user_id': f"user-{alert_id}",
+        'stock_id': stock_id,
+        'baseline_price': baseline,
+        'gain_threshold_percent': gain,
+        'loss_threshold_percent': loss,
+        'is_active': True,
+        'trigger_state': 'armed',
+        'last_triggered_at': None,
+        'stocks': {'company_name': f"Company {stock_id}", 'interest': 'interested', 'current_price': baseline},
+        'user_profiles': {'email': f"{alert_id}@example.com"},
+    }
+    row.update(extra)
+    return row
+
+
+def make_alert_info(alert_id):
+    """A triggered alert as the engine hands it to the notifier."""
+    return {
+        'alert_id': alert_id,
+        'user_id': 'user-1',
+        'stock_id': 's1',
+        'company_name': 'Company s1',
+        'alert_type': 'GAIN',
+        'current_price': 110.0,
+        'baseline_price': 100.0,
+        'percent_change': 10.0,
+        'user_email': 'user-1@example.com',
+        'dedup_key': f"{alert_id}:GAIN:first",
+    }
+
+
+@pytest.fixture
+def make_engine(monkeypatch):
+    """Build an AlertEngine over a FakeSupabase and a FakeScraper keyed by company name."""
+
+    def build(alerts, prices, **kwargs):
+        db = FakeSupabase(alerts)
+        scraper = FakeScraper(prices)
+        monkeypatch.setattr(alert_engine, 'create_client', lambda url, key: db)
+        monkeypatch.setattr(alert_engine, 'StockScraper', lambda: scraper)
+        engine = alert_engine.AlertEngine('http://supabase.test', 'key', **kwargs)
+        return engine, db, scraper
+
+    return build
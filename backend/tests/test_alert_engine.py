@@ -0,0 +1,78 @@
+import time
+from datetime import datetime, timedelta
+
+from conftest import make_alert
+
+
+def test_failed_full_resync_keeps_cached_alerts(make_engine):
+    alerts = [make_alert('a1', 's1'), make_alert('a2', 's2')]
+    engine, db, scraper = make_engine(alerts, {'Company s1': 100.0, 'Company s2': 100.0}, incremental=True)
+    engine.full_resync_interval = timedelta(0)
+
+    engine.process_alerts()
+    assert engine.alerts_checked == 2
+    synced_at, full_sync_at = engine._alerts_synced_at, engine._last_full_sync
+
+    db.failing['user_alerts'] = RuntimeError("connection reset")
+    engine.process_alerts()
+    assert engine.alerts_checked == 2
+    assert set(engine._alert_cache) == {'a1', 'a2'}
+    # Watermarks stay put so the next run retries the full load
+    assert engine._alerts_synced_at == synced_at
+    assert engine._last_full_sync == full_sync_at
+
+    del db.failing['user_alerts']
+    scraper.prices['Company s1'] = 110.0
+    triggered = engine.process_alerts()
+    assert [alert['alert_id'] for alert in triggered] == ['a1']
+    assert engine._last_full_sync > full_sync_at
+
+
+def test_flat_price_fires_once_cooldown_expires(make_engine, monkeypatch):
+    monkeypatch.setenv("ALERT_COOLDOWN_MINUTES", "0.002")
+    engine, db, scraper = make_engine([make_alert('a1', 's1')], {'Company s1': 110.0}, incremental=True)
+
+    assert [alert['alert_id'] for alert in engine.process_alerts()] == ['a1']
+    scraper.prices['Company s1'] = 100.0
+    assert engine.process_alerts() == []  # back inside the thresholds: re-armed
+    scraper.prices['Company s1'] = 110.0
+    assert engine.process_alerts() == []  # triggered again inside the cooldown
+
+    time.sleep(0.2)
+    # Same price as the previous run, but the cooldown has ended
+    assert [alert['alert_id'] for alert in engine.process_alerts()] == ['a1']
+    assert engine.process_alerts() == []
+
+
+def test_poll_scheduler_seeds_from_newest_ticks_per_stock(make_engine):
+    engine, db, scraper = make_engine([], {}, adaptive_polling=True)
+    now = datetime.utcnow()
+    db.rows['price_history'] = [
+        {'id': f"{stock_id}-{i}", 'stock_id': stock_id, 'price': 100.0 + i % 7,
+         'recorded_at': (now - timedelta(minutes=minutes - i)).isoformat()}
+        for stock_id, minutes in (('s1', 1200), ('s2', 30))
+        for i in range(minutes)
+    ]
+
+    engine.seed_poll_scheduler(['s1', 's2', 's3'], limit=500)
+
+    scheduler = engine.scheduler
+    assert scheduler.knows('s1') and scheduler.knows('s2')
+    # No history yet: left unseeded so the next run tries again
+    assert not scheduler.knows('s3')
+    newest = max(row['recorded_at'] for row in db.rows['price_history'] if row['stock_id'] == 's1')
+    assert scheduler._last_observed['s1'][0] == datetime.fromisoformat(newest).timestamp()
+
+
+def test_deadband_seed_is_chunked(make_engine):
+    engine, db, scraper = make_engine([], {})
+    stock_ids = [f"s{i:03d}" for i in range(450)]
+    db.rows['price_history_latest'] = [
+        {'stock_id': stock_id, 'price': 100.0, 'recorded_at': '2026-10-16T09:00:00+00:00'} for stock_id in stock_ids
+    ]
+
+    engine.seed_price_deadband(stock_ids)
+
+    requests = [filters for table, _, filters, _ in db.calls if table == 'price_history_latest']
+    assert [len(dict(filters)['in_'][1]) for filters in requests] == [200, 200, 50]
+    assert all(engine.deadband.knows(stock_id) for stock_id in stock_ids)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from alert_evaluator import AlertBook, ThresholdIndex
+from alert_state import AlertStateTracker
+from conftest import make_alert
+
+
+def _book(stocks=20, per_stock=5):
+    alerts = [
+        make_alert(f"a{s}-{j}", f"s{s}", baseline=100.0, gain=1.0 + j, loss=1.0 + j)
+        for s in range(stocks) for j in range(per_stock)
+    ]
+    return AlertBook(alerts)
+
+
+def test_evaluate_stock_matches_whole_book():
+    book = _book()
+    index = ThresholdIndex(book)
+    rng = np.random.default_rng(0)
+    prices = {stock_id: float(100 * (1 + rng.normal(0, 0.03))) for stock_id in book.stock_ids}
+
+    expected = book.evaluate(prices)
+    per_stock = [alert for stock_id, price in prices.items() for alert in book.evaluate_stock(stock_id, price)]
+    indexed = [alert for stock_id, price in prices.items() for alert in index.evaluate_stock(stock_id, price)]
+    key = lambda alert: alert['alert_id']
+    assert sorted(per_stock, key=key) == sorted(expected, key=key)
+    assert sorted(indexed, key=key) == sorted(expected, key=key)
+    assert book.evaluate_stock('unknown', 150.0) == []
+
+
+def test_single_stock_price_touches_only_its_rows(monkeypatch):
+    book = _book()
+    seen = []
+    original = AlertBook.percent_changes
+
+    def spy(self, prices, positions=None):
+        seen.append(None if positions is None else len(positions))
+        return original(self, prices, positions)
+
+    monkeypatch.setattr(AlertBook, 'percent_changes', spy)
+    tracker = AlertStateTracker(cooldown_minutes=0, rearm_band_percent=None)
+    fired = tracker.filter_triggered(book.evaluate_stock('s3', 110.0))
+    assert len(fired) == 5 and seen == [5]
+
+    seen.clear()
+    assert tracker.rearm(book, {'s3': 100.0}, book.positions_for('s3')) == 5
+    assert seen == [5]
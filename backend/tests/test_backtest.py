@@ -0,0 +1,76 @@
+import os
+from datetime import timedelta, timezone
+
+import pytest
+
+import backtest
+import scraper
+from conftest import FakeSupabase, make_alert
+
+
+def test_load_from_supabase_reads_without_the_engine(monkeypatch):
+    db = FakeSupabase([make_alert('a1', 's1'), make_alert('a2', 's2')])
+    db.rows['price_history'] = [
+        {'id': f"p{i}", 'stock_id': stock_id, 'price': 100.0 + i, 'recorded_at': f"2099-01-01T09:{i:02d}:00+00:00"}
+        for i in range(3) for stock_id in ('s1', 's2')
+    ]
+    monkeypatch.setattr(backtest, 'create_client', lambda url, key: db)
+
+    def no_scraper(*args, **kwargs):
+        raise AssertionError("an offline backtest must not start the scraper")
+
+    monkeypatch.setattr(scraper, 'StockScraper', no_scraper)
+    series, alerts = backtest.load_from_supabase(days=1)
+
+    assert [alert['id'] for alert in alerts] == ['a1', 'a2']
+    assert sorted(series) == ['s1', 's2'] and list(series['s1'][1]) == [100.0, 101.0, 102.0]
+    # Only reads: no inserts or upserts from a write buffer
+    assert {op for _, op, _, _ in db.calls} == {'select'}
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+
+def _reference_fires(series, alerts, rearm_band_percent, cooldown_minutes):
+    """Tick-by-tick replay of the live engine's rules: (alert_id, alert_type, triggered_at) in time order."""
+    cooldown = timedelta(minutes=cooldown_minutes)
+    fires = []
+    for alert in alerts:
+        baseline = float(alert['baseline_price'])
+        gain, loss = float(alert['gain_threshold_percent']), float(alert['loss_threshold_percent'])
+        armed, last_fire = True, None
+        times, prices = series[alert['stock_id']]
+        for at, price in zip(times.tolist(), prices.tolist()):
+            change = (price - baseline) / baseline * 100
+            if rearm_band_percent is not None:
+                armed = armed or abs(change) <= rearm_band_percent
+            else:
+                armed = armed or -loss < change < gain
+            alert_type = "GAIN" if change >= gain else "LOSS" if change <= -loss else None
+            if not alert_type or not armed or (last_fire is not None and at - last_fire < cooldown):
+                continue
+            fires.append((at, alert['id'], alert_type))
+            armed, last_fire = False, at
+    return [(alert_id, alert_type, at.replace(tzinfo=timezone.utc).isoformat())
+            for at, alert_id, alert_type in sorted(fires)]
+
+
+@pytest.mark.parametrize('rearm_band_percent, cooldown_minutes, fire_counts', [
+    (None, 0, {'alert-a1': 4, 'alert-a2': 2, 'alert-b1': 7, 'alert-b2': 3}),
+    (None, 30, {'alert-a1': 4, 'alert-a2': 2, 'alert-b1': 6, 'alert-b2': 3}),
+    (None, 60, {'alert-a1': 3, 'alert-a2': 2, 'alert-b1': 3, 'alert-b2': 3}),
+    (1.0, 30, {'alert-a1': 3, 'alert-a2': 2, 'alert-b1': 3, 'alert-b2': 2}),
+])
+def test_fixture_replay_matches_reference(rearm_band_percent, cooldown_minutes, fire_counts):
+    series = backtest.load_prices_csv(os.path.join(FIXTURES, 'backtest_prices.csv'))
+    alerts = backtest.load_alerts_csv(os.path.join(FIXTURES, 'backtest_alerts.csv'))
+    expected = _reference_fires(series, alerts, rearm_band_percent, cooldown_minutes)
+
+    # Small chunks carry armed/cooldown state across chunk boundaries
+    for chunk_cells in (None, 12):
+        events = backtest.AlertBacktester(rearm_band_percent, cooldown_minutes, chunk_cells).run(series, alerts)
+        fired = [(event['alert_id'], event['alert_type'], event['triggered_at']) for event in events]
+        assert sorted(fired, key=lambda fire: (fire[2], fire[0])) == sorted(expected, key=lambda fire: (fire[2], fire[0]))
+
+    counts = {row['alert_id']: row['fires'] for row in backtest.summarize(events, alerts)}
+    assert counts == fire_counts
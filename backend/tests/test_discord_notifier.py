@@ -0,0 +1,81 @@
+import pytest
+
+import discord_notifier
+from discord_notifier import DiscordNotifier
+from conftest import make_alert_info
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = str(body)
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("no JSON body")
+        return self.body
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(discord_notifier.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def _notifier(monkeypatch, responses, **kwargs):
+    notifier = DiscordNotifier('https://discord.test/webhook', **kwargs)
+    posts = []
+
+    def post(url, json=None, timeout=None):
+        posts.append(json)
+        return responses.pop(0) if responses else FakeResponse(204)
+
+    monkeypatch.setattr(notifier.session, 'post', post)
+    return notifier, posts
+
+
+def test_pack_embeds_caps_count_and_characters():
+    notifier = DiscordNotifier('https://discord.test/webhook')
+    small = [notifier.build_embed(make_alert_info(f"a{i}")) for i in range(23)]
+    assert [len(message) for message in notifier.pack_embeds(small)] == [10, 10, 3]
+
+    large = [{'title': 'x', 'description': 'y' * 2500} for _ in range(5)]
+    messages = notifier.pack_embeds(large)
+    assert [len(message) for message in messages] == [2, 2, 1]
+    assert all(sum(map(notifier.embed_length, message)) <= notifier.MAX_EMBED_CHARS_PER_MESSAGE for message in messages)
+
+
+def test_rate_limited_post_waits_retry_after(monkeypatch, sleeps):
+    notifier, posts = _notifier(monkeypatch, [FakeResponse(429, {'retry_after': 2.5}), FakeResponse(204)])
+    assert notifier._post({'embeds': []})
+    assert len(posts) == 2
+    assert len(sleeps) == 1 and 2.0 < sleeps[0] <= 2.5
+
+
+@pytest.mark.parametrize('reset_after', ['', 'soon', None])
+def test_malformed_rate_limit_headers_fall_back_to_one_second(monkeypatch, sleeps, reset_after):
+    headers = {'X-RateLimit-Remaining': '0'}
+    if reset_after is not None:
+        headers['X-RateLimit-Reset-After'] = reset_after
+    notifier, posts = _notifier(monkeypatch, [
+        FakeResponse(204, headers=headers),
+        FakeResponse(429, ['not', 'a', 'dict'], headers={'Retry-After': 'later'}),
+        FakeResponse(204),
+    ])
+    assert notifier._post({'embeds': []})
+    assert notifier._post({'embeds': []})
+    assert len(posts) == 3
+    assert len(sleeps) == 2 and all(0.5 < delay <= 1.0 for delay in sleeps)
+
+
+def test_failed_messages_are_requeued_and_flushed(monkeypatch, sleeps):
+    notifier, posts = _notifier(monkeypatch, [FakeResponse(500), FakeResponse(500)], max_retries=0, workers=1)
+    assert notifier.send_batch_alerts([make_alert_info(f"a{i}") for i in range(12)]) == 0
+    assert [len(payload['embeds']) for payload in notifier.retry_queue] == [10, 2]
+
+    assert notifier.flush_retries() == 12
+    assert not notifier.retry_queue
+    assert len(posts) == 4 and sorted(map(str, posts[:2])) == sorted(map(str, posts[2:]))
@@ -0,0 +1,48 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import FakeSupabase
+
+TCS_ID = '3f1c2a4e-8b7d-4c6a-9e2f-1a2b3c4d5e6f'
+
+
+class QuoteScraper:
+    url_cache = {}
+
+    def scrape_stock_price(self, company_name):
+        return {'company_name': company_name, 'price': 3500.0, 'success': True, 'error': None}
+
+
+class UUIDCheckingSupabase(FakeSupabase):
+    """PostgREST rejects the whole request when one value of a uuid filter is malformed."""
+
+    def select(self, query):
+        for name, args in query.filters:
+            if name == 'in_':
+                for value in args[1]:
+                    uuid.UUID(value)
+        return super().select(query)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = UUIDCheckingSupabase(rows={'stocks': [{'id': TCS_ID, 'company_name': 'TCS'}]})
+    monkeypatch.setattr(main, 'get_supabase', lambda: db)
+    monkeypatch.setattr(main, 'get_scraper', lambda: QuoteScraper())
+    monkeypatch.setattr(main, 'quote_cache', main.QuoteCache())
+    return TestClient(main.app)
+
+
+def test_malformed_stock_id_fails_only_its_item(client):
+    response = client.post('/api/quotes', json={'stock_ids': [TCS_ID, 'not-a-uuid', '00000000-0000-0000-0000-000000000000']})
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert [(result['query'], result['success'], result['error']) for result in results] == [
+        (TCS_ID, True, None),
+        ('not-a-uuid', False, 'Invalid stock id "not-a-uuid"'),
+        ('00000000-0000-0000-0000-000000000000', False, 'Unknown stock id "00000000-0000-0000-0000-000000000000"'),
+    ]
+    assert results[0]['price'] == 3500.0
@@ -0,0 +1,49 @@
+from conftest import make_alert_info
+from discord_notifier import DiscordNotifier
+from notification_outbox import NotificationDispatcher
+
+
+def _notifier(monkeypatch, results):
+    notifier = DiscordNotifier('https://discord.test/webhook', max_retries=0)
+    posts = []
+
+    def post(payload):
+        posts.append(payload)
+        return results.pop(0) if results else True
+
+    monkeypatch.setattr(notifier, '_post', post)
+    return notifier, posts
+
+
+def test_failed_send_without_outbox_is_retried(monkeypatch):
+    notifier, posts = _notifier(monkeypatch, [False])
+    dispatcher = NotificationDispatcher(notifier, outbox=None, workers=1, digest=False)
+    try:
+        dispatcher.submit(make_alert_info('a1'))
+        sent, failed = dispatcher.wait()
+    finally:
+        dispatcher.close()
+        notifier.close()
+
+    assert (sent, failed) == (0, 1)
+    # The failed message was queued and re-sent after the run
+    assert len(posts) == 2 and posts[0] == posts[1]
+    assert not notifier.retry_queue
+
+
+def test_failed_digest_without_outbox_is_retried(monkeypatch):
+    notifier, posts = _notifier(monkeypatch, [False])
+    dispatcher = NotificationDispatcher(notifier, outbox=None, workers=1, digest=True, digest_window=0)
+    try:
+        dispatcher.submit(make_alert_info('a1'))
+        dispatcher.submit(make_alert_info('a2'))
+        dispatcher.wait()
+    finally:
+        dispatcher.close()
+        notifier.close()
+
+    assert len(posts) == 2
+    assert [embed['title'] for embed in posts[1]['embeds']] == [
+        DiscordNotifier.build_embed(make_alert_info('a1'))['title'], DiscordNotifier.build_embed(make_alert_info('a2'))['title']
+    ]
+    assert not notifier.retry_queue
@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+from alert_evaluator import AlertBook
+from conftest import make_alert
+from poll_scheduler import PollScheduler
+
+
+def _scheduler(**kwargs):
+    options = dict(min_interval=60, max_interval=1800, budget_per_minute=3, z_score=3)
+    options.update(kwargs)
+    return PollScheduler(**options)
+
+
+def test_ewma_volatility_update():
+    scheduler = _scheduler()
+    scheduler.observe('s1', 100.0, at=1000.0)
+    assert 's1' not in scheduler._variance  # one price has no return yet
+
+    scheduler.observe('s1', 101.0, at=1060.0)
+    sample = math.log(101.0 / 100.0) ** 2 / 60
+    expected = PollScheduler.EWMA_DECAY * scheduler._default_variance + (1 - PollScheduler.EWMA_DECAY) * sample
+    assert scheduler._variance['s1'] == pytest.approx(expected)
+
+    # Out-of-order and non-positive prices leave the estimate alone
+    scheduler.observe('s1', 105.0, at=1000.0)
+    scheduler.observe('s1', 0.0, at=1200.0)
+    assert scheduler._variance['s1'] == pytest.approx(expected)
+
+
+def test_interval_shrinks_near_a_trigger_and_is_clamped():
+    scheduler = _scheduler()
+    book = AlertBook([
+        make_alert('near', 'near', baseline=100.0, gain=5.0, loss=5.0),
+        make_alert('far', 'far', baseline=100.0, gain=50.0, loss=50.0),
+        make_alert('mid', 'mid', baseline=100.0, gain=5.0, loss=5.0),
+        make_alert('crossed', 'crossed', baseline=100.0, gain=5.0, loss=5.0),
+    ])
+    scheduler.reschedule(book, {'near': 104.9, 'far': 100.0, 'mid': 104.0, 'crossed': 106.0,
+                                'no-alerts': 100.0}, now=0.0)
+
+    next_poll = scheduler._next_poll
+    assert next_poll['near'] == next_poll['crossed'] == 60  # clamped to min_interval
+    assert next_poll['far'] == next_poll['no-alerts'] == 1800  # clamped to max_interval
+    sigma = math.sqrt(scheduler._default_variance)
+    assert next_poll['mid'] == pytest.approx((1.0 / 104.0 / (3 * sigma)) ** 2)
+    assert next_poll['near'] < next_poll['mid'] < next_poll['far']
+
+
+def test_due_orders_by_overdue_time_within_the_budget():
+    scheduler = _scheduler(budget_per_minute=3)
+    scheduler._next_poll.update({'a': 50.0, 'b': 10.0, 'c': 30.0, 'd': 20.0, 'later': 500.0})
+    scheduler._tokens_at = 100.0
+    stocks = ['a', 'b', 'c', 'd', 'later', 'never-polled']
+
+    # Never-polled stocks first, then most overdue; 'later' is not due
+    assert scheduler.due(stocks, now=100.0) == ['never-polled', 'b', 'd']
+    # Budget exhausted: nothing more at the same instant
+    assert scheduler.due(stocks, now=100.0) == []
+    # 20 s refills one token (3 per minute): the next most overdue stock
+    assert scheduler.due(['a', 'c', 'later'], now=120.0) == ['c']
+    assert scheduler.due(['a', 'later'], now=120.0) == []
+    # Tokens never accumulate beyond one minute's budget
+    assert scheduler.due(['a', 'c', 'd', 'later', 'x', 'y', 'z'], now=10000.0) == ['x', 'y', 'z']
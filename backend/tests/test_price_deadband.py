@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+from price_deadband import PriceDeadband
+
+T0 = datetime(2026, 10, 16, 4, 0, tzinfo=timezone.utc)
+
+
+def test_band_boundary_uses_the_larger_of_absolute_and_percent():
+    deadband = PriceDeadband(absolute=0.5, percent=1.0, heartbeat_minutes=30)
+    assert deadband.should_store('s1', 100.0, T0)
+    # Band is max(0.5, 1% of 100) = 1.0, inclusive
+    assert not deadband.should_store('s1', 101.0, T0 + timedelta(minutes=1))
+    assert not deadband.should_store('s1', 99.0, T0 + timedelta(minutes=2))
+    assert deadband.should_store('s1', 101.01, T0 + timedelta(minutes=3))
+
+    # At a price of 10 the absolute floor (0.5) is wider than 1% (0.1)
+    assert deadband.should_store('s2', 10.0, T0)
+    assert not deadband.should_store('s2', 10.5, T0 + timedelta(minutes=1))
+    assert deadband.should_store('s2', 10.51, T0 + timedelta(minutes=2))
+    assert (deadband.stored, deadband.dropped) == (4, 3)
+
+
+def test_drift_is_measured_from_the_last_stored_price():
+    deadband = PriceDeadband(absolute=0, percent=1.0, heartbeat_minutes=30)
+    deadband.should_store('s1', 100.0, T0)
+    assert not deadband.should_store('s1', 100.6, T0 + timedelta(minutes=1))
+    # 1.2 away from the stored 100, though only 0.6 from the dropped 100.6
+    assert deadband.should_store('s1', 101.2, T0 + timedelta(minutes=2))
+
+
+def test_zero_band_drops_only_unchanged_prices():
+    deadband = PriceDeadband(absolute=0, percent=0, heartbeat_minutes=30)
+    assert deadband.should_store('s1', 100.0, T0)
+    assert not deadband.should_store('s1', 100.0, T0 + timedelta(minutes=1))
+    assert deadband.should_store('s1', 100.01, T0 + timedelta(minutes=2))
+
+
+def test_heartbeat_expiry_stores_an_unchanged_price():
+    deadband = PriceDeadband(absolute=0, percent=1.0, heartbeat_minutes=30)
+    deadband.should_store('s1', 100.0, T0)
+    assert not deadband.should_store('s1', 100.0, T0 + timedelta(minutes=29, seconds=59))
+    assert deadband.should_store('s1', 100.0, T0 + timedelta(minutes=30))
+    # The heartbeat restarts from the point just stored
+    assert not deadband.should_store('s1', 100.0, T0 + timedelta(minutes=59))
+
+
+def test_forced_write_stores_inside_the_band_and_moves_the_reference():
+    deadband = PriceDeadband(absolute=0, percent=1.0, heartbeat_minutes=30)
+    deadband.should_store('s1', 100.0, T0)
+    assert deadband.should_store('s1', 100.5, T0 + timedelta(minutes=1), force=True)
+    assert not deadband.should_store('s1', 101.4, T0 + timedelta(minutes=2))
+    assert deadband.should_store('s1', 101.6, T0 + timedelta(minutes=3))
+
+
+def test_seed_sets_the_reference_and_marks_stocks_known():
+    deadband = PriceDeadband(absolute=0, percent=1.0, heartbeat_minutes=30)
+    deadband.seed(
+        [
+            {'stock_id': 's1', 'price': 100.0, 'recorded_at': '2026-10-16T04:00:00'},
+            {'stock_id': 's2', 'price': 'n/a', 'recorded_at': '2026-10-16T04:00:00+00:00'},
+        ],
+        ['s1', 's2', 's3'],
+    )
+    assert all(deadband.knows(stock_id) for stock_id in ('s1', 's2', 's3'))
+    # Naive timestamps are UTC
+    assert not deadband.should_store('s1', 100.5, T0 + timedelta(minutes=10))
+    assert deadband.should_store('s1', 100.5, T0 + timedelta(minutes=30))
+    # A malformed row leaves the stock without a reference: its first price is stored
+    assert deadband.should_store('s2', 250.0, T0)
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import FakeSupabase
+from price_history import PriceHistoryReader
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings_cache(monkeypatch):
+    monkeypatch.setattr(PriceHistoryReader, '_retention_cache', None)
+
+
+def test_retention_comes_from_the_settings_table():
+    db = FakeSupabase(rows={'price_history_settings': [{'id': True, 'retention_days': 30}]})
+    reader = PriceHistoryReader(db)
+
+    start = datetime.now(timezone.utc) - timedelta(days=20)
+    assert reader.resolution_for(start) == 'raw'
+    assert reader.resolution_for(start - timedelta(days=15)) == 'daily'
+    # Read once, then cached across readers (main.py builds one per request)
+    assert PriceHistoryReader(db).retention_days == 30
+    assert [table for table, *_ in db.calls] == ['price_history_settings']
+
+
+def test_retention_falls_back_when_settings_are_unreadable():
+    db = FakeSupabase()
+    db.failing['price_history_settings'] = RuntimeError("relation does not exist")
+    assert PriceHistoryReader(db).retention_days == PriceHistoryReader.DEFAULT_RETENTION_DAYS
+    assert PriceHistoryReader(db, retention_days=7).retention_days == 7
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from conftest import FakeSupabase
+from price_history import PriceHistoryReader
+from price_store import PriceStore
+
+NOW = datetime(2026, 10, 16, 10, 0, tzinfo=timezone.utc)
+
+
+def _ticks(start, count, minutes=5):
+    times = np.datetime64(start.replace(tzinfo=None), 'us') + np.arange(count) * np.timedelta64(minutes, 'm')
+    return times, 100.0 + np.arange(count, dtype=np.float64)
+
+
+def test_append_resumes_from_disk(tmp_path):
+    store = PriceStore(directory=str(tmp_path))
+    times, prices = _ticks(NOW - timedelta(hours=5), 10)
+    assert store.append('s1', times[:6], prices[:6]) == 6
+
+    # A new store over the same directory sees the same columns
+    reopened = PriceStore(directory=str(tmp_path))
+    assert reopened.last_time('s1') == times[5]
+    # Overlapping and out-of-order rows: only the newer ones are appended, in order
+    assert reopened.append('s1', times[9:3:-1], prices[9:3:-1]) == 4
+    stored_times, stored_prices = reopened.columns('s1')
+    assert np.array_equal(stored_times, times) and np.array_equal(stored_prices, prices)
+
+    sliced_times, sliced_prices = reopened.slice('s1', times[2].astype(datetime), times[5].astype(datetime))
+    assert list(sliced_prices) == [102.0, 103.0, 104.0]
+
+
+def test_partial_append_is_dropped(tmp_path):
+    store = PriceStore(directory=str(tmp_path))
+    times, prices = _ticks(NOW - timedelta(hours=5), 4)
+    store.append('s1', times[:3], prices[:3])
+    # A crash after writing only the time column leaves it one row longer
+    time_path, _ = store._paths('s1')
+    with open(time_path, 'ab') as f:
+        f.write(times[3:].tobytes())
+
+    reopened = PriceStore(directory=str(tmp_path))
+    assert len(reopened.columns('s1')[0]) == 3
+    assert reopened.append('s1', times[3:], prices[3:]) == 1
+    assert os.path.getsize(time_path) == 4 * PriceStore.TIME_DTYPE.itemsize
+    assert list(reopened.columns('s1')[1]) == list(prices)
+
+
+def test_sync_is_incremental_per_stock(tmp_path):
+    db = FakeSupabase()
+    db.rows['price_history'] = [
+        {'id': f"{stock_id}-{i}", 'stock_id': stock_id, 'price': 100.0 + i,
+         'recorded_at': (NOW - timedelta(days=20) + timedelta(hours=i)).isoformat()}
+        for stock_id in ('fresh', 'stale', 'new')
+        for i in range(20 * 24)
+    ]
+    reader = PriceHistoryReader(db, page_size=100000)
+    store = PriceStore(directory=str(tmp_path), initial_days=30, settle_seconds=0)
+
+    # 'fresh' is stored up to 2 hours ago, 'stale' only up to 10 days ago
+    for stock_id, upto in (('fresh', NOW - timedelta(hours=2)), ('stale', NOW - timedelta(days=10))):
+        rows = [row for row in db.rows['price_history'] if row['stock_id'] == stock_id and row['recorded_at'] <= upto.isoformat()]
+        store.append(stock_id, [np.datetime64(datetime.fromisoformat(row['recorded_at']).replace(tzinfo=None), 'us') for row in rows],
+                     [row['price'] for row in rows])
+
+    assert store.sync(reader, ['fresh', 'stale', 'new'], now=NOW) == 1 + (10 * 24 - 1) + 20 * 24
+    for stock_id in ('fresh', 'stale', 'new'):
+        assert list(store.columns(stock_id)[1]) == [100.0 + i for i in range(20 * 24)]
+
+    # Each stock is fetched from its own watermark, not from the oldest one
+    starts = {
+        tuple(sorted(dict(filters)['in_'][1])): dict(filters)['gte'][1]
+        for table, _, filters, _ in db.calls if table == 'price_history'
+    }
+    assert starts == {
+        ('fresh',): (NOW - timedelta(hours=2)).isoformat(),
+        ('stale',): (NOW - timedelta(days=10)).isoformat(),
+        ('new',): (NOW - timedelta(days=30)).isoformat(),
+    }
+
+    # Nothing new: nothing appended
+    db.calls.clear()
+    assert store.sync(reader, ['fresh', 'stale', 'new'], now=NOW) == 0
+
+
+def test_sync_shares_a_query_for_close_watermarks(tmp_path):
+    db = FakeSupabase(rows={'price_history': []})
+    store = PriceStore(directory=str(tmp_path), settle_seconds=0, sync_bucket_minutes=60)
+    store.append('s1', *_ticks(NOW - timedelta(hours=1), 1))
+    store.append('s2', *_ticks(NOW - timedelta(minutes=50), 1))
+    store.append('s3', *_ticks(NOW - timedelta(days=3), 1))
+
+    store.sync(PriceHistoryReader(db), ['s1', 's2', 's3'], now=NOW)
+    groups = sorted(tuple(sorted(dict(filters)['in_'][1])) for table, _, filters, _ in db.calls)
+    assert groups == [('s1', 's2'), ('s3',)]
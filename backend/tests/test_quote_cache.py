@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+import pytest
+
+import quote_cache
+from quote_cache import QuoteCache
+
+
+def _quote(name, success=True):
+    return {'company_name': name, 'price': 100.0, 'success': success, 'error': None}
+
+
+class BlockingFetcher:
+    """Scrapes on executor threads, held until released, like main.run_scrape."""
+
+    def __init__(self, result=None, error=None):
+        self.result, self.error = result, error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def scrape(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.result
+
+    def __call__(self):
+        return asyncio.get_running_loop().run_in_executor(None, self.scrape)
+
+
+async def _callers(cache, key, fetcher, count):
+    callers = [asyncio.ensure_future(cache.get_or_fetch(key, fetcher)) for _ in range(count)]
+    # Let every caller join the in-flight fetch before the scrape finishes
+    await asyncio.sleep(0.05)
+    fetcher.release.set()
+    return await asyncio.gather(*callers, return_exceptions=True)
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = QuoteCache(ttl_seconds=60)
+    fetcher = BlockingFetcher(result=_quote('TCS'))
+
+    results = asyncio.run(_callers(cache, 'tcs', fetcher, 20))
+    assert fetcher.calls == 1
+    assert all(result == (_quote('TCS'), 0.0) for result in results)
+    assert not cache._in_flight
+
+    # Served from the cache afterwards
+    again = asyncio.run(cache.get_or_fetch('tcs', BlockingFetcher(error=AssertionError("not cached"))))
+    assert again[0] == _quote('TCS')
+
+
+def test_failed_fetch_reaches_every_caller_and_is_not_stuck():
+    cache = QuoteCache(ttl_seconds=60)
+    fetcher = BlockingFetcher(error=RuntimeError("screener.in down"))
+
+    results = asyncio.run(_callers(cache, 'tcs', fetcher, 10))
+    assert fetcher.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # Nothing left in flight or cached: the next request fetches again
+    assert not cache._in_flight and not cache._entries
+
+    retry = BlockingFetcher(result=_quote('TCS'))
+    retry.release.set()
+    assert asyncio.run(cache.get_or_fetch('tcs', retry))[0] == _quote('TCS')
+    assert retry.calls == 1
+
+
+def test_unsuccessful_quotes_are_not_cached():
+    cache = QuoteCache(ttl_seconds=60)
+    fetcher = BlockingFetcher(result=_quote('TCS', success=False))
+    fetcher.release.set()
+    asyncio.run(cache.get_or_fetch('tcs', fetcher))
+    asyncio.run(cache.get_or_fetch('tcs', fetcher))
+    assert fetcher.calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch():
+    cache = QuoteCache(ttl_seconds=60)
+    fetcher = BlockingFetcher(result=_quote('TCS'))
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_fetch('tcs', fetcher))
+        second = asyncio.ensure_future(cache.get_or_fetch('tcs', fetcher))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        fetcher.release.set()
+        return await second
+
+    assert asyncio.run(run()) == (_quote('TCS'), 0.0)
+    assert fetcher.calls == 1 and 'tcs' in cache._entries
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(quote_cache.time, 'monotonic', lambda: now[0])
+    cache = QuoteCache(ttl_seconds=15)
+    cache._store('tcs', _quote('TCS'))
+
+    now[0] += 10
+    assert cache._lookup('tcs') == (_quote('TCS'), pytest.approx(10.0))
+    now[0] += 6
+    assert cache._lookup('tcs') is None
+    assert 'tcs' not in cache._entries
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QuoteCache(ttl_seconds=60, max_entries=2)
+    cache._store('a', _quote('A'))
+    cache._store('b', _quote('B'))
+    assert cache._lookup('a') is not None  # 'a' is now the most recently used
+    cache._store('c', _quote('C'))
+    assert list(cache._entries) == ['a', 'c']
@@ -0,0 +1,143 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from page_cache import PageCache
+from scraper import StockScraper
+from throttle import CircuitOpenError
+from url_cache import CompanyURLCache
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Replies from the server's script: (status, headers, body) tuples or 'broken-chunk'."""
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        reply = self.server.script.pop(0) if self.server.script else (200, {}, 'ok')
+        if reply == 'broken-chunk':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'zz\r\nnot a chunk\r\n')
+            self.close_connection = True
+            return
+        status, headers, body = reply
+        body = body.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv('SCREENER_RATE_PER_SECOND', '1000')
+    monkeypatch.setenv('SCREENER_BURST', '100')
+    monkeypatch.setenv('SCREENER_BREAKER_FAILURES', '3')
+    monkeypatch.setenv('SCREENER_BREAKER_RESET_SECONDS', '0.2')
+    monkeypatch.setenv('SCREENER_MAX_RETRIES', '5')
+    monkeypatch.setenv('SCREENER_BACKOFF_BASE', '0.01')
+    monkeypatch.setenv('SCREENER_BACKOFF_CAP', '0.05')
+    # A fresh port per test gives every test its own host guard
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.script, server.hits = [], []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    scraper = StockScraper(
+        prime_session=False,
+        url_cache=CompanyURLCache(path=str(tmp_path / 'urls.json')),
+        page_cache=PageCache(directory=str(tmp_path / 'pages')),
+    )
+    yield scraper
+    scraper.close()
+
+
+def test_rate_limited_request_honours_retry_after(stub, scraper):
+    server, base_url = stub
+    server.script = [(429, {'Retry-After': '0'}, 'slow down'), (200, {}, 'ok')]
+    response = scraper._get(base_url + '/company/TCS/', timeout=5)
+    assert response.status_code == 200 and response.text == 'ok'
+    assert len(server.hits) == 2
+
+
+def test_server_errors_open_the_breaker(stub, scraper):
+    server, base_url = stub
+    server.script = [(500, {}, 'down')] * 10
+    with pytest.raises(CircuitOpenError):
+        scraper._get(base_url + '/company/TCS/', timeout=5)
+    assert len(server.hits) == 3
+
+    # Open: fails fast without reaching the host
+    with pytest.raises(CircuitOpenError):
+        scraper._get(base_url + '/company/INFY/', timeout=5)
+    assert len(server.hits) == 3
+
+
+def test_half_open_trial_settles_on_a_body_error(stub, scraper):
+    server, base_url = stub
+    server.script = [(500, {}, 'down')] * 3
+    with pytest.raises(CircuitOpenError):
+        scraper._get(base_url + '/company/TCS/', timeout=5)
+
+    time.sleep(0.25)
+    # The half-open trial breaks off mid-body; the breaker re-opens instead of hanging
+    server.script = ['broken-chunk']
+    with pytest.raises(CircuitOpenError):
+        scraper._get(base_url + '/company/TCS/', timeout=5)
+    assert len(server.hits) == 4
+
+    time.sleep(0.25)
+    response = scraper._get(base_url + '/company/TCS/', timeout=5)
+    assert response.status_code == 200
+    assert len(server.hits) == 5
+
+
+TOP_RATIOS = (
+    '<ul id="top-ratios">'
+    '<li><span class="name">Market Cap</span><span class="number">12,34,567</span></li>'
+    '<li><span class="name">Current Price</span><span class="number">₹ 3,512.45</span></li>'
+    '<li><span class="name">High / Low</span><span class="number">4,100</span><span class="number">3,050</span></li>'
+    '</ul>'
+)
+
+
+def _page(top_ratios):
+    filler = ''.join(
+        f'<section><table><tr><td><span class="number">{i}.5</span></td></tr></table></section>' for i in range(2000)
+    )
+    return f'<html><body><div class="company-info">{top_ratios}</div>{filler}</body></html>'
+
+
+def _price(scraper, html, price_only):
+    soup = scraper._parse_page(html, price_only)
+    return scraper._extract_price(soup, scraper._extract_top_ratios(soup))
+
+
+@pytest.mark.parametrize('top_ratios', [
+    TOP_RATIOS,
+    # Attribute quoted differently: the raw-HTML slice misses, the SoupStrainer parse finds it
+    TOP_RATIOS.replace('id="top-ratios"', "id='top-ratios'"),
+])
+def test_price_only_parse_matches_full_parse(scraper, top_ratios):
+    html = _page(top_ratios)
+    assert _price(scraper, html, price_only=True) == _price(scraper, html, price_only=False) == 3512.45
+    # Only the #top-ratios block is parsed
+    assert len(scraper._parse_page(html, price_only=True).find_all('span', class_='number')) == 4
+
+
+def test_price_only_parse_without_top_ratios_falls_back_to_full_page(scraper):
+    html = _page('<div class="price"><span class="number">₹ 812.10</span></div>')
+    assert _price(scraper, html, price_only=True) == _price(scraper, html, price_only=False) == 812.10
@@ -0,0 +1,64 @@
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+import write_buffer
+from conftest import FakeSupabase
+from write_buffer import WriteBuffer
+
+
+class FlakyQuery:
+    def __init__(self, errors):
+        self.errors = errors
+
+    def insert(self, rows):
+        return self
+
+    def execute(self):
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(write_buffer.time, 'sleep', lambda seconds: None)
+
+
+def _buffer(errors):
+    db = FakeSupabase()
+    attempts = []
+
+    def table(name):
+        attempts.append(name)
+        return FlakyQuery(errors)
+
+    db.table = table
+    return WriteBuffer(db, batch_size=10, max_retries=3), attempts
+
+
+@pytest.mark.parametrize('error', [
+    httpx.ConnectTimeout("timed out"),
+    httpx.ConnectError("connection refused"),
+    APIError({'code': 503, 'message': 'JSON could not be generated'}),
+    APIError({'code': 'PGRST003', 'message': 'Timed out acquiring connection from connection pool.'}),
+    APIError({'code': '40P01', 'message': 'deadlock detected'}),
+])
+def test_transient_errors_are_retried(error):
+    buffer, attempts = _buffer([error, error])
+    buffer.add('price_history', {'price': 1.0})
+    assert buffer.flush() == 1
+    assert len(attempts) == 3
+
+
+@pytest.mark.parametrize('error', [
+    APIError({'code': '23505', 'message': 'duplicate key value violates unique constraint'}),
+    APIError({'code': '42501', 'message': 'permission denied for table price_history'}),
+    APIError({'code': 400, 'message': 'JSON could not be generated'}),
+    ValueError("Out of range float values are not JSON compliant"),
+])
+def test_permanent_errors_fail_fast(error, caplog):
+    buffer, attempts = _buffer([error])
+    buffer.add('price_history', {'price': 1.0})
+    assert buffer.flush() == 0
+    assert len(attempts) == 1
+    assert "not retrying" in caplog.text
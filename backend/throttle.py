@@ -0,0 +1,163 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a host's circuit breaker is open and requests fail fast"""
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        """
+        Initialize the bucket
+
+        Args:
+            rate_per_second: Sustained requests per second
+            burst: Maximum requests allowed back-to-back
+        """
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a host is degraded: after ``failure_threshold`` consecutive
+    failures the circuit opens for ``reset_seconds``, then lets one trial request
+    through (half-open) and closes again on success
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        """
+        Initialize the breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_seconds: Seconds the circuit stays open before a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                log.info("Circuit closed: host recovered")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    log.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before retry ``attempt`` (0-based): the server's Retry-After when given,
+    otherwise full-jitter exponential backoff
+
+    Args:
+        attempt: Retry number, starting at 0
+        base: Base delay in seconds
+        cap: Maximum delay in seconds
+        retry_after: Seconds requested by the server, if any
+    """
+    if retry_after is not None:
+        return min(cap, max(0.0, retry_after))
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return (when - datetime.now(timezone.utc)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+_guards: Dict[str, Tuple[TokenBucket, CircuitBreaker]] = {}
+_guards_lock = threading.Lock()
+
+
+def host_guard(host: str) -> Tuple[TokenBucket, CircuitBreaker]:
+    """
+    Return the process-wide (rate limiter, circuit breaker) for a host, shared by
+    every scraper, thread pool and executor in the process
+
+    Configured by SCREENER_RATE_PER_SECOND, SCREENER_BURST,
+    SCREENER_BREAKER_FAILURES and SCREENER_BREAKER_RESET_SECONDS.
+    """
+    with _guards_lock:
+        if host not in _guards:
+            _guards[host] = (
+                TokenBucket(
+                    float(os.getenv("SCREENER_RATE_PER_SECOND", "5")),
+                    int(os.getenv("SCREENER_BURST", "10")),
+                ),
+                CircuitBreaker(
+                    int(os.getenv("SCREENER_BREAKER_FAILURES", "5")),
+                    float(os.getenv("SCREENER_BREAKER_RESET_SECONDS", "60")),
+                ),
+            )
+        return _guards[host]
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class CompanyURLCache:
+    """Persistent company name → screener.in URL cache backed by a JSON file"""
+
+    DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "screener_url_cache.json")
+    DEFAULT_TTL_HOURS = 24 * 7
+
+    def __init__(self, path: str = None, ttl_hours: float = None):
+        """
+        Initialize the cache
+
+        Args:
+            path: JSON file to persist entries in (SCREENER_URL_CACHE_PATH)
+            ttl_hours: Hours before an entry must be re-resolved (SCREENER_URL_CACHE_TTL_HOURS)
+        """
+        self.path = path or os.getenv("SCREENER_URL_CACHE_PATH", self.DEFAULT_PATH)
+        self.ttl_seconds = 3600 * float(
+            ttl_hours if ttl_hours is not None
+            else os.getenv("SCREENER_URL_CACHE_TTL_HOURS", self.DEFAULT_TTL_HOURS)
+        )
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    @staticmethod
+    def _key(company_name: str) -> str:
+        return " ".join(company_name.lower().split())
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            log.info(f"Loaded {len(entries)} cached company URLs from {self.path}")
+            return entries
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            log.warning(f"Ignoring unreadable URL cache {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        """Write entries atomically so concurrent processes never see a torn file."""
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning(f"Could not persist URL cache to {self.path}: {e}")
+
+    def get(self, company_name: str) -> Optional[Tuple[str, str]]:
+        """Return (found_name, company_url) if a fresh entry exists, else None."""
+        with self._lock:
+            entry = self._entries.get(self._key(company_name))
+        if not entry:
+            return None
+        if time.time() - entry["resolved_at"] > self.ttl_seconds:
+            return None
+        return entry["found_name"], entry["url"]
+
+    def set(self, company_name: str, found_name: str, company_url: str):
+        """Remember the URL a company name resolved to."""
+        with self._lock:
+            self._entries[self._key(company_name)] = {
+                "found_name": found_name,
+                "url": company_url,
+                "resolved_at": time.time(),
+            }
+            self._save()
+
+    def invalidate(self, company_name: str):
+        """Drop a company's entry, e.g. after its page returned 404."""
+        with self._lock:
+            if self._entries.pop(self._key(company_name), None) is not None:
+                log.info(f"Invalidated cached URL for {company_name}")
+                self._save()
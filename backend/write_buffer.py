@@ -0,0 +1,131 @@
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# PostgREST connection/timeout codes and SQLSTATE classes that succeed on a retry:
+# connection exceptions, insufficient resources, operator intervention, serialization/deadlock
+TRANSIENT_PGRST_CODES = {'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003'}
+TRANSIENT_SQLSTATE_PREFIXES = ('08', '53', '57P')
+TRANSIENT_SQLSTATES = {'40001', '40P01'}
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Whether a failed write is worth retrying
+
+    Network errors, timeouts, HTTP 429/5xx and transient database errors are;
+    constraint violations, bad payloads and auth failures never succeed on a retry.
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+    if not isinstance(error, APIError):
+        return False
+    code = str(error.code or '')
+    if code == '429' or (len(code) == 3 and code.startswith('5')):
+        return True
+    return (
+        code in TRANSIENT_PGRST_CODES
+        or code in TRANSIENT_SQLSTATES
+        or code.startswith(TRANSIENT_SQLSTATE_PREFIXES)
+    )
+
+
+class WriteBuffer:
+    """Collect rows per table and write them to Supabase as batched multi-row inserts/upserts"""
+
+    DEFAULT_BATCH_SIZE = 500
+    DEFAULT_MAX_RETRIES = 3
+
+    def __init__(self, supabase: Client, batch_size: int = None, max_retries: int = None):
+        """
+        Initialize the write buffer
+
+        Args:
+            supabase: Supabase client used for inserts
+            batch_size: Rows per insert request (DB_WRITE_BATCH_SIZE)
+            max_retries: Retries per chunk on a transient failure (DB_WRITE_MAX_RETRIES)
+        """
+        self.supabase = supabase
+        self.batch_size = int(batch_size or os.getenv("DB_WRITE_BATCH_SIZE", self.DEFAULT_BATCH_SIZE))
+        self.max_retries = int(
+            max_retries if max_retries is not None
+            else os.getenv("DB_WRITE_MAX_RETRIES", self.DEFAULT_MAX_RETRIES)
+        )
+        self._pending: Dict[Tuple[str, Optional[str]], List[Dict]] = {}
+        self._lock = threading.Lock()
+        # Never lose buffered rows if the process exits without an explicit flush
+        atexit.register(self.flush)
+
+    def add(self, table: str, row: Dict, on_conflict: str = None):
+        """
+        Queue a row for insertion; flushes the table once a full batch is pending
+
+        Args:
+            table: Target table name
+            row: Row to insert
+            on_conflict: Conflict column(s) — the row is upserted instead of inserted
+        """
+        key = (table, on_conflict)
+        with self._lock:
+            rows = self._pending.setdefault(key, [])
+            rows.append(row)
+            if len(rows) < self.batch_size:
+                return
+            self._pending[key] = []
+        self._insert_chunks(key, rows)
+
+    def flush(self) -> int:
+        """
+        Write every pending row
+
+        Returns:
+            int: Number of rows written successfully
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        written = 0
+        for key, rows in pending.items():
+            written += self._insert_chunks(key, rows)
+        return written
+
+    def _insert_chunks(self, key: Tuple[str, Optional[str]], rows: List[Dict]) -> int:
+        written = 0
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            if self._insert_with_retry(key, chunk):
+                written += len(chunk)
+        return written
+
+    def _insert_with_retry(self, key: Tuple[str, Optional[str]], chunk: List[Dict]) -> bool:
+        table, on_conflict = key
+        for attempt in range(self.max_retries + 1):
+            try:
+                if on_conflict:
+                    self.supabase.table(table).upsert(chunk, on_conflict=on_conflict).execute()
+                else:
+                    self.supabase.table(table).insert(chunk).execute()
+                log.info(f"Wrote {len(chunk)} rows to {table}")
+                return True
+            except Exception as e:
+                if not is_transient_error(e):
+                    log.error(f"Dropping {len(chunk)} rows for {table}, not retrying: {str(e)}")
+                    return False
+                if attempt == self.max_retries:
+                    log.error(f"Dropping {len(chunk)} rows for {table} after {attempt + 1} attempts: {str(e)}")
+                    return False
+                delay = (2 ** attempt) * 0.5 + random.uniform(0, 0.5)
+                log.warning(f"Insert into {table} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return False
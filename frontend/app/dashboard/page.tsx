@@ -13,6 +13,9 @@ import {
     RefreshCw, AlertTriangle, LayoutDashboard, Bell, TrendingUp, TrendingDown, BookOpen, Newspaper
 } from 'lucide-react'
 
+// Matches MAX_BATCH_QUOTES in backend/main.py; larger portfolios are split into several requests
+const QUOTES_BATCH_SIZE = Number(process.env.NEXT_PUBLIC_QUOTES_BATCH_SIZE) || 200
+
 /* ── Logout Confirmation Modal ── */
 function LogoutConfirmModal({ onConfirm, onCancel }: { onConfirm: () => void; onCancel: () => void }) {
     return (
@@ -55,6 +58,7 @@ export default function Dashboard() {
         gainPercentage: 0
     })
     const [fetchingPrices, setFetchingPrices] = useState(false)
+    const [priceError, setPriceError] = useState<string | null>(null)
 
     // Profit/Loss Booked
     const [profitBooked, setProfitBooked] = useState(0)
@@ -203,36 +207,59 @@ export default function Dashboard() {
 
         if (portfolioStocks.length === 0) {
             setPortfolioAnalytics({ totalInvestment: 0, currentValue: 0, totalGain: 0, gainPercentage: 0 })
+            setPriceError(null)
             return
         }
 
         setFetchingPrices(true)
+        setPriceError(null)
         let totalInvested = 0
         let totalCurrent = 0
 
         try {
-            for (const stock of portfolioStocks) {
-                const invested = stock.current_price * stock.shares_count
-                totalInvested += invested
-
+            // Batch requests of at most QUOTES_BATCH_SIZE; the backend scrapes each batch concurrently
+            const pricesByName: Record<string, number> = {}
+            const apiBase = (process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000').replace(/\/$/, '')
+            const names = portfolioStocks.map(s => s.company_name)
+            const batches: string[][] = []
+            for (let i = 0; i < names.length; i += QUOTES_BATCH_SIZE) {
+                batches.push(names.slice(i, i + QUOTES_BATCH_SIZE))
+            }
+            await Promise.all(batches.map(async (batch) => {
                 try {
-                    const apiBase = (process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000').replace(/\/$/, '')
-                    const response = await fetch(`${apiBase}/api/search`, {
+                    const response = await fetch(`${apiBase}/api/quotes`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
                         cache: 'no-store',
-                        body: JSON.stringify({ company_name: stock.company_name }),
+                        body: JSON.stringify({ company_names: batch }),
                     })
-                    const result = await response.json()
-                    if (result.success) {
-                        totalCurrent += result.price * stock.shares_count
-                    } else {
-                        totalCurrent += invested
+                    const data = await response.json()
+                    if (!response.ok) throw new Error(data.detail || `HTTP ${response.status}`)
+                    for (const result of data.results || []) {
+                        if (result.success) {
+                            pricesByName[result.query] = result.price
+                        } else {
+                            console.error(`Failed to fetch price for ${result.query}`, result.error)
+                        }
                     }
                 } catch (error) {
-                    console.error(`Failed to fetch price for ${stock.company_name}`, error)
-                    totalCurrent += invested
+                    console.error('Failed to fetch portfolio prices', error)
                 }
+            }))
+
+            let missing = 0
+            for (const stock of portfolioStocks) {
+                const invested = stock.current_price * stock.shares_count
+                totalInvested += invested
+
+                const price = pricesByName[stock.company_name]
+                if (price === undefined) missing++
+                totalCurrent += price !== undefined ? price * stock.shares_count : invested
+            }
+            if (missing > 0) {
+                setPriceError(missing === portfolioStocks.length
+                    ? 'Live prices unavailable; showing buy prices'
+                    : `No live price for ${missing} of ${portfolioStocks.length} stocks; using their buy prices`)
             }
 
             const gain = totalCurrent - totalInvested
@@ -246,6 +273,7 @@ export default function Dashboard() {
             })
         } catch (error) {
             console.error('Error calculating portfolio analytics:', error)
+            setPriceError('Could not calculate portfolio value')
         } finally {
             setFetchingPrices(false)
         }
@@ -285,7 +313,6 @@ export default function Dashboard() {
                     .upsert({
                         company_name: stockName,
                         symbol: 'NSE',
-                        current_price: alertData.baseline_price,
                         sector_id: alertData.sector_id,
                         interest: alertData.interest || 'not-interested'
                     }, { onConflict: 'company_name' })
@@ -664,6 +691,12 @@ export default function Dashboard() {
                                     ₹{portfolioAnalytics.currentValue.toLocaleString('en-IN', { maximumFractionDigits: 0 })}
                                 </p>
                                 {fetchingPrices && <p className="text-[10px] text-gray-500 mt-0.5">Updating...</p>}
+                                {!fetchingPrices && priceError && (
+                                    <p className="mt-0.5 flex items-center gap-1 text-[10px] text-amber-400">
+                                        <AlertTriangle className="h-3 w-3 shrink-0" />
+                                        {priceError}
+                                    </p>
+                                )}
                             </div>
                             <div className={`rounded-xl border p-3 backdrop-blur-md ${portfolioAnalytics.totalGain >= 0
                                 ? 'border-blue-400/20 bg-gradient-to-br from-blue-500/10 to-blue-600/5'
@@ -229,7 +229,6 @@ export default function PendingConvertPage() {
                 .upsert({
                     company_name: selectedCompany.name,
                     symbol: 'NSE',
-                    current_price: convertForm.baseline_price,
                     sector_id: convertForm.sector_id,
                     interest: convertForm.is_portfolio ? 'interested' : convertForm.interest
                 }, { onConflict: 'company_name' })
@@ -1,8 +1,17 @@
 -- 1. DROP EVERYTHING
 drop trigger if exists on_auth_user_created on auth.users;
 drop function if exists public.handle_new_user();
+drop view if exists public.price_history_latest;
+drop function if exists public.rearm_user_alert() cascade;
+drop function if exists public.touch_user_alert() cascade;
+drop table if exists public.notification_outbox cascade;
 drop table if exists public.alert_logs cascade;
+drop table if exists public.price_history_daily cascade;
 drop table if exists public.price_history cascade;
+drop function if exists public.ensure_price_history_partitions(int, int);
+drop function if exists public.rollup_price_history_daily(date, date);
+drop function if exists public.purge_price_history(int);
+drop table if exists public.price_history_settings cascade;
 drop table if exists public.user_alerts cascade;
 drop table if exists public.stocks cascade;
 drop table if exists public.sectors cascade;
@@ -30,12 +39,15 @@ create table public.stocks (
   id uuid default gen_random_uuid() primary key,
   company_name text not null unique,
   symbol text,
-  current_price numeric,
+  current_price numeric, -- last scraped price (alert engine); baselines live in user_alerts
   market_cap text,
   sector_id uuid references public.sectors(id) on delete set null,
   created_at timestamptz default now()
 );
 
+comment on column public.stocks.current_price is
+  'Last scraped price, written by the alert engine. Not an alert baseline: see user_alerts.baseline_price.';
+
 -- User Alerts Table (MODIFIED - added is_portfolio and shares_count)
 create table public.user_alerts (
   id uuid default gen_random_uuid() primary key,
@@ -47,19 +59,45 @@ create table public.user_alerts (
   is_active boolean default true,
   is_portfolio boolean default false,
   shares_count integer default null,
+  trigger_state text not null default 'armed' check (trigger_state in ('armed', 'fired')),
+  last_triggered_at timestamptz,
+  last_trigger_type text,
   created_at timestamptz default now(),
   updated_at timestamptz default now(),
   unique(user_id, stock_id)
 );
 
--- Price History Table
+-- Price History Table (raw ticks, partitioned by month; see migration_alert_engine.sql section 5)
 create table public.price_history (
-  id uuid default gen_random_uuid() primary key,
+  id uuid default gen_random_uuid() not null,
   stock_id uuid references public.stocks(id) on delete cascade not null,
   price numeric not null,
-  recorded_at timestamptz default now()
+  recorded_at timestamptz not null default now(),
+  primary key (id, recorded_at)
+) partition by range (recorded_at);
+
+create table public.price_history_default partition of public.price_history default;
+
+-- Daily OHLC rollups of price_history (trading days in IST)
+create table public.price_history_daily (
+  stock_id uuid references public.stocks(id) on delete cascade not null,
+  trade_date date not null,
+  open numeric not null,
+  high numeric not null,
+  low numeric not null,
+  close numeric not null,
+  samples integer not null,
+  primary key (stock_id, trade_date)
+);
+
+-- Raw tick retention, read by purge_price_history and the backend (single row)
+create table public.price_history_settings (
+  id boolean primary key default true check (id),
+  retention_days integer not null default 90 check (retention_days > 0)
 );
 
+insert into public.price_history_settings (id) values (true);
+
 -- Alert Logs Table
 create table public.alert_logs (
   id uuid default gen_random_uuid() primary key,
@@ -74,9 +112,28 @@ create table public.alert_logs (
   triggered_at timestamptz default now()
 );
 
+-- Notification Outbox (triggered alerts awaiting Discord delivery; written by the cron job)
+create table public.notification_outbox (
+  id uuid default gen_random_uuid() primary key,
+  dedup_key text not null unique,
+  user_id uuid references public.user_profiles(id) on delete cascade,
+  payload jsonb not null,
+  status text not null default 'pending' check (status in ('pending', 'sent', 'failed')),
+  attempts integer not null default 0,
+  last_error text,
+  created_at timestamptz default now(),
+  sent_at timestamptz
+);
+
 -- 3. CREATE INDEXES FOR PERFORMANCE
 create index idx_stocks_sector_id on public.stocks(sector_id);
 create index idx_user_alerts_portfolio on public.user_alerts(user_id, is_portfolio);
+create index idx_user_alerts_updated_at on public.user_alerts(updated_at);
+create index idx_user_alerts_active_stock on public.user_alerts(is_active, stock_id);
+create index idx_price_history_stock_recorded on public.price_history(stock_id, recorded_at desc);
+create index idx_price_history_recorded_brin on public.price_history using brin (recorded_at);
+create index idx_price_history_daily_trade_date on public.price_history_daily(trade_date);
+create index idx_notification_outbox_pending on public.notification_outbox(created_at) where status = 'pending';
 
 -- 4. ROBUST TRIGGER (Auto-create Profile)
 create or replace function public.handle_new_user()
@@ -96,12 +153,138 @@ create trigger on_auth_user_created
   after insert on auth.users
   for each row execute procedure public.handle_new_user();
 
+-- Re-arm an alert whenever the user changes its baseline or thresholds
+create or replace function public.rearm_user_alert()
+returns trigger as $$
+begin
+  if new.baseline_price is distinct from old.baseline_price
+     or new.gain_threshold_percent is distinct from old.gain_threshold_percent
+     or new.loss_threshold_percent is distinct from old.loss_threshold_percent then
+    new.trigger_state := 'armed';
+  end if;
+  return new;
+end;
+$$ language plpgsql;
+
+create trigger on_user_alert_thresholds_changed
+  before update on public.user_alerts
+  for each row execute procedure public.rearm_user_alert();
+
+-- Bump updated_at on user-facing alert changes (used by incremental alert sync)
+create or replace function public.touch_user_alert()
+returns trigger as $$
+begin
+  if row(new.baseline_price, new.gain_threshold_percent, new.loss_threshold_percent,
+         new.is_active, new.is_portfolio, new.shares_count, new.stock_id)
+     is distinct from
+     row(old.baseline_price, old.gain_threshold_percent, old.loss_threshold_percent,
+         old.is_active, old.is_portfolio, old.shares_count, old.stock_id) then
+    new.updated_at := now();
+  end if;
+  return new;
+end;
+$$ language plpgsql;
+
+create trigger on_user_alert_touched
+  before update on public.user_alerts
+  for each row execute procedure public.touch_user_alert();
+
+-- Monthly partitions, daily rollups and retention for price_history
+-- (scheduled with pg_cron in migration_alert_engine.sql section 5)
+create or replace function public.ensure_price_history_partitions(months_back int default 0, months_ahead int default 2)
+returns void as $$
+declare
+  month_start date;
+begin
+  for i in -months_back..months_ahead loop
+    month_start := (date_trunc('month', now()) + make_interval(months => i))::date;
+    execute format(
+      'create table if not exists public.%I partition of public.price_history for values from (%L) to (%L)',
+      'price_history_' || to_char(month_start, 'YYYY_MM'),
+      month_start,
+      (month_start + interval '1 month')::date
+    );
+  end loop;
+end;
+$$ language plpgsql;
+
+select public.ensure_price_history_partitions(0, 2);
+
+create or replace function public.rollup_price_history_daily(from_day date, to_day date)
+returns integer as $$
+declare
+  rows_written integer;
+begin
+  insert into public.price_history_daily (stock_id, trade_date, open, high, low, close, samples)
+  select stock_id,
+         (recorded_at at time zone 'Asia/Kolkata')::date as trade_date,
+         (array_agg(price order by recorded_at))[1],
+         max(price),
+         min(price),
+         (array_agg(price order by recorded_at desc))[1],
+         count(*)
+  from public.price_history
+  where recorded_at >= (from_day::timestamp at time zone 'Asia/Kolkata')
+    and recorded_at < ((to_day + 1)::timestamp at time zone 'Asia/Kolkata')
+  group by stock_id, (recorded_at at time zone 'Asia/Kolkata')::date
+  on conflict (stock_id, trade_date) do update set
+    open = excluded.open,
+    high = excluded.high,
+    low = excluded.low,
+    close = excluded.close,
+    samples = excluded.samples;
+  get diagnostics rows_written = row_count;
+  return rows_written;
+end;
+$$ language plpgsql;
+
+create or replace function public.purge_price_history(keep_days int default null)
+returns integer as $$
+declare
+  part record;
+  month_start date;
+  dropped integer := 0;
+begin
+  keep_days := coalesce(keep_days, (select retention_days from public.price_history_settings), 90);
+  for part in
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'public.price_history'::regclass
+      and c.relname ~ '^price_history_[0-9]{4}_[0-9]{2}$'
+  loop
+    month_start := to_date(right(part.relname, 7), 'YYYY_MM');
+    if month_start + interval '1 month' <= now() - make_interval(days => keep_days) then
+      perform public.rollup_price_history_daily(month_start, (month_start + interval '1 month' - interval '1 day')::date);
+      execute format('drop table public.%I', part.relname);
+      dropped := dropped + 1;
+    end if;
+  end loop;
+  return dropped;
+end;
+$$ language plpgsql;
+
+-- Latest stored price per stock (seeds the cron job's write deadband)
+create or replace view public.price_history_latest as
+select s.id as stock_id, latest.price, latest.recorded_at
+from public.stocks s
+cross join lateral (
+  select ph.price, ph.recorded_at
+  from public.price_history ph
+  where ph.stock_id = s.id
+  order by ph.recorded_at desc
+  limit 1
+) latest;
+
 -- 5. SECURITY (RLS)
 alter table public.user_profiles enable row level security;
 alter table public.user_alerts enable row level security;
 alter table public.stocks enable row level security;
 alter table public.sectors enable row level security;
 alter table public.alert_logs enable row level security;
+-- No policies: only the service-role cron job reads or writes the outbox
+alter table public.notification_outbox enable row level security;
+alter table public.price_history_settings enable row level security;
 
 -- ALLOW LOGIN (Find email by username)
 create policy "Public profiles" on public.user_profiles for select using (true);
@@ -121,6 +304,9 @@ create policy "Authenticated insert stocks" on public.stocks for insert to authe
 create policy "Authenticated update stocks" on public.stocks for update to authenticated using (true);
 create policy "Authenticated delete stocks" on public.stocks for delete to authenticated using (true);
 
+-- Price history settings (retention window; changed only from the SQL editor)
+create policy "Anyone can view price history settings" on public.price_history_settings for select using (true);
+
 -- SECTORS POLICIES (NEW)
 create policy "Anyone can view sectors" on public.sectors for select using (auth.uid() is not null);
 create policy "Anyone can create sectors" on public.sectors for insert with check (auth.uid() is not null);
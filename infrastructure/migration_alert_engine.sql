@@ -0,0 +1,303 @@
+-- ============================================================
+-- 1. Alert trigger state (17-10-2026)
+-- Purpose: Fire each alert once per excursion instead of every
+--          run; the cron job re-arms alerts once the price
+--          returns inside the re-arm band
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+ALTER TABLE public.user_alerts
+  ADD COLUMN IF NOT EXISTS trigger_state TEXT NOT NULL DEFAULT 'armed'
+    CHECK (trigger_state IN ('armed', 'fired')),
+  ADD COLUMN IF NOT EXISTS last_triggered_at TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS last_trigger_type TEXT;
+
+-- Re-arm an alert whenever the user changes its baseline or thresholds
+CREATE OR REPLACE FUNCTION public.rearm_user_alert()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.baseline_price IS DISTINCT FROM OLD.baseline_price
+     OR NEW.gain_threshold_percent IS DISTINCT FROM OLD.gain_threshold_percent
+     OR NEW.loss_threshold_percent IS DISTINCT FROM OLD.loss_threshold_percent THEN
+    NEW.trigger_state := 'armed';
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS on_user_alert_thresholds_changed ON public.user_alerts;
+CREATE TRIGGER on_user_alert_thresholds_changed
+  BEFORE UPDATE ON public.user_alerts
+  FOR EACH ROW EXECUTE PROCEDURE public.rearm_user_alert();
+
+-- ============================================================
+-- 2. Keep user_alerts.updated_at current (17-10-2026)
+-- Purpose: The cron daemon's incremental mode fetches only
+--          alerts with updated_at > last sync; bump it on every
+--          user-facing change (trigger-state writes are ignored)
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION public.touch_user_alert()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF ROW(NEW.baseline_price, NEW.gain_threshold_percent, NEW.loss_threshold_percent,
+         NEW.is_active, NEW.is_portfolio, NEW.shares_count, NEW.stock_id)
+     IS DISTINCT FROM
+     ROW(OLD.baseline_price, OLD.gain_threshold_percent, OLD.loss_threshold_percent,
+         OLD.is_active, OLD.is_portfolio, OLD.shares_count, OLD.stock_id) THEN
+    NEW.updated_at := NOW();
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS on_user_alert_touched ON public.user_alerts;
+CREATE TRIGGER on_user_alert_touched
+  BEFORE UPDATE ON public.user_alerts
+  FOR EACH ROW EXECUTE PROCEDURE public.touch_user_alert();
+
+CREATE INDEX IF NOT EXISTS idx_user_alerts_updated_at ON public.user_alerts(updated_at);
+
+-- ============================================================
+-- 3. Notification outbox (17-10-2026)
+-- Purpose: Triggered alerts are recorded here before they are
+--          sent to Discord and marked sent afterwards, so a run
+--          that crashes mid-way delivers them on the next run;
+--          dedup_key stops the same excursion being sent twice
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS public.notification_outbox (
+  id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  dedup_key TEXT NOT NULL UNIQUE,
+  user_id UUID REFERENCES public.user_profiles(id) ON DELETE CASCADE,
+  payload JSONB NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending'
+    CHECK (status IN ('pending', 'sent', 'failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  last_error TEXT,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  sent_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+  ON public.notification_outbox(created_at) WHERE status = 'pending';
+
+-- No policies: only the service-role cron job reads or writes the outbox
+ALTER TABLE public.notification_outbox ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- 4. Active-alert loading index (17-10-2026)
+-- Purpose: The cron job loads active alerts joined to
+--          interested stocks in keyset-paginated pages
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_user_alerts_active_stock
+  ON public.user_alerts(is_active, stock_id);
+
+-- ============================================================
+-- 5. price_history time-series layout (17-10-2026)
+-- Purpose: Partition raw ticks by month, index them for
+--          (stock, time) range scans, roll them up into daily
+--          OHLC rows and purge raw ticks past the retention
+--          window (price_history_settings.retention_days,
+--          default 90; the backend reads the same row)
+-- Requires: pg_cron (Database > Extensions in the Supabase
+--           dashboard) for the scheduled jobs at the end
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+-- 5a. Swap in a partitioned table and copy the existing rows
+BEGIN;
+
+ALTER TABLE public.price_history RENAME TO price_history_legacy;
+
+CREATE TABLE public.price_history (
+  id UUID DEFAULT gen_random_uuid() NOT NULL,
+  stock_id UUID REFERENCES public.stocks(id) ON DELETE CASCADE NOT NULL,
+  price NUMERIC NOT NULL,
+  recorded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+-- Catches rows outside every monthly partition; should stay empty
+CREATE TABLE public.price_history_default PARTITION OF public.price_history DEFAULT;
+
+-- Create monthly partitions from months_back before to months_ahead after the current month
+CREATE OR REPLACE FUNCTION public.ensure_price_history_partitions(months_back INT DEFAULT 0, months_ahead INT DEFAULT 2)
+RETURNS VOID AS $$
+DECLARE
+  month_start DATE;
+BEGIN
+  FOR i IN -months_back..months_ahead LOOP
+    month_start := (date_trunc('month', NOW()) + make_interval(months => i))::DATE;
+    EXECUTE format(
+      'CREATE TABLE IF NOT EXISTS public.%I PARTITION OF public.price_history FOR VALUES FROM (%L) TO (%L)',
+      'price_history_' || to_char(month_start, 'YYYY_MM'),
+      month_start,
+      (month_start + INTERVAL '1 month')::DATE
+    );
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  oldest TIMESTAMPTZ;
+BEGIN
+  SELECT MIN(recorded_at) INTO oldest FROM public.price_history_legacy;
+  PERFORM public.ensure_price_history_partitions(
+    COALESCE((EXTRACT(YEAR FROM AGE(date_trunc('month', NOW()), date_trunc('month', oldest))) * 12
+            + EXTRACT(MONTH FROM AGE(date_trunc('month', NOW()), date_trunc('month', oldest))))::INT, 0),
+    2
+  );
+END $$;
+
+INSERT INTO public.price_history (id, stock_id, price, recorded_at)
+SELECT id, stock_id, price, COALESCE(recorded_at, NOW()) FROM public.price_history_legacy;
+
+COMMIT;
+
+-- Run once the row counts match:
+-- DROP TABLE public.price_history_legacy;
+
+-- 5b. Indexes (created on every partition)
+CREATE INDEX IF NOT EXISTS idx_price_history_stock_recorded
+  ON public.price_history(stock_id, recorded_at DESC);
+-- Rows arrive in time order, so a BRIN index answers time-range scans at a tiny size
+CREATE INDEX IF NOT EXISTS idx_price_history_recorded_brin
+  ON public.price_history USING BRIN (recorded_at);
+
+-- 5c. Daily OHLC rollups (trading days in IST)
+CREATE TABLE IF NOT EXISTS public.price_history_daily (
+  stock_id UUID REFERENCES public.stocks(id) ON DELETE CASCADE NOT NULL,
+  trade_date DATE NOT NULL,
+  open NUMERIC NOT NULL,
+  high NUMERIC NOT NULL,
+  low NUMERIC NOT NULL,
+  close NUMERIC NOT NULL,
+  samples INTEGER NOT NULL,
+  PRIMARY KEY (stock_id, trade_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_history_daily_trade_date
+  ON public.price_history_daily(trade_date);
+
+CREATE OR REPLACE FUNCTION public.rollup_price_history_daily(from_day DATE, to_day DATE)
+RETURNS INTEGER AS $$
+DECLARE
+  rows_written INTEGER;
+BEGIN
+  INSERT INTO public.price_history_daily (stock_id, trade_date, open, high, low, close, samples)
+  SELECT stock_id,
+         (recorded_at AT TIME ZONE 'Asia/Kolkata')::DATE AS trade_date,
+         (array_agg(price ORDER BY recorded_at))[1],
+         MAX(price),
+         MIN(price),
+         (array_agg(price ORDER BY recorded_at DESC))[1],
+         COUNT(*)
+  FROM public.price_history
+  WHERE recorded_at >= (from_day::TIMESTAMP AT TIME ZONE 'Asia/Kolkata')
+    AND recorded_at < ((to_day + 1)::TIMESTAMP AT TIME ZONE 'Asia/Kolkata')
+  GROUP BY stock_id, (recorded_at AT TIME ZONE 'Asia/Kolkata')::DATE
+  ON CONFLICT (stock_id, trade_date) DO UPDATE SET
+    open = EXCLUDED.open,
+    high = EXCLUDED.high,
+    low = EXCLUDED.low,
+    close = EXCLUDED.close,
+    samples = EXCLUDED.samples;
+  GET DIAGNOSTICS rows_written = ROW_COUNT;
+  RETURN rows_written;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill rollups for the history copied above
+SELECT public.rollup_price_history_daily(
+  COALESCE((SELECT MIN(recorded_at AT TIME ZONE 'Asia/Kolkata')::DATE FROM public.price_history), CURRENT_DATE),
+  CURRENT_DATE
+);
+
+-- 5d. Retention: drop whole monthly partitions older than keep_days (rolled up first)
+-- The single source of the retention window; change it with
+--   UPDATE public.price_history_settings SET retention_days = 120;
+CREATE TABLE IF NOT EXISTS public.price_history_settings (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  retention_days INTEGER NOT NULL DEFAULT 90 CHECK (retention_days > 0)
+);
+
+INSERT INTO public.price_history_settings (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE public.price_history_settings ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Anyone can view price history settings" ON public.price_history_settings;
+CREATE POLICY "Anyone can view price history settings" ON public.price_history_settings FOR SELECT USING (true);
+
+-- keep_days overrides the configured window for a one-off purge
+CREATE OR REPLACE FUNCTION public.purge_price_history(keep_days INT DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  part RECORD;
+  month_start DATE;
+  dropped INTEGER := 0;
+BEGIN
+  keep_days := COALESCE(keep_days, (SELECT retention_days FROM public.price_history_settings), 90);
+  FOR part IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.price_history'::REGCLASS
+      AND c.relname ~ '^price_history_[0-9]{4}_[0-9]{2}$'
+  LOOP
+    month_start := to_date(right(part.relname, 7), 'YYYY_MM');
+    IF month_start + INTERVAL '1 month' <= NOW() - make_interval(days => keep_days) THEN
+      PERFORM public.rollup_price_history_daily(month_start, (month_start + INTERVAL '1 month' - INTERVAL '1 day')::DATE);
+      EXECUTE format('DROP TABLE public.%I', part.relname);
+      dropped := dropped + 1;
+    END IF;
+  END LOOP;
+  RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 5e. Schedules (times in UTC; market closes 10:00 UTC)
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+
+SELECT cron.schedule('price-history-rollup', '30 10 * * 1-5',
+  $$SELECT public.rollup_price_history_daily(CURRENT_DATE - 1, CURRENT_DATE)$$);
+SELECT cron.schedule('price-history-partitions', '0 0 25 * *',
+  $$SELECT public.ensure_price_history_partitions(0, 2)$$);
+SELECT cron.schedule('price-history-retention', '0 20 * * *',
+  $$SELECT public.purge_price_history()$$);
+
+-- ============================================================
+-- 6. Latest stored price per stock (17-10-2026)
+-- Purpose: The cron job stores a price only when it leaves the
+--          deadband around the last stored one (or the heartbeat
+--          has elapsed); this view seeds that comparison on
+--          start-up from idx_price_history_stock_recorded
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+CREATE OR REPLACE VIEW public.price_history_latest AS
+SELECT s.id AS stock_id, latest.price, latest.recorded_at
+FROM public.stocks s
+CROSS JOIN LATERAL (
+  SELECT ph.price, ph.recorded_at
+  FROM public.price_history ph
+  WHERE ph.stock_id = s.id
+  ORDER BY ph.recorded_at DESC
+  LIMIT 1
+) latest;
+
+-- ============================================================
+-- 7. Meaning of stocks.current_price (17-10-2026)
+-- Purpose: The alert engine overwrites stocks.current_price with
+--          every moved scrape, so it is the last scraped price.
+--          Alert baselines live only in user_alerts.baseline_price;
+--          the frontend no longer writes them into stocks
+-- SELECT BELOW SQL AND RUN IN SUPABASE SQL EDITOR
+-- ============================================================
+
+COMMENT ON COLUMN public.stocks.current_price IS
+  'Last scraped price, written by the alert engine. Not an alert baseline: see user_alerts.baseline_price.';